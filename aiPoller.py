@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional, TypeVar
+from logger import logger
+
+
+T = TypeVar("T")
+
+# How often hosts and clusters are fetched while somebody waits on them.
+POLL_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class HostState:
+    name: str
+    id: str
+    status: str
+    status_info: str
+    inventory: str
+    ipv4_addresses: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    taken: float = 0
+    hosts: tuple[HostState, ...] = ()
+    by_name: dict[str, HostState] = field(default_factory=dict)
+    by_ip: dict[str, HostState] = field(default_factory=dict)
+    # Cluster name -> status
+    clusters: dict[str, str] = field(default_factory=dict)
+
+
+def _ipv4_addresses(inventory: str) -> tuple[str, ...]:
+    nics = json.loads(inventory).get("interfaces", [])
+    addresses: list[str] = sum((nic.get("ipv4_addresses", []) for nic in nics), [])
+    return tuple(a.split("/")[0] for a in addresses)
+
+
+class StatusPoller:
+    """
+    Fetches the hosts and clusters from the Assisted Installer once per
+    interval for everybody, instead of every waiter listing all hosts on its
+    own. The result is kept as an indexed Snapshot (inventories are only
+    parsed when they change).
+
+    snapshot() returns the latest snapshot, fetching a new one if it's
+    older than "max_age". wait() blocks until a condition on the snapshot
+    holds and polls in the background while anybody waits. Callbacks added
+    with subscribe() are called with (host name, old status, new status) on
+    every host status change.
+    """
+
+    def __init__(self, fetch_hosts: Callable[[], list[dict[str, str]]], fetch_clusters: Callable[[], dict[str, str]], interval: float = POLL_INTERVAL):
+        self._fetch_hosts = fetch_hosts
+        self._fetch_clusters = fetch_clusters
+        self._interval = interval
+        self._cond = threading.Condition()
+        self._fetch_lock = threading.Lock()
+        self._snapshot = Snapshot()
+        self._stale = True
+        self._waiters = 0
+        self._thread: Optional[threading.Thread] = None
+        self._subscribers: list[Callable[[str, Optional[str], str], None]] = []
+        self._parsed: dict[str, tuple[str, tuple[str, ...]]] = {}
+
+    def invalidate(self) -> None:
+        # Called after changing something, the next snapshot() fetches again.
+        with self._cond:
+            self._stale = True
+
+    def subscribe(self, callback: Callable[[str, Optional[str], str], None]) -> None:
+        with self._cond:
+            self._subscribers.append(callback)
+
+    def snapshot(self, max_age: Optional[float] = None) -> Snapshot:
+        max_age = self._interval if max_age is None else max_age
+        with self._cond:
+            if not self._stale and time.monotonic() - self._snapshot.taken < max_age:
+                return self._snapshot
+        return self._refresh(max_age)
+
+    def _refresh(self, max_age: float) -> Snapshot:
+        # Only one fetch at a time, the others use its result.
+        with self._fetch_lock:
+            with self._cond:
+                if not self._stale and time.monotonic() - self._snapshot.taken < max_age:
+                    return self._snapshot
+            hosts = self._fetch_hosts()
+            clusters = self._fetch_clusters()
+            snapshot = self._index(hosts, clusters)
+            with self._cond:
+                old = self._snapshot
+                self._snapshot = snapshot
+                self._stale = False
+                subscribers = list(self._subscribers)
+                self._cond.notify_all()
+        for h in snapshot.hosts:
+            prev = old.by_name.get(h.name)
+            if prev is None or prev.status != h.status:
+                for cb in subscribers:
+                    cb(h.name, prev.status if prev else None, h.status)
+        return snapshot
+
+    def _index(self, hosts: list[dict[str, str]], clusters: dict[str, str]) -> Snapshot:
+        states = []
+        for h in hosts:
+            if "inventory" not in h:
+                continue
+            cached = self._parsed.get(h["id"])
+            if cached is None or cached[0] != h["inventory"]:
+                cached = (h["inventory"], _ipv4_addresses(h["inventory"]))
+                self._parsed[h["id"]] = cached
+            states.append(HostState(h["requested_hostname"], h["id"], h["status"], h["status_info"], h["inventory"], cached[1]))
+        by_ip = {ip: h for h in states for ip in h.ipv4_addresses}
+        return Snapshot(time.monotonic(), tuple(states), {h.name: h for h in states}, by_ip, clusters)
+
+    def _poll(self) -> None:
+        while True:
+            with self._cond:
+                if not self._waiters:
+                    self._thread = None
+                    return
+            try:
+                self._refresh(0)
+            except Exception as e:
+                logger.info(f"Failed to poll the Assisted Installer: {e}")
+            time.sleep(self._interval)
+
+    def wait(self, condition: Callable[[Snapshot], Optional[T]], timeout: Optional[float] = None) -> Optional[T]:
+        # Returns the first non-None result of "condition", or None on timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiters += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, daemon=True)
+                self._thread.start()
+        try:
+            with self._cond:
+                while True:
+                    ret = condition(self._snapshot) if self._snapshot.taken and not self._stale else None
+                    if ret is not None:
+                        return ret
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+        finally:
+            with self._cond:
+                self._waiters -= 1
@@ -1,4 +1,5 @@
 import common
+import concurrencyLimits
 import os
 import argparse
 import sys
@@ -83,11 +84,15 @@ def parse_args() -> argparse.Namespace:
                 raise argparse.ArgumentError(self, f"Invalid {option_string} value {repr(values)} is not a range")
 
     parser = argparse.ArgumentParser(description='Cluster deployment automation')
-    parser.add_argument('config', metavar='config', type=str, help='Yaml file with config').completer = yaml_completer  # type: ignore
+    parser.add_argument('config', metavar='config', type=str, nargs='+', help='Yaml file(s) with config, the clusters of several files are deployed together').completer = yaml_completer  # type: ignore
     parser.add_argument('-v', '--verbosity', choices=['debug', 'info', 'warning', 'error', 'critical'], default='info', help='Set the logging level (default: info)')
     parser.add_argument('--secret', dest='secrets_path', default='', action='store', type=str, help='pull_secret.json path (default is in cwd)')
     parser.add_argument('--cda-config', dest='cda_config', default='/root/cda-config.yaml', action='store', type=str, help='defaults to /rooot/cda-config.yaml')
     parser.add_argument('--assisted-installer-url', dest='url', default='192.168.122.1', action='store', type=str, help='If set to 0.0.0.0 (the default), Assisted Installer will be started locally')
+    parser.add_argument('--record-hosts', dest='record_hosts', default=None, type=str, help='Record all host operations (commands, file operations, ...) with their timings to this transcript file')
+    parser.add_argument('--replay-hosts', dest='replay_hosts', default=None, type=str, help='Replay host operations from a transcript recorded with --record-hosts, without accessing any host, and print benchmark stats')
+    parser.add_argument('--trace', dest='trace', default=None, type=str, help='Write a Chrome/Perfetto trace (JSON) of the deployment phases, host commands, file transfers, AI calls and waits to this file, and log the slowest of them')
+    parser.add_argument('--replay-latency-scale', dest='replay_latency_scale', default=1.0, type=float, help='Scale the recorded latencies when replaying (default: 1.0, 0 to not wait)')
 
     subparsers = parser.add_subparsers(title='subcommands', dest='subcommand')
 
@@ -102,6 +107,13 @@ def parse_args() -> argparse.Namespace:
     deploy_parser.add_argument('-d', '--skip-steps', dest='skip_steps', type=str, default="", help="Comma-separated list of steps to skip").completer = step_completer  # type: ignore
     deploy_parser.add_argument('-w', '--workers', action=WorkersIncludeExcludeAction, help='Range and/or list of workers to include')
     deploy_parser.add_argument('-sw', '--skip-workers', action=WorkersIncludeExcludeAction, help='Range and/or list of workers to exclude')
+    deploy_parser.add_argument('--pipeline-workers', dest='pipeline_workers', action='store_true', help='Boot the workers on worker-only hosts into discovery while the masters are installed, and add them as soon as the cluster accepts workers')
+    deploy_parser.add_argument('--resume', dest='resume', action='store_true', help='Continue a failed deployment from its journal instead of starting over, skipping the teardown and anything that is still done')
+    deploy_parser.add_argument('--plan', dest='plan', action='store_true', help='Print the tasks of the deployment and their dependencies without running them')
+    deploy_parser.add_argument('--all-clusters', dest='all_clusters', action='store_true', help='Deploy all clusters of the config file(s) concurrently instead of only the first one of each')
+    deploy_parser.add_argument('--max-iso-downloads', dest='max_iso_downloads', type=int, default=2, help='Maximum number of ISOs downloaded at once across all clusters (default: 2, 0 for no limit)')
+    deploy_parser.add_argument('--max-bmc-operations', dest='max_bmc_operations', type=int, default=8, help='Maximum number of BMC (Redfish) operations at once across all clusters (default: 8, 0 for no limit)')
+    deploy_parser.add_argument('--max-cpu-heavy', dest='max_cpu_heavy', type=int, default=1, help='Maximum number of CPU heavy local jobs (e.g. building the CoreOS image) at once across all clusters (default: 1, 0 for no limit)')
 
     snapshot_parser = subparsers.add_parser('snapshot', help='Take or restore snapshots')
     snapshot_parser.add_argument('loadsave', metavar='loadsave', type=str, help='Load or save a snapshot', choices=(("load", "save")))
@@ -110,6 +122,8 @@ def parse_args() -> argparse.Namespace:
     argcomplete.autocomplete(parser)
 
     args = parser.parse_args()
+    args.configs = args.config
+    args.config = args.configs[0]
     if args.subcommand == "deploy":
         args.steps = remove_empty_strings(args.steps)
         args.skip_steps = remove_empty_strings(args.skip_steps)
@@ -133,6 +147,10 @@ def parse_args() -> argparse.Namespace:
         range_list: Optional[common.RangeList] = getattr(args, 'worker_range_accumulator', None)
         args.worker_range = range_list or common.RangeList.UNLIMITED
 
+        concurrencyLimits.configure(concurrencyLimits.ISO_DOWNLOAD, args.max_iso_downloads)
+        concurrencyLimits.configure(concurrencyLimits.BMC, args.max_bmc_operations)
+        concurrencyLimits.configure(concurrencyLimits.CPU_HEAVY, args.max_cpu_heavy)
+
     configure_logger(getattr(logging, args.verbosity.upper()))
 
     if not args.secrets_path:
@@ -3,11 +3,14 @@ import itertools
 import time
 import os
 import json
-from typing import Optional
+from typing import Any, Callable, Optional
 import requests
 from ailib import AssistedClient
 import common
+from aiPoller import HostState, Snapshot, StatusPoller
 from logger import logger
+import tracing
+import concurrencyLimits
 import sys
 import tenacity
 
@@ -33,12 +36,63 @@ class ClusterInfo:
     status: str
 
 
+def _host_info(h: HostState) -> AssistedClientHostInfo:
+    return AssistedClientHostInfo(h.name, h.id, h.status, h.status_info, h.inventory)
+
+
 class AssistedClientAutomation(AssistedClient):  # type: ignore
     def __init__(self, url: str):
         super().__init__(url, quiet=True, debug=False)
+        # Host and cluster state is read from the poller's snapshot, shared
+        # by all waiters. Anything changing the state invalidates it.
+        self._poller = StatusPoller(self.list_hosts, lambda: {c.name: c.status for c in self.get_cluster_info_all()})
+        self._poller.subscribe(lambda name, old, new: logger.debug(f"AI host {name}: {old} -> {new}"))
+        self.api.call_api = self._traced(self.api.call_api)
+
+    @staticmethod
+    def _traced(call_api: Callable[..., Any]) -> Callable[..., Any]:
+        # Every REST call of the client goes through ApiClient.call_api().
+        def traced(resource_path: str, method: str, *args: Any, **kwargs: Any) -> Any:
+            with tracing.span(f"{method} {resource_path}", tracing.AI):
+                return call_api(resource_path, method, *args, **kwargs)
+
+        return traced
+
+    def _changed(self) -> None:
+        self._poller.invalidate()
+
+    def update_host(self, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return super().update_host(*args, **kwargs)
+        finally:
+            self._changed()
+
+    def delete_host(self, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return super().delete_host(*args, **kwargs)
+        finally:
+            self._changed()
+
+    def delete_cluster(self, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return super().delete_cluster(*args, **kwargs)
+        finally:
+            self._changed()
+
+    def create_cluster(self, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return super().create_cluster(*args, **kwargs)
+        finally:
+            self._changed()
+
+    def start_cluster(self, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return super().start_cluster(*args, **kwargs)
+        finally:
+            self._changed()
 
     def cluster_exists(self, name: str) -> bool:
-        return any(name == x.name for x in self.get_cluster_info_all())
+        return name in self._poller.snapshot().clusters
 
     def ensure_cluster_deleted(self, name: str) -> None:
         logger.info(f"Ensuring that cluster {name} is not present")
@@ -103,7 +157,8 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
         logger.info(f"Download iso from {infra_env} to {path}, retrying for {retries * timeout}s")
         for _ in range(retries):
             try:
-                self.download_iso(infra_env, path)
+                with concurrencyLimits.slot(concurrencyLimits.ISO_DOWNLOAD):
+                    self.download_iso(infra_env, path)
                 break
             except Exception:
                 time.sleep(timeout)
@@ -113,15 +168,19 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
     def wait_cluster_status(self, cluster_name: str, status: str) -> None:
         logger.info("Waiting for cluster state to be ready")
         cur_state = None
-        while True:
-            new_state = self.cluster_state(cluster_name)
+
+        def reached(snapshot: Snapshot) -> Optional[bool]:
+            nonlocal cur_state
+            new_state = snapshot.clusters.get(cluster_name)
+            if new_state is None:
+                logger.error_and_exit(f"Requested status of cluster '{cluster_name}' but couldn't find it")
             if new_state != cur_state:
                 logger.info(f"Cluster state changed to {new_state}")
-            time.sleep(10)
-            cur_state = new_state
-            if cur_state == status:
-                break
+                cur_state = new_state
+            return True if new_state == status else None
 
+        with tracing.span(f"cluster {cluster_name} {status}", tracing.WAIT):
+            self._poller.wait(reached)
         self.check_any_host_error()
 
     @tenacity.retry(wait=tenacity.wait_fixed(2), stop=tenacity.stop_after_attempt(5))
@@ -156,6 +215,13 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
             else:
                 logger.error_and_exit(f"Invalid status: ${status}")
 
+    def cached_cluster_state(self, cluster_name: str) -> str:
+        # Like cluster_state(), from the shared snapshot.
+        status = self._poller.snapshot().clusters.get(cluster_name)
+        if status is None:
+            logger.error_and_exit(f"Requested status of cluster '{cluster_name}' but couldn't find it")
+        return status
+
     def ensure_cluster_installing(self, cluster_name: str) -> None:
         self.wait_cluster_status(cluster_name, "ready")
         self._start_until_success(cluster_name)
@@ -166,7 +232,7 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
         prev_cs = ""
 
         for tries in itertools.count(0):
-            cs = self.cluster_state(cluster_name)
+            cs = self.cached_cluster_state(cluster_name)
             if cs != prev_cs:
                 logger.info(f"Cluster state is '{cs}'")
                 prev_cs = cs
@@ -181,25 +247,40 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
         logger.info(f"Took {tries} tries to start cluster {cluster_name}")
 
     def list_ai_hosts(self) -> list[AssistedClientHostInfo]:
-        ret = []
-        for h in filter(lambda x: "inventory" in x, self.list_hosts()):
-            ret.append(AssistedClientHostInfo(h["requested_hostname"], h["id"], h["status"], h["status_info"], h["inventory"]))
-        return ret
+        return [_host_info(h) for h in self._poller.snapshot().hosts]
 
     def get_ai_host(self, name: str) -> Optional[AssistedClientHostInfo]:
-        for h in self.list_ai_hosts():
-            if h.name == name:
-                return h
-        return None
+        h = self._poller.snapshot().by_name.get(name)
+        return _host_info(h) if h is not None else None
 
     def get_ai_host_by_ip(self, ip: str) -> Optional[AssistedClientHostInfo]:
-        for h in self.list_ai_hosts():
-            nics = json.loads(h.inventory)["interfaces"]
-            addresses: list[str] = sum((nic["ipv4_addresses"] for nic in nics), [])
-            stripped_addresses = [a.split("/")[0] for a in addresses]
-            if ip in stripped_addresses:
-                return h
-        return None
+        h = self._poller.snapshot().by_ip.get(ip)
+        return _host_info(h) if h is not None else None
+
+    def wait_host_by_ip(self, ip: str, timeout: Optional[float] = None) -> Optional[AssistedClientHostInfo]:
+        def check(snapshot: Snapshot) -> Optional[AssistedClientHostInfo]:
+            h = snapshot.by_ip.get(ip)
+            return _host_info(h) if h is not None else None
+
+        with tracing.span(f"AI host with IP {ip}", tracing.WAIT) as span:
+            ret = self._poller.wait(check, timeout)
+            span.outcome = "ok" if ret is not None else "timeout"
+        return ret
+
+    def wait_host(self, name: str, condition: Callable[[AssistedClientHostInfo], bool], timeout: Optional[float] = None) -> Optional[AssistedClientHostInfo]:
+        # Waits until host "name" exists and matches "condition" and returns
+        # it (None on timeout). Woken up on each poll of the shared snapshot.
+        def check(snapshot: Snapshot) -> Optional[AssistedClientHostInfo]:
+            h = snapshot.by_name.get(name)
+            if h is None:
+                return None
+            info = _host_info(h)
+            return info if condition(info) else None
+
+        with tracing.span(f"AI host {name}", tracing.WAIT) as span:
+            ret = self._poller.wait(check, timeout)
+            span.outcome = ret.status if ret is not None else "timeout"
+        return ret
 
     def get_ai_ip(self, name: str, ip_range: tuple[str, str]) -> Optional[str]:
         ai_host = self.get_ai_host(name)
@@ -217,7 +298,21 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
 
     def allow_add_workers(self, cluster_name: str) -> None:
         uuid = self.get_ai_cluster_info(cluster_name).id
-        requests.post(f"http://{self.url}/api/assisted-install/v2/clusters/{uuid}/actions/allow-add-workers")
+        with tracing.span("POST allow-add-workers", tracing.AI):
+            requests.post(f"http://{self.url}/api/assisted-install/v2/clusters/{uuid}/actions/allow-add-workers")
+        self._changed()
+
+    def bind_host(self, infra_env: str, host_name: str, cluster_name: str) -> None:
+        # Binds a host discovered through an infraenv without cluster (late binding).
+        infra_env_id = self.get_infra_env_id(infra_env)
+        host_info = self.get_ai_host(host_name)
+        if host_info is None:
+            logger.error_and_exit(f"Can't bind unknown host {host_name}")
+        uuid = self.get_ai_cluster_info(cluster_name).id
+        logger.info(f"Binding host {host_name} to cluster {cluster_name}")
+        with tracing.span("POST bind", tracing.AI):
+            requests.post(f"http://{self.url}/api/assisted-install/v2/infra-envs/{infra_env_id}/hosts/{host_info.id}/actions/bind", json={"cluster_id": uuid})
+        self._changed()
 
     def get_ai_cluster_info(self, cluster_name: str) -> AssistedClientClusterInfo:
         cluster_info = self.info_cluster(cluster_name)
@@ -252,3 +347,4 @@ class AssistedClientAutomation(AssistedClient):  # type: ignore
         if host_info is not None and host_info.status not in ["installed", "added-to-existing-cluster"]:
             logger.info(f"Installing host {name}")
             self.client.v2_install_host(infra_env_id=infra_env_id, host_id=host_info.id)
+            self._changed()
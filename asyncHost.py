@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import shlex
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+import paramiko
+import host
+from logger import logger
+
+
+T = TypeVar("T")
+
+
+class _Exit(Exception):
+    # SystemExit (from logger.error_and_exit) must not escape into the event
+    # loop since it would stop it. It is carried back to the caller instead.
+    def __init__(self, code: object):
+        super().__init__(code)
+        self.code = code
+
+
+class AsyncExecutor:
+    """
+    Runs an asyncio event loop in a background thread, so that synchronous
+    code (like ClusterDeployer) can drive many hosts at once through
+    AsyncHost without spawning one thread per node.
+
+    Output of remote commands is read on the event loop (paramiko channels
+    are selectable). Operations that can only be done blocking (connecting,
+    SFTP, BMC calls, opening channels) are offloaded to a bounded thread pool.
+    Concurrency is limited globally, per host and per BMC.
+    """
+
+    def __init__(self, max_concurrency: int = 64, per_host: int = 8, per_bmc: int = 2):
+        self._per_host = per_host
+        self._per_bmc = per_bmc
+        self._blocking = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="async-host")
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._host_sems: dict[str, asyncio.Semaphore] = {}
+        self._bmc_sems: dict[str, asyncio.Semaphore] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-host-loop", daemon=True)
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        # Sync facade: run "coro" on the event loop and wait for the result.
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncExecutor.run() can't be called from the event loop")
+        try:
+            return asyncio.run_coroutine_threadsafe(_guard(coro), self._loop).result()
+        except _Exit as e:
+            sys.exit(e.code)  # type: ignore
+
+    def run_all(self, coros: list[Coroutine[Any, Any, T]]) -> list[T]:
+        async def gather() -> list[T]:
+            return list(await asyncio.gather(*(_guard(c) for c in coros)))
+
+        return self.run(gather())
+
+    async def blocking(self, func: Callable[..., T], *args: Any) -> T:
+        async with self._global:
+            return await self._loop.run_in_executor(self._blocking, func, *args)
+
+    def host_semaphore(self, hostname: str) -> asyncio.Semaphore:
+        # Only accessed from the event loop thread, no locking needed.
+        return self._host_sems.setdefault(hostname, asyncio.Semaphore(self._per_host))
+
+    def bmc_semaphore(self, url: str) -> asyncio.Semaphore:
+        return self._bmc_sems.setdefault(url, asyncio.Semaphore(self._per_bmc))
+
+    def shutdown(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._blocking.shutdown(wait=False)
+
+
+class AsyncHost:
+    """
+    asyncio counterpart of host.Host. It wraps a host.Host (and therefore
+    shares its pooled SSH connection and login state).
+    """
+
+    def __init__(self, h: host.Host, executor: Optional[AsyncExecutor] = None):
+        self._host = h
+        self._executor = executor if executor is not None else default_executor()
+
+    def hostname(self) -> str:
+        return self._host.hostname()
+
+    async def ssh_connect(self, username: str, password: Optional[str] = None, **kwargs: Any) -> None:
+        def connect() -> None:
+            self._host.ssh_connect(username, password, **kwargs)
+
+        await self._executor.blocking(connect)
+
+    async def run(self, cmd: str, log_level: int = logging.DEBUG) -> host.Result:
+        if self._host.intercepted:
+            async with self._executor.host_semaphore(self.hostname()):
+                return await self._executor.blocking(self._host.run, cmd, log_level)
+
+        if self._host.sudo_needed:
+            cmd = "sudo " + cmd
+        if log_level >= 0:
+            logger.log(log_level, f"running command {cmd} on {self.hostname()}")
+
+        async with self._executor.host_semaphore(self.hostname()):
+            if self._host.is_localhost():
+                ret = await self._run_local(cmd)
+            else:
+                ret = await self._run_remote(cmd)
+
+        if log_level >= 0:
+            logger.log(log_level, ret)
+        return ret
+
+    async def run_or_die(self, cmd: str) -> host.Result:
+        ret = await self.run(cmd)
+        if ret.returncode:
+            logger.error_and_exit(f"{cmd} failed: {ret.err}")
+        return ret
+
+    async def _run_local(self, cmd: str) -> host.Result:
+        pipe = asyncio.subprocess.PIPE
+        proc = await asyncio.create_subprocess_exec(*shlex.split(cmd), stdout=pipe, stderr=pipe)
+        out, err = await proc.communicate()
+        assert proc.returncode is not None
+        return host.Result(out.decode("utf-8", errors="replace"), err.decode("utf-8", errors="replace"), proc.returncode)
+
+    async def _run_remote(self, cmd: str) -> host.Result:
+        while True:
+            chan: Optional[paramiko.Channel] = None
+            try:
+                # Opening the channel waits for the server, so do it off-loop.
+                chan = await self._executor.blocking(self._host._exec_channel, cmd)
+                return await self._read_channel(chan)
+            except Exception as e:
+                logger.debug(f"{e}: connection lost while running command on {self.hostname()}, reconnecting...")
+                await self._executor.blocking(self._host._reconnect)
+            finally:
+                if chan is not None:
+                    chan.close()
+
+    async def _read_channel(self, chan: paramiko.Channel) -> host.Result:
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        out: list[bytes] = []
+        err: list[bytes] = []
+        fd = chan.fileno()
+        loop.add_reader(fd, ready.set)
+        try:
+            while True:
+                ready.clear()
+                got_data = False
+                while chan.recv_ready():
+                    got_data = True
+                    out.append(chan.recv(host._READ_SIZE))
+                while chan.recv_stderr_ready():
+                    got_data = True
+                    err.append(chan.recv_stderr(host._READ_SIZE))
+                if got_data:
+                    continue
+                if chan.exit_status_ready():
+                    returncode = chan.recv_exit_status()
+                    break
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            loop.remove_reader(fd)
+        return host.Result(b"".join(out).decode("utf-8", errors="replace"), b"".join(err).decode("utf-8", errors="replace"), returncode)
+
+    async def copy_to(self, src_file: str, dst_file: str) -> None:
+        async with self._executor.host_semaphore(self.hostname()):
+            await self._executor.blocking(self._host.copy_to, src_file, dst_file)
+
+    async def copy_from(self, src_file: str, dst_file: str) -> None:
+        async with self._executor.host_semaphore(self.hostname()):
+            await self._executor.blocking(self._host.copy_from, src_file, dst_file)
+
+    async def read_file(self, file_name: str) -> str:
+        async with self._executor.host_semaphore(self.hostname()):
+            return await self._executor.blocking(self._host.read_file, file_name)
+
+    async def write(self, fn: str, contents: str) -> None:
+        async with self._executor.host_semaphore(self.hostname()):
+            await self._executor.blocking(self._host.write, fn, contents)
+
+    async def _bmc_op(self, op: Callable[[], None]) -> None:
+        bmc = self._host._bmc
+        if bmc is None:
+            raise Exception(f"Can't do BMC operations without bmc on {self.hostname()}")
+        async with self._executor.bmc_semaphore(bmc.url):
+            await self._executor.blocking(op)
+
+    async def boot_iso_redfish(self, iso_path: str) -> None:
+        await self._bmc_op(lambda: self._host.boot_iso_redfish(iso_path))
+
+    async def cold_boot(self) -> None:
+        await self._bmc_op(self._host.cold_boot)
+
+    async def stop(self) -> None:
+        await self._bmc_op(self._host.stop)
+
+    async def start(self) -> None:
+        await self._bmc_op(self._host.start)
+
+
+async def _guard(coro: Coroutine[Any, Any, T]) -> T:
+    try:
+        return await coro
+    except SystemExit as e:
+        raise _Exit(e.code) from None
+
+
+_default_executor: Optional[AsyncExecutor] = None
+_default_executor_lock = threading.Lock()
+
+
+def default_executor() -> AsyncExecutor:
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = AsyncExecutor()
+        return _default_executor
@@ -3,12 +3,15 @@
 # PYTHON_ARGCOMPLETE_OK
 from assistedInstaller import AssistedClientAutomation
 from assistedInstallerService import AssistedInstallerService
-from clustersConfig import ClustersConfig, ExtraConfigArgs
+from clustersConfig import ClustersConfig, ExtraConfigArgs, cluster_count
 from clusterDeployer import ClusterDeployer
 from isoDeployer import IsoDeployer
 from arguments import parse_args
 import argparse
 import host
+import hostReplay
+import multiCluster
+import tracing
 from logger import logger
 from clusterSnapshotter import ClusterSnapshotter
 from virtualBridge import VirBridge
@@ -26,7 +29,32 @@ def check_and_cleanup_disk(threshold_gb: int = 10) -> None:
         h.run("podman image prune -a -f")
 
 
-def main_deploy_openshift(cc: ClustersConfig, args: argparse.Namespace) -> None:
+def main_deploy_openshift(ccs: list[ClustersConfig], args: argparse.Namespace) -> None:
+    """
+    Here we will use the AssistedClient from the aicli package from:
+        https://github.com/karmab/aicli
+    The usage details are here:
+        https://aicli.readthedocs.io/en/latest/
+
+    Several clusters are deployed concurrently, sharing the Assisted
+    Installer and the local bridge (see multiCluster.py).
+    """
+    if len(ccs) > 1:
+        multiCluster.validate(ccs)
+        bridge_config = multiCluster.shared_bridge(ccs)
+        for c in ccs:
+            c.local_bridge_config = bridge_config
+    cc = ccs[0]
+
+    ai = AssistedClientAutomation(f"{args.url}:8090")
+    barrier = multiCluster.Barrier([c.name for c in ccs]) if len(ccs) > 1 else None
+    cds = {c.name: ClusterDeployer(c, ai, args.steps, args.secrets_path, pipeline_workers=args.pipeline_workers, resume=args.resume, teardown_barrier=barrier) for c in ccs}
+
+    if args.plan:
+        for cd in cds.values():
+            print(cd.plan())
+        return
+
     # Make sure the local virtual bridge base configuration is correct.
     local_bridge = VirBridge(host.LocalHost(), cc.local_bridge_config)
     local_bridge.configure(api_port=None)
@@ -40,25 +68,25 @@ def main_deploy_openshift(cc: ClustersConfig, args: argparse.Namespace) -> None:
         logger.info(f"Will use Assisted Installer running at {args.url}")
         ais = None
 
-    """
-    Here we will use the AssistedClient from the aicli package from:
-        https://github.com/karmab/aicli
-    The usage details are here:
-        https://aicli.readthedocs.io/en/latest/
-    """
-    ai = AssistedClientAutomation(f"{args.url}:8090")
-    cd = ClusterDeployer(cc, ai, args.steps, args.secrets_path)
-
     if args.additional_post_config:
         ec = ExtraConfigArgs("", args.additional_post_config)
-        cd._prepost_config(ec)
+        for cd in cds.values():
+            cd._prepost_config(ec)
         return
 
-    if args.teardown or args.teardown_full:
-        cd.teardown_workers()
-        cd.teardown_masters()
+    def deploy(c: ClustersConfig) -> None:
+        cd = cds[c.name]
+        if args.teardown or args.teardown_full:
+            cd.teardown_workers()
+            cd.teardown_masters()
+            cd.remove_journal()
+        else:
+            cd.deploy()
+
+    if len(ccs) == 1:
+        deploy(cc)
     else:
-        cd.deploy()
+        multiCluster.run(ccs, deploy)
 
     if args.teardown_full and ais:
         ais.stop()
@@ -74,18 +102,27 @@ def main_deploy(args: argparse.Namespace) -> None:
         cdaConfig = configLoader.load(args.cda_config, CdaConfig)
         auth.prep_auth(cdaConfig.token_user, cdaConfig.token)
 
-    cc = ClustersConfig(
-        args.config,
-        secrets_path=args.secrets_path,
-        worker_range=args.worker_range,
-    )
+    ccs = []
+    for config in args.configs:
+        indexes = range(cluster_count(config)) if args.all_clusters else range(1)
+        for index in indexes:
+            ccs.append(
+                ClustersConfig(
+                    config,
+                    secrets_path=args.secrets_path,
+                    worker_range=args.worker_range,
+                    index=index,
+                )
+            )
 
     check_and_cleanup_disk(10)
 
-    if cc.kind == "openshift":
-        main_deploy_openshift(cc, args)
+    if all(cc.kind == "openshift" for cc in ccs):
+        main_deploy_openshift(ccs, args)
+    elif len(ccs) == 1:
+        main_deploy_iso(ccs[0], args)
     else:
-        main_deploy_iso(cc, args)
+        logger.error_and_exit("Only openshift clusters can be deployed together")
 
 
 def main_snapshot(args: argparse.Namespace) -> None:
@@ -112,14 +149,37 @@ def main_snapshot(args: argparse.Namespace) -> None:
 def main() -> None:
     args = parse_args()
 
-    is_yaml = args.config.endswith('.yaml') or args.config.endswith('.yml')
+    is_yaml = all(c.endswith('.yaml') or c.endswith('.yml') for c in args.configs)
     if not is_yaml:
         logger.error_and_exit("Please specify a yaml configuration file")
 
-    if args.subcommand == "deploy":
-        main_deploy(args)
-    elif args.subcommand == "snapshot":
-        main_snapshot(args)
+    if args.record_hosts and args.replay_hosts:
+        logger.error_and_exit("Can't both record and replay host operations")
+
+    recorder = hostReplay.record(args.record_hosts) if args.record_hosts else None
+    replayer = hostReplay.replay(args.replay_hosts, latency_scale=args.replay_latency_scale) if args.replay_hosts else None
+    tracer = tracing.enable() if args.trace else None
+
+    def run() -> None:
+        if args.subcommand == "deploy":
+            main_deploy(args)
+        elif args.subcommand == "snapshot":
+            main_snapshot(args)
+
+    try:
+        if replayer is not None:
+            replayer.benchmark(run)
+        else:
+            run()
+    finally:
+        host.stop_dpu_tools()
+        if recorder is not None:
+            recorder.close()
+        if replayer is not None:
+            logger.info(f"Replay: {replayer.stats}")
+        if tracer is not None:
+            tracer.export(args.trace)
+            logger.info(f"Trace written to {args.trace}, slowest spans:\n{tracer.summary()}")
 
 
 if __name__ == "__main__":
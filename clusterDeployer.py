@@ -1,19 +1,21 @@
+import functools
 import itertools
 import os
 import time
 import json
 import shutil
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from typing import Generator
 from typing import Union
 from typing import Callable
 import re
-import logging
-from assistedInstaller import AssistedClientAutomation
+from assistedInstaller import AssistedClientAutomation, AssistedClientHostInfo
 import host
-from clusterNode import ClusterNode
-from clustersConfig import ClustersConfig
+import asyncHost
+from clusterNode import ClusterNode, VmClusterNode
+from clustersConfig import ClustersConfig, ExtraConfigArgs, NodeConfig
 from common import wait_futures
 from k8sClient import K8sClient
 import common
@@ -26,6 +28,12 @@ from virshPool import VirshPool
 from arguments import PRE_STEP, WORKERS_STEP, MASTERS_STEP, POST_STEP
 from libvirt import Libvirt
 from baseDeployer import BaseDeployer
+from taskGraph import TaskGraph
+import tracing
+import deployJournal
+import warmPool
+import multiCluster
+from deployJournal import IMAGE_COPIED, VM_DEFINED, BOOTED, RENAMED, KNOWN, INSTALLING, REBOOTED, READY
 
 
 def match_to_proper_version_format(version_cluster_config: str) -> str:
@@ -38,15 +46,50 @@ def match_to_proper_version_format(version_cluster_config: str) -> str:
 
 
 _BF_ISO_PATH = "/root/iso"
+# Hosts preinstalled at the same time (each boots an ISO through its BMC).
+MAX_CONCURRENT_BMC_BOOTS = 4
+# /etc/hosts is shared by all clusters deployed by this process.
+_etc_hosts_lock = threading.Lock()
+# Seconds between setting the time on a BF worker.
+BF_TIME_SYNC_INTERVAL = 300
+# Hosts, nodes and AI resources torn down at the same time.
+MAX_CONCURRENT_TEARDOWNS = 8
+# Cluster states once the installation started, and host progress after the
+# first reboot (see _reconcile_master()).
+_CLUSTER_INSTALL_STARTED = ("preparing-for-installation", "installing", "installing-pending-user-action", "finalizing", "installed")
+_AFTER_REBOOT = ("Waiting for control plane", "Waiting for controller", "Configuring", "Joined", "Done")
+
+
+def _installation_finished(info: AssistedClientHostInfo) -> bool:
+    return info.status in ["error", "added-to-existing-cluster"]
+
+
+def _run_batch_or_each(h: host.Host, cmds: list[str]) -> list[host.Result]:
+    # A Result for each command, even when the batch was cut short (e.g. on a
+    # flaky BF link): the commands it didn't get to run one by one.
+    results = h.run_batch(cmds)
+    return [results[i] if i < len(results) and results[i].err != host.BATCH_CUT_SHORT else h.run(cmd) for i, cmd in enumerate(cmds)]
 
 
 class ClusterDeployer(BaseDeployer):
-    def __init__(self, cc: ClustersConfig, ai: AssistedClientAutomation, steps: list[str], secrets_path: str):
+    def __init__(self, cc: ClustersConfig, ai: AssistedClientAutomation, steps: list[str], secrets_path: str, *, pipeline_workers: bool = False, resume: bool = False, teardown_barrier: Optional[multiCluster.Barrier] = None):
         super().__init__(cc, steps)
         self.bf_connections: dict[str, host.Host] = {}
+        self._bf_time_synced: dict[str, float] = {}
+        # Image IDs per BF worker found not to be corrupt.
+        self._bf_images_checked: dict[str, set[str]] = {}
         self._client: Optional[K8sClient] = None
         self._ai = ai
         self._secrets_path = secrets_path
+        self._worker_iso: Optional[str] = None
+        self._journal = deployJournal.Journal(deployJournal.default_path(cc.name), resume)
+        # Hosts preinstalled by this run or the one being resumed.
+        self._preinstalled = {t.split(":", 1)[1] for t in self._journal.tasks() if t.startswith("preinstall:")}
+        # Names of the workers booted into discovery by discover_workers().
+        self._discovered: set[str] = set()
+        self._pipeline_workers = pipeline_workers and MASTERS_STEP in steps and WORKERS_STEP in steps and cc.kind != "microshift"
+        if pipeline_workers and not self._pipeline_workers:
+            logger.info("Pipelined worker provisioning needs both the masters and workers steps, not pipelining")
 
         lh = host.LocalHost()
         lh_config = list(filter(lambda hc: hc.name == lh.hostname(), self._cc.hosts))[0]
@@ -54,6 +97,9 @@ class ClusterDeployer(BaseDeployer):
         self._remote_hosts = {bm.name: ClusterHost(host.RemoteHost(bm.name), bm, cc, cc.remote_bridge_config) for bm in self._cc.hosts if bm.name != lh.hostname()}
         self._all_hosts = [self._local_host] + list(self._remote_hosts.values())
         self._all_nodes = {k8s_node.config.name: k8s_node for h in self._all_hosts for k8s_node in h._k8s_nodes()}
+        # Shared with the clusters deployed alongside, see _add_teardown_barrier().
+        self._teardown_barrier = teardown_barrier
+        self._warm_pool = warmPool.WarmPool(cc, ai, {h.config.name: h for h in self._all_hosts}, self._local_host.bridge, secrets_path)
 
         self.masters_arch = "x86_64"
         is_bf_map = [x.kind == "bf" for x in self._cc.workers]
@@ -111,30 +157,38 @@ class ClusterDeployer(BaseDeployer):
             return
 
         logger.info(f"Tearing down {cluster_name}")
-        self._ai.ensure_cluster_deleted(self._cc.name)
-
-        self.update_dnsmasq(setup=False)
-
-        for h in self._all_hosts_with_masters():
-            h.teardown_nodes(h.k8s_master_nodes)
+        graph = TaskGraph(max_workers=MAX_CONCURRENT_TEARDOWNS)
+        graph.add("delete_cluster", functools.partial(self._ai.ensure_cluster_deleted, cluster_name), outputs=("cluster_deleted",))
+        for infra_env in [f"{cluster_name}-x86_64", f"{cluster_name}-arm64", f"{cluster_name}-x86_64-workers", f"{cluster_name}-arm64-workers"]:
+            graph.add(f"delete_infraenv:{infra_env}", functools.partial(self._ai.ensure_infraenv_deleted, infra_env), inputs=("cluster_deleted",))
+        graph.add("update_dnsmasq", functools.partial(self.update_dnsmasq, setup=False))
+        graph.add("delete_kubeconfig", functools.partial(AssistedClientAutomation.delete_kubeconfig_and_secrets, cluster_name, self._cc.kubeconfig))
 
-        self._ai.ensure_infraenv_deleted(f"{cluster_name}-x86_64")
-        self._ai.ensure_infraenv_deleted(f"{cluster_name}-arm64")
-
-        self._local_host.bridge.remove_dhcp_entries(self._cc.master_vms())
+        hosts_with_masters = self._all_hosts_with_masters()
+        nodes_removed = self._add_teardown_nodes(graph, {h: h.k8s_master_nodes for h in hosts_with_masters})
+        graph.add("remove_dhcp_entries", functools.partial(self._local_host.bridge.remove_dhcp_entries, self._cc.master_vms()), inputs=nodes_removed, outputs=("dhcp_removed",))
+        graph.add("teardown_warm_pool", self._warm_pool.teardown, outputs=("warm_pool_removed",))
 
         image_paths = {os.path.dirname(n.image_path) for n in self._cc.local_vms()}
-        for image_path in image_paths:
+        for image_path in sorted(image_paths):
             vp = VirshPool(
                 name=os.path.basename(image_path),
                 rsh=self._local_host.hostconn,
             )
-            vp.ensure_removed()
+            graph.add(f"remove_pool:{vp.name}", vp.ensure_removed, inputs=(*nodes_removed, "warm_pool_removed"))
 
-        for h in self._all_hosts_with_masters():
-            h.ensure_not_linked_to_network()
+        # Unlinking the hosts from the network must wait for the DHCP entries to be removed.
+        for h in hosts_with_masters:
+            graph.add(f"unlink:{h.config.name}", h.ensure_not_linked_to_network, inputs=("dhcp_removed",))
+        graph.run()
 
-        AssistedClientAutomation.delete_kubeconfig_and_secrets(self._cc.name, self._cc.kubeconfig)
+    def _add_teardown_nodes(self, graph: TaskGraph, nodes: dict[ClusterHost, list[ClusterNode]]) -> tuple[str, ...]:
+        # Adds a task per host tearing down its "nodes", returns their outputs.
+        outputs: tuple[str, ...] = ()
+        for h, h_nodes in sorted(nodes.items(), key=lambda e: e[0].config.name):
+            graph.add(f"teardown_nodes:{h.config.name}", functools.partial(h.teardown_nodes, h_nodes), outputs=(f"nodes_removed:{h.config.name}",))
+            outputs += (f"nodes_removed:{h.config.name}",)
+        return outputs
 
     def teardown_workers(self) -> None:
         cluster_name = self._cc.name
@@ -147,29 +201,32 @@ class ClusterDeployer(BaseDeployer):
         else:
             return
 
-        for h in self._all_hosts_with_workers():
-            h.teardown_nodes(h.k8s_worker_nodes)
-
-        self._local_host.remove_dhcp_entries(self._cc.worker_vms())
-
-        # Find whether the host will still hosts some vms after tearing down what's configured.
+        graph = TaskGraph(max_workers=MAX_CONCURRENT_TEARDOWNS)
+        nodes_removed = self._add_teardown_nodes(graph, {h: h.k8s_worker_nodes for h in self._all_hosts_with_workers()})
+        graph.add("remove_dhcp_entries", functools.partial(self._local_host.remove_dhcp_entries, self._cc.worker_vms()), inputs=nodes_removed, outputs=("dhcp_removed",))
         for h in self._all_hosts_with_only_workers():
-            installed_vms = []
-            if h.hosts_vms:
-                installed_vms = h.hostconn.run("virsh list --all --name").out.strip().split()
-            if not installed_vms:
-                h.ensure_not_linked_to_network()
-            else:
-                logger.debug(f"bridge not unlinked as {installed_vms} remaining on {h.config.name}")
+            graph.add(f"unlink:{h.config.name}", functools.partial(self._unlink_if_unused, h), inputs=("dhcp_removed",))
 
         # if masters in steps, following steps are not needed as tearing down masters take care of this.
-        if MASTERS_STEP in self.steps:
-            return
+        if MASTERS_STEP not in self.steps:
+            for w in self._cc.workers:
+                graph.add(f"delete_worker:{w.name}", functools.partial(self._delete_worker, w.name))
+        graph.run()
 
-        for w in self._cc.workers:
-            logger.info(f"Deleting worker {w.name}")
-            self.client().delete_node(w.name)
-            self._ai.delete(w.name)
+    def _unlink_if_unused(self, h: ClusterHost) -> None:
+        # Find whether the host will still hosts some vms after tearing down what's configured.
+        installed_vms = []
+        if h.hosts_vms:
+            installed_vms = h.hostconn.run("virsh list --all --name").out.strip().split()
+        if not installed_vms:
+            h.ensure_not_linked_to_network()
+        else:
+            logger.debug(f"bridge not unlinked as {installed_vms} remaining on {h.config.name}")
+
+    def _delete_worker(self, name: str) -> None:
+        logger.info(f"Deleting worker {name}")
+        self.client().delete_node(name)
+        self._ai.delete(name)
 
     def need_external_network(self) -> bool:
         vm_bm = [x for x in self._cc.workers if x.kind == "vm" and x.node != "localhost"]
@@ -182,51 +239,208 @@ class ClusterDeployer(BaseDeployer):
         return remote_masters != 0 or remote_workers != 0 or len(vm_bm) != 0
 
     def deploy(self) -> None:
-        duration = self._empty_timers()
+        graph = self.graph()
+        self._add_teardown_barrier(graph)
+        ok = False
+        try:
+            graph.run()
+            ok = True
+        finally:
+            if self._teardown_barrier is not None:
+                # Failed before being torn down, the others don't wait for it.
+                self._teardown_barrier.arrive(self._cc.name)
+            try:
+                # A failed deployment isn't hidden by the pool's failure.
+                self._warm_pool.wait(raise_errors=ok)
+            finally:
+                for t in graph.tasks():
+                    if t.end is not None:
+                        logger.info(f"{t.name}: {t.duration():.1f}s")
+                logger.info(graph.report())
+
+    def _add_teardown_barrier(self, graph: TaskGraph) -> None:
+        # With other clusters on the same network, nothing is created before
+        # they're all torn down (tearing down unlinks the hosts from it). The
+        # last teardown waits for them, everything creating nodes follows it.
+        barrier = self._teardown_barrier
+        if barrier is None:
+            return
+        teardowns = [t for t in graph.tasks() if t.name in ("teardown_workers", "teardown_masters")]
+        if not teardowns:
+            barrier.arrive(self._cc.name)
+            return
+        last = teardowns[-1]
+        teardown = last.func
 
+        def teardown_and_wait() -> None:
+            try:
+                teardown()
+            finally:
+                barrier.arrive(self._cc.name)
+            barrier.wait()
+
+        last.func = teardown_and_wait
+
+    def graph(self) -> TaskGraph:
+        """
+        The deployment as a graph of tasks (see taskGraph.py). Besides the
+        pre/post configs, teardown and cluster/master creation (which depend
+        on each other), worker hosts are preinstalled and the worker ISO is
+        prepared while the masters are being installed.
+
+        With "pipeline_workers", the workers on those hosts are also booted
+        into discovery (with an infraenv without cluster) while the masters
+        are installed, and bound to the cluster once it accepts workers.
+
+        The warm pool (see warmPool.py) is filled alongside, VM workers take
+        the members that are ready by the time the workers are created.
+        """
+        graph = TaskGraph(limits={"bmc_boot": MAX_CONCURRENT_BMC_BOOTS})
+
+        def add_configs(step: str, configs: list[ExtraConfigArgs], inputs: tuple[str, ...]) -> tuple[str, ...]:
+            # Extra configs share state (futures) and run in the configured order.
+            for i, e in enumerate(configs):
+                graph.add(f"{step}:{i}:{e.name}", functools.partial(self._prepost_config, e), inputs=inputs, outputs=(f"{step}:{i}",))
+                inputs = (f"{step}:{i}",)
+            return inputs
+
+        deployed: tuple[str, ...] = ()
         if self._cc.masters:
+            preconfigured: tuple[str, ...] = ()
             if PRE_STEP in self.steps:
-                duration[PRE_STEP].start()
-                self._preconfig()
-                duration[PRE_STEP].stop()
+                preconfigured = add_configs(PRE_STEP, self._cc.preconfig, ())
             else:
                 logger.info("Skipping pre configuration.")
 
             if self._cc.kind != "microshift":
                 if WORKERS_STEP in self.steps or MASTERS_STEP in self.steps:
-                    self.teardown_workers()
+                    graph.add("teardown_workers", self.teardown_workers, inputs=preconfigured, outputs=("workers_torn_down",))
+                    preconfigured = ("workers_torn_down",)
+                cluster: tuple[str, ...] = preconfigured
                 if MASTERS_STEP in self.steps:
-                    duration[MASTERS_STEP].start()
-                    self.teardown_masters()
-                    self.create_cluster()
-                    self.create_masters()
-                    duration[MASTERS_STEP].stop()
+                    graph.add("teardown_masters", self.teardown_masters, inputs=preconfigured, outputs=("masters_torn_down",))
+                    graph.add("create_cluster", self.create_cluster, inputs=("masters_torn_down",), outputs=("cluster",))
+                    graph.add("prepare_master_network", self.prepare_master_network, inputs=("masters_torn_down",), outputs=("master_network",))
+                    graph.add("create_masters", self.create_masters, inputs=("cluster", "master_network"), outputs=("masters",))
+                    cluster = ("cluster",)
+                    deployed = ("masters",)
                 else:
                     logger.info("Skipping master creation.")
 
-                if WORKERS_STEP in self.steps:
-                    duration[WORKERS_STEP].start()
-                    self.create_workers()
-                    duration[WORKERS_STEP].stop()
+                if WORKERS_STEP in self.steps and self._cc.workers:
+                    if self._pipeline_workers:
+                        # The workers' own infraenv has no cluster, it only needs the old one to be removed.
+                        iso_inputs: tuple[str, ...] = ("masters_torn_down",)
+                    elif self.workers_arch != self.masters_arch:
+                        iso_inputs = cluster
+                    else:
+                        # With the same architecture, workers and masters share the infraenv (and ISO file).
+                        iso_inputs = (*cluster, *deployed)
+                    graph.add("prepare_worker_iso", self.prepare_worker_iso, inputs=iso_inputs, outputs=("worker_iso",))
+                    preinstalled: tuple[str, ...] = ()
+                    for h in sorted(self._all_hosts_with_only_workers(), key=lambda h: h.config.name):
+                        graph.add(f"preinstall:{h.config.name}", functools.partial(self.preinstall_host, h), inputs=preconfigured, outputs=(f"preinstalled:{h.config.name}",), resources={"bmc_boot": 1})
+                        preinstalled += (f"preinstalled:{h.config.name}",)
+                    if self._pipeline_workers:
+                        graph.add("discover_workers", self.discover_workers, inputs=("worker_iso", "master_network", *preinstalled), outputs=("workers_discovered",))
+                        preinstalled += ("workers_discovered",)
+                    graph.add("create_workers", self.create_workers, inputs=(*deployed, *preconfigured, "worker_iso", *preinstalled), outputs=("workers",))
+                    if self._cc.warm_pool:
+                        # Tearing down the masters removes the pool too.
+                        pool_inputs = ("master_network",) if MASTERS_STEP in self.steps else preconfigured
+                        pool_hosts = {p.node for p in self._cc.warm_pool}
+                        pool_inputs += tuple(f"preinstalled:{name}" for name in sorted(pool_hosts) if f"preinstalled:{name}" in preinstalled)
+                        graph.add("fill_warm_pool", self._warm_pool.fill, inputs=pool_inputs, outputs=("warm_pool",))
+                    deployed = (*deployed, "workers")
                 else:
                     logger.info("Skipping worker creation.")
-        if self._cc.kind == "microshift":
-            version = match_to_proper_version_format(self._cc.version)
-
-            if len(self._cc.masters) == 1:
-                duration[MASTERS_STEP].start()
-                microshift.deploy(self._secrets_path, self._cc.masters[0], self._cc.get_external_port(), version)
-                duration[MASTERS_STEP].stop()
             else:
-                logger.error_and_exit("Masters must be of length one for deploying microshift")
+                deployed = preconfigured
+        if self._cc.kind == "microshift":
+            graph.add("microshift", self.deploy_microshift, inputs=deployed, outputs=("microshift",))
+            deployed = ("microshift",)
         if POST_STEP in self.steps:
-            duration[POST_STEP].start()
-            self._postconfig()
-            duration[POST_STEP].stop()
+            add_configs(POST_STEP, self._cc.postconfig, deployed)
         else:
             logger.info("Skipping post configuration.")
-        for k, v in duration.items():
-            logger.info(f"{k}: {v.duration()}")
+        for t in graph.tasks():
+            t.func = self._journaled(t.name, t.func)
+        return graph
+
+    def _journaled(self, name: str, func: Callable[[], None]) -> Callable[[], None]:
+        # Records the task in the journal once done. When resuming, tasks done
+        # by the previous run are skipped if what they did still holds.
+        def run() -> None:
+            if self._journal.done(name) and self._still_done(name):
+                logger.info(f"Skipping {name}, done by the previous run")
+                return
+            func()
+            self._journal.task_done(name)
+
+        return run
+
+    def _still_done(self, task: str) -> bool:
+        cluster_name = self._cc.name
+        if task == "create_cluster":
+            return self._ai.cluster_exists(cluster_name)
+        if task == "create_masters":
+            return self._ai.cluster_exists(cluster_name) and self._ai.cached_cluster_state(cluster_name) == "installed"
+        if task == "create_workers":
+            return all(self.client().is_ready(w.name) for w in self._cc.workers)
+        # Only sets up in-memory state (the ISO is only downloaded again), or
+        # checks for itself what's left to do.
+        return task not in ("prepare_worker_iso", "fill_warm_pool")
+
+    def _reconcile(self, node: ClusterNode) -> Optional[str]:
+        """
+        When resuming, the last phase "node" reached in the previous run that
+        still holds according to the Assisted Installer and k8s. If there's
+        none, what's left of the node is removed and None is returned.
+        """
+        name = node.config.name
+        ip = self._journal.info(name).get("ip")
+        if ip is not None:
+            node.dynamic_ip = ip
+        info = self._ai.get_ai_host(name)
+        status = info.status if info is not None else None
+        if self._journal.reached(name, READY) and self.client().is_ready(name):
+            resumed = READY
+        elif self._journal.reached(name, REBOOTED) and status == "added-to-existing-cluster":
+            resumed = REBOOTED
+        elif self._journal.reached(name, KNOWN) and status in ("known", "known-unbound"):
+            resumed = KNOWN
+        else:
+            logger.info(f"Starting {name} over (journal: {self._journal.phase(name)}, status: {status})")
+            node.teardown()
+            if info is not None:
+                self._ai.delete(name)
+            self._journal.reset_node(name)
+            return None
+        logger.info(f"Resuming {name} after {resumed} (status: {status})")
+        return resumed
+
+    def _reconcile_master(self, node: ClusterNode) -> bool:
+        # Whether the master already rebooted while the cluster was installing.
+        name = node.config.name
+        info = self._ai.get_ai_host(name)
+        if self._journal.reached(name, REBOOTED) or (info is not None and (info.status == "installed" or info.status_info in _AFTER_REBOOT)):
+            logger.info(f"Master {name} already rebooted")
+            self._journal.node_phase(name, REBOOTED)
+            return True
+        return False
+
+    def plan(self) -> str:
+        return self.graph().plan()
+
+    def remove_journal(self) -> None:
+        self._journal.remove()
+
+    def deploy_microshift(self) -> None:
+        version = match_to_proper_version_format(self._cc.version)
+        if len(self._cc.masters) == 1:
+            microshift.deploy(self._secrets_path, self._cc.masters[0], self._cc.get_external_port(), version)
+        else:
+            logger.error_and_exit("Masters must be of length one for deploying microshift")
 
     def _validate(self) -> None:
         if self._cc.is_sno():
@@ -235,7 +449,7 @@ class ClusterDeployer(BaseDeployer):
                 logger.error_and_exit("Missing ip on master")
 
         min_cores = 28
-        cc = int(self._local_host.hostconn.run("nproc").out)
+        cc = self._local_host.hostconn.facts().nproc
         if cc < min_cores:
             logger.error_and_exit(f"Detected {cc} cores on localhost, but need at least {min_cores} cores")
         if self.need_external_network():
@@ -297,6 +511,24 @@ class ClusterDeployer(BaseDeployer):
         logger.info(cfg)
         self._ai.create_cluster(cluster_name, cfg)
 
+    def prepare_master_network(self) -> None:
+        # Ensure the virtual bridge is properly configured and
+        # configure DHCP entries for all masters on the local virbr and
+        # connect the workers to the physical network.
+        #
+        # NOTE: linking the network must happen before starting masters because
+        # they need to be able to access the DHCP server running on the
+        # provisioning node.
+        hosts_with_masters = self._all_hosts_with_masters()
+        for h in hosts_with_masters:
+            h.configure_bridge()
+
+        # Workers discovered during the master install need their DHCP entries
+        # too. Adding them later could restart the network under the masters.
+        self._local_host.bridge.setup_dhcp_entries(self._cc.master_vms() + self._early_worker_vms())
+        for h in hosts_with_masters:
+            h.ensure_linked_to_network(self._local_host.bridge)
+
     def create_masters(self) -> None:
         cluster_name = self._cc.name
         infra_env = f"{cluster_name}-{self.masters_arch}"
@@ -314,40 +546,33 @@ class ClusterDeployer(BaseDeployer):
         self._ai.ensure_infraenv_created(infra_env, cfg)
 
         hosts_with_masters = self._all_hosts_with_masters()
-
-        # Ensure the virtual bridge is properly configured and
-        # configure DHCP entries for all masters on the local virbr and
-        # connect the workers to the physical network.
-        #
-        # NOTE: linking the network must happen before starting masters because
-        # they need to be able to access the DHCP server running on the
-        # provisioning node.
-        for h in hosts_with_masters:
-            h.configure_bridge()
-
-        self._local_host.bridge.setup_dhcp_entries(self._cc.master_vms())
-        for h in hosts_with_masters:
-            h.ensure_linked_to_network(self._local_host.bridge)
-
-        # Start all masters on all hosts.
+        master_nodes = sum((h.k8s_master_nodes for h in hosts_with_masters), [])
         executor = ThreadPoolExecutor(max_workers=len(self._cc.masters))
-        iso_path = os.getcwd()
-        iso_file = os.path.join(iso_path, f"{infra_env}.iso")
-        self._ai.download_iso_with_retry(infra_env, iso_path)
 
-        image_futures = [(h.config.name, executor.submit(h.ensure_images, iso_file, infra_env, nodes=h.k8s_master_nodes)) for h in hosts_with_masters]
-        wait_futures("ensure image", image_futures)
+        installing = self._journal.resume and self._ai.cached_cluster_state(cluster_name) in _CLUSTER_INSTALL_STARTED
+        if installing:
+            logger.info(f"Cluster {cluster_name} is already installing, waiting for the masters")
+            rebooted = {n.config.name for n in master_nodes if self._reconcile_master(n)}
+        else:
+            # Start all masters on all hosts.
+            known = {n.config.name for n in master_nodes if self._reconcile(n) == KNOWN} if self._journal.resume else set()
+            iso_path = os.getcwd()
+            iso_file = os.path.join(iso_path, f"{infra_env}.iso")
+            self._ai.download_iso_with_retry(infra_env, iso_path)
 
-        master_nodes = sum((h.k8s_master_nodes for h in hosts_with_masters), [])
+            self._ensure_images(executor, iso_file, infra_env, {h: [n for n in h.k8s_master_nodes if n.config.name not in known] for h in hosts_with_masters})
 
-        nodes_with_futures = [(n.config.name, executor.submit(self._start_node, infra_env, n, True)) for n in master_nodes]
-        wait_futures("start node", nodes_with_futures)
+            nodes_with_futures = [(n.config.name, executor.submit(self._start_node, infra_env, n, True)) for n in master_nodes if n.config.name not in known]
+            wait_futures("start node", nodes_with_futures)
 
-        self._ai.ensure_cluster_installing(cluster_name)
+            self._ai.ensure_cluster_installing(cluster_name)
+            for n in master_nodes:
+                self._journal.node_phase(n.config.name, INSTALLING)
+            rebooted = set()
 
         self._ai.download_kubeconfig_and_secrets(self._cc.name, self._cc.kubeconfig)
 
-        nodes_with_futures = [(n.config.name, executor.submit(self._wait_master_reboot, infra_env, n)) for n in master_nodes]
+        nodes_with_futures = [(n.config.name, executor.submit(self._wait_master_reboot, infra_env, n)) for n in master_nodes if n.config.name not in rebooted]
         wait_futures("reboot node", nodes_with_futures)
 
         self._ai.wait_cluster_status(cluster_name, "installed")
@@ -362,23 +587,50 @@ class ClusterDeployer(BaseDeployer):
             h.ensure_linked_to_network(self._local_host.bridge)
 
         logger.info("Setting password to for root to redhat")
-        for master in master_nodes:
-            master.set_password()
+        self._set_passwords(master_nodes)
 
         self.update_dnsmasq()
 
-    def create_workers(self) -> None:
-        if len(self._cc.workers) == 0:
-            logger.info("No workers to setup")
-            return
-        logger.info("Setting up workers")
-        cluster_name = self._cc.name
-        infra_env = f"{cluster_name}-{self.workers_arch}"
+    def _worker_infra_env(self) -> str:
+        # Pipelined workers boot from their own infraenv without cluster
+        # (late binding), as the cluster can't take workers yet.
+        suffix = "-workers" if self._pipeline_workers else ""
+        return f"{self._cc.name}-{self.workers_arch}{suffix}"
+
+    def _early_worker_vms(self) -> list[NodeConfig]:
+        # Worker VMs started by discover_workers().
+        if not self._pipeline_workers:
+            return []
+        names = {h.config.name for h in self._all_hosts_with_only_workers()}
+        return [w for w in self._cc.worker_vms() if w.node in names]
+
+    def discover_workers(self) -> None:
+        # Boots the workers on hosts that only run workers into discovery,
+        # create_workers() binds and installs them.
+        infra_env = self._worker_infra_env()
+        iso_file = self._worker_iso
+        assert iso_file is not None
+        hosts = self._all_hosts_with_only_workers()
+        for h in hosts:
+            h.ensure_linked_to_network(self._local_host.bridge)
 
-        self._ai.allow_add_workers(cluster_name)
+        executor = ThreadPoolExecutor(max_workers=max(len(self._cc.workers), 1))
+        self._ensure_images(executor, iso_file, infra_env, {h: h.k8s_worker_nodes for h in hosts})
+
+        nodes = sum((h.k8s_worker_nodes for h in hosts), [])
+        futures = [(n.config.name, executor.submit(self._start_node, infra_env, n, False)) for n in nodes]
+        wait_futures("discover worker", futures)
+        self._discovered = {name for name, f in futures if f.result()}
+        logger.info(f"Discovered workers {sorted(self._discovered)} during the master installation")
+
+    def prepare_worker_iso(self) -> None:
+        # Creates the workers' infraenv and downloads its ISO. Doesn't need
+        # the masters to be installed.
+        infra_env = self._worker_infra_env()
 
         cfg = {}
-        cfg["cluster"] = cluster_name
+        if not self._pipeline_workers:
+            cfg["cluster"] = self._cc.name
         cfg["pull_secret"] = self._secrets_path
         cfg["cpu_architecture"] = self.workers_arch
         cfg["openshift_version"] = self._cc.version
@@ -388,7 +640,49 @@ class ClusterDeployer(BaseDeployer):
             cfg["noproxy"] = self._cc.noproxy
 
         self._ai.ensure_infraenv_created(infra_env, cfg)
+
+        if not self.is_bf:
+            iso_path = os.getcwd()
+        else:
+            # BF images are NFS mounted from _BF_ISO_PATH.
+            iso_path = _BF_ISO_PATH
+
+        os.makedirs(_BF_ISO_PATH, exist_ok=True)
+        self._ai.download_iso_with_retry(infra_env, iso_path)
+        ssh_priv_key_path = self._get_discovery_ign_ssh_priv_key(infra_env)
+        shutil.copyfile(ssh_priv_key_path, os.path.join(_BF_ISO_PATH, "ssh_priv_key"))
+        self._worker_iso = os.path.join(iso_path, f"{infra_env}.iso")
+
+    def preinstall_host(self, h: ClusterHost) -> None:
+        # Configures the bridge on a host that only runs workers and installs
+        # it (if needed). Doesn't need the masters to be installed.
+        with tracing.span("preinstall", tracing.HOST, h.config.name):
+            h.configure_bridge()
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                ret = h.preinstall(self._cc.get_external_port(), executor).result()
+        logger.info(f"Preinstall {h}: {ret}")
+        self._preinstalled.add(h.config.name)
+
+    def create_workers(self) -> None:
+        if len(self._cc.workers) == 0:
+            logger.info("No workers to setup")
+            return
+        logger.info("Setting up workers")
+        cluster_name = self._cc.name
+        infra_env = self._worker_infra_env()
+
+        self._ai.allow_add_workers(cluster_name)
+        if self._worker_iso is None:
+            self.prepare_worker_iso()
+        iso_file = self._worker_iso
+        assert iso_file is not None
+
         hosts_with_workers = self._all_hosts_with_workers()
+        worker_nodes = sum((h.k8s_worker_nodes for h in hosts_with_workers), [])
+
+        resumed = {n.config.name: self._reconcile(n) for n in worker_nodes} if self._journal.resume else {}
+        discovered = self._discovered | {name for name, phase in resumed.items() if phase == KNOWN}
+        installed = {name for name, phase in resumed.items() if phase in (REBOOTED, READY)}
 
         # Ensure the virtual bridge is properly configured and
         # configure DHCP entries for all workers on the local virbr and
@@ -398,98 +692,163 @@ class ClusterDeployer(BaseDeployer):
         # they need to be able to access the DHCP server running on the
         # provisioning node.
         for h in hosts_with_workers:
-            h.configure_bridge()
+            if h.config.name not in self._preinstalled:
+                h.configure_bridge()
 
-        self._local_host.setup_dhcp_entries(self._cc.worker_vms())
+        early_vms = {w.name for w in self._early_worker_vms()}
+        self._local_host.setup_dhcp_entries([w for w in self._cc.worker_vms() if w.name not in early_vms])
         for h in hosts_with_workers:
             h.ensure_linked_to_network(self._local_host.bridge)
 
         executor = ThreadPoolExecutor(max_workers=len(self._cc.workers))
 
         # Install all hosts that need to run (or be) workers.
-        preinstall_futures = {h: h.preinstall(self._cc.get_external_port(), executor) for h in hosts_with_workers}
+        preinstall_futures = {h: h.preinstall(self._cc.get_external_port(), executor) for h in hosts_with_workers if h.config.name not in self._preinstalled}
         for h, pf in preinstall_futures.items():
             logger.info(f"Preinstall {h}: {pf.result()}")
 
         # Start all workers on all hosts.
-        if not self.is_bf:
-            iso_path = os.getcwd()
-        else:
-            # BF images are NFS mounted from _BF_ISO_PATH.
-            iso_path = _BF_ISO_PATH
-
-        os.makedirs(_BF_ISO_PATH, exist_ok=True)
-        self._ai.download_iso_with_retry(infra_env, iso_path)
-        iso_file = os.path.join(iso_path, f"{infra_env}.iso")
-        ssh_priv_key_path = self._get_discovery_ign_ssh_priv_key(infra_env)
-        shutil.copyfile(ssh_priv_key_path, os.path.join(_BF_ISO_PATH, "ssh_priv_key"))
-
-        image_futures = [(h.config.name, executor.submit(h.ensure_images, iso_file, infra_env, nodes=h.k8s_worker_nodes)) for h in hosts_with_workers]
-        wait_futures("ensure image", image_futures)
-
-        worker_nodes = sum((h.k8s_worker_nodes for h in hosts_with_workers), [])
-
-        nodes_with_futures = [(n.config.name, executor.submit(self._install_worker_with_retry, infra_env, n)) for n in worker_nodes]
+        started = discovered | installed
+        # VM workers take a ready warm pool member of their size on their host.
+        members: dict[str, VmClusterNode] = {}
+        for n in worker_nodes:
+            if isinstance(n, VmClusterNode) and n.config.name not in started:
+                member = self._warm_pool.claim(n.config)
+                if member is not None:
+                    members[n.config.name] = member
+        if members:
+            self._warm_pool.replenish()
+        started |= set(members)
+
+        self._ensure_images(executor, iso_file, infra_env, {h: [n for n in h.k8s_worker_nodes if n.config.name not in started] for h in hosts_with_workers})
+
+        nodes_with_futures = [(n.config.name, executor.submit(self._install_worker_with_retry, infra_env, n, n.config.name in discovered, members.get(n.config.name))) for n in worker_nodes if n.config.name not in installed]
         wait_futures("install worker", nodes_with_futures)
 
         logger.info("waiting for workers to be ready")
         self.wait_for_workers()
 
         logger.info("Setting password to for root to redhat")
-        for h in hosts_with_workers:
-            for worker in h.k8s_worker_nodes:
-                worker.set_password()
+        self._set_passwords(worker_nodes)
+
+    def _ensure_images(self, executor: ThreadPoolExecutor, iso_file: str, infra_env: str, nodes: dict[ClusterHost, list[ClusterNode]]) -> None:
+        image_futures = [(h.config.name, executor.submit(h.ensure_images, iso_file, infra_env, nodes=h_nodes)) for h, h_nodes in nodes.items() if h_nodes]
+        wait_futures("ensure image", image_futures)
+        for n in sum(nodes.values(), []):
+            self._journal.node_phase(n.config.name, IMAGE_COPIED)
+
+    def _set_passwords(self, nodes: list[ClusterNode]) -> None:
+        asyncHost.default_executor().run_all([n.set_password_async() for n in nodes])
 
     def _wait_master_reboot(self, infra_env: str, node: ClusterNode) -> bool:
-        def master_ready(ai: AssistedClientAutomation, node_name: str) -> bool:
-            info = ai.get_ai_host(node_name)
-            return info is not None and (info.status in ["error", "installing-pending-user-action"] or (info.status == "installing-in-progress" and info.status_info == "Rebooting"))
+        with tracing.span(f"{node.config.name}: reboot", tracing.NODE, node.config.node) as span:
+            span.outcome = "ok" if self._do_wait_master_reboot(node) else "failed"
+            return span.outcome == "ok"
+
+    def _do_wait_master_reboot(self, node: ClusterNode) -> bool:
+        def master_ready(info: AssistedClientHostInfo) -> bool:
+            return info.status in ["error", "installing-pending-user-action"] or (info.status == "installing-in-progress" and info.status_info == "Rebooting")
 
         name = node.config.name
-        common.wait_true(f"master {name}", 0, master_ready, ai=self._ai, node_name=name)
-        info = self._ai.get_ai_host(name)
+        logger.info(f"Waiting for master {name}")
+        info = self._ai.wait_host(name, master_ready)
         if info is not None and info.status == "installing-in-progress" and info.status_info == "Rebooting" and node.ensure_reboot():
             logger.info(f"Master {name} reboot finished")
+            self._journal.node_phase(name, REBOOTED)
             return True
 
         logger.error(f"Master {name} reboot failed")
         return False
 
-    def _install_worker_with_retry(self, infra_env: str, node: ClusterNode) -> bool:
-        def installation_finished(ai: AssistedClientAutomation, node_name: str) -> bool:
-            info = ai.get_ai_host(node_name)
-            return info is not None and info.status in ["error", "added-to-existing-cluster"]
+    def _install_worker_with_retry(self, infra_env: str, node: ClusterNode, discovered: bool = False, member: Optional[VmClusterNode] = None) -> bool:
+        with tracing.span(f"{node.config.name}: install", tracing.NODE, node.config.node):
+            return self._do_install_worker_with_retry(infra_env, node, discovered, member)
 
+    def _do_install_worker_with_retry(self, infra_env: str, node: ClusterNode, discovered: bool, member: Optional[VmClusterNode]) -> bool:
         name = node.config.name
         for try_count in itertools.count(0):
-            if self._start_node(infra_env, node, False):
+            if member is not None:
+                if self._install_from_pool(node, member):
+                    logger.info(f"Worker {name} installation from warm pool member {member.config.name} finished")
+                    break
+                # Unless it was adopted already, the VM still has the member's name.
+                member.teardown()
+            elif discovered or self._start_node(infra_env, node, False):
+                if self._pipeline_workers:
+                    self._ai.bind_host(infra_env, name, self._cc.name)
+                    self._wait_known(node)
                 self._ai.install_ai_host(infra_env, name)
+                self._journal.node_phase(name, INSTALLING)
 
-                common.wait_true(f"installation {name}", 0, installation_finished, ai=self._ai, node_name=name)
-                info = self._ai.get_ai_host(name)
+                logger.info(f"Waiting for installation {name}")
+                info = self._ai.wait_host(name, _installation_finished)
                 if info is not None and info.status == "added-to-existing-cluster" and node.ensure_reboot():
                     logger.info(f"Worker {name} installation finished after {try_count} retries")
+                    self._journal.node_phase(name, REBOOTED)
                     break
 
+            member = None
+            discovered = False
             logger.warn(f"Worker {name} installation failed, retrying...")
             node.teardown()
             self._ai.delete(name)
+            self._journal.reset_node(name)
             time.sleep(10)
 
         return True
 
+    def _install_from_pool(self, node: ClusterNode, member: VmClusterNode) -> bool:
+        # Installs worker "node" on warm pool member "member", discovered
+        # through the pool's infraenv (without cluster).
+        assert isinstance(node, VmClusterNode)
+        name = node.config.name
+        info = self._ai.get_ai_host(member.config.name)
+        if info is None:
+            return False
+        self._ai.update_host(info.id, {"name": name})
+        self._journal.node_phase(name, RENAMED)
+
+        infra_env = warmPool.infra_env(self._cc.name)
+        self._ai.bind_host(infra_env, name, self._cc.name)
+        self._wait_known(node)
+        self._journal.node_phase(name, KNOWN)
+        self._ai.install_ai_host(infra_env, name)
+        self._journal.node_phase(name, INSTALLING)
+
+        logger.info(f"Waiting for installation {name}")
+        info = self._ai.wait_host(name, _installation_finished)
+        if info is None or info.status != "added-to-existing-cluster" or not node.ensure_reboot(adopt=member):
+            return False
+        self._journal.node_phase(name, REBOOTED)
+        return True
+
     def _start_node(self, infra_env: str, node: ClusterNode, master: bool) -> bool:
+        with tracing.span(f"{node.config.name}: start", tracing.NODE, node.config.node) as span:
+            span.outcome = "ok" if self._do_start_node(infra_env, node, master) else "failed"
+            return span.outcome == "ok"
+
+    def _do_start_node(self, infra_env: str, node: ClusterNode, master: bool) -> bool:
+        name = node.config.name
         image = os.path.join(os.path.dirname(node.config.image_path), f"{infra_env}.iso")
         if not node.start(image):
             return False
+        self._journal.node_phase(name, VM_DEFINED)
 
         if not node.wait_for_boot(self._cc.full_ip_range):
             return False
+        # BF nodes get their IP when started, the resumed run needs it.
+        self._journal.node_phase(name, BOOTED, ip=node.dynamic_ip)
 
-        if not master and not self._rename_worker(node):
-            return False
+        if not master:
+            if not self._rename_worker(node):
+                return False
+            self._journal.node_phase(name, RENAMED)
 
-        return self._wait_known(node)
+        # Hosts of an infraenv without cluster are "known-unbound" once discovered.
+        if not self._wait_known(node, "known-unbound" if self._pipeline_workers and not master else "known"):
+            return False
+        self._journal.node_phase(name, KNOWN)
+        return True
 
     def _rename_worker(self, node: ClusterNode) -> bool:
         logger.info(f"Waiting for connectivity to worker {node.config.name}")
@@ -514,23 +873,16 @@ class ClusterDeployer(BaseDeployer):
             return False
 
         logger.info(f"Waiting for {node.config.name} rename to succeed")
-        for try_count in range(60):
-            info = self._ai.get_ai_host_by_ip(node.ip())
-            if info is not None:
-                self._ai.update_host(info.id, {"name": node.config.name})
-                logger.info(f"Renamed {node.config.name}")
-                return True
-
-            time.sleep(10)
-
-        return False
-
-    def _wait_known(self, node: ClusterNode) -> bool:
-        def node_status_known(ai: AssistedClientAutomation, node: ClusterNode) -> bool:
-            info = ai.get_ai_host(node.config.name)
-            return info is not None and info.status == "known"
+        info = self._ai.wait_host_by_ip(node.ip(), timeout=600)
+        if info is None:
+            return False
+        self._ai.update_host(info.id, {"name": node.config.name})
+        logger.info(f"Renamed {node.config.name}")
+        return True
 
-        common.wait_true(f"known status {node.config.name}", 0, node_status_known, ai=self._ai, node=node)
+    def _wait_known(self, node: ClusterNode, status: str = "known") -> bool:
+        logger.info(f"Waiting for {status} status {node.config.name}")
+        self._ai.wait_host(node.config.name, lambda info: info.status == status)
 
         return True
 
@@ -559,16 +911,21 @@ class ClusterDeployer(BaseDeployer):
         api_name = f"api.{cluster_name}.redhat.com"
         api_vip = self._ai.get_ai_cluster_info(cluster_name).api_vip
 
-        hosts = Hosts()
-        hosts.remove_all_matching(name=api_name)
-        hosts.remove_all_matching(address=api_vip)
-        hosts.add([HostsEntry(entry_type='ipv4', address=api_vip, names=[api_name])])
-        hosts.write()
-
-        # libvirt also runs dnsmasq, and dnsmasq reads /etc/hosts.
-        # For that reason, restart libvirt to re-read the changes.
-        libvirt = Libvirt(host.LocalHost())
-        libvirt.restart("network")
+        with _etc_hosts_lock:
+            hosts = Hosts()
+            hosts.remove_all_matching(name=api_name)
+            hosts.remove_all_matching(address=api_vip)
+            hosts.add([HostsEntry(entry_type='ipv4', address=api_vip, names=[api_name])])
+            hosts.write()
+
+            # libvirt also runs dnsmasq, and dnsmasq reads /etc/hosts.
+            # For that reason, restart libvirt to re-read the changes, or
+            # only make dnsmasq re-read it when other clusters use it.
+            if self._local_host.bridge.config.shared:
+                self._local_host.bridge.reload_hosts()
+            else:
+                libvirt = Libvirt(host.LocalHost())
+                libvirt.restart("network")
 
     def update_dnsmasq(self, *, setup: bool = True) -> None:
         cluster_name = self._cc.name
@@ -580,58 +937,78 @@ class ClusterDeployer(BaseDeployer):
 
     def wait_for_workers(self) -> None:
         logger.info(f'waiting for {len(self._cc.workers)} workers to be ready')
+        workers = [w.name for w in self._cc.workers]
+        client = self.client()
+        # CSRs are approved as they come, and readiness is tracked with a
+        # watch. Woken up as soon as another worker is ready, or every 30s
+        # for the error checks and workarounds.
+        client.start_csr_approver()
         prev_ready = 0
-        for try_count in itertools.count(0):
-            workers = [w.name for w in self._cc.workers]
-            ready_count = sum(self.client().is_ready(w) for w in workers)
-            self._ai.check_any_host_error()
-
-            if prev_ready != ready_count:
-                logger.info(f"{ready_count}/{len(workers)} is ready (try #{try_count})")
-                prev_ready = ready_count
-
-            if ready_count == len(workers):
-                break
+        with tracing.span("workers ready", tracing.WAIT):
+            for try_count in itertools.count(0):
+                ready = client.ready_nodes(workers)
+                for w in ready:
+                    if not self._journal.reached(w, READY):
+                        self._journal.node_phase(w, READY)
+                ready_count = len(ready)
+                self._ai.check_any_host_error()
+
+                if prev_ready != ready_count:
+                    logger.info(f"{ready_count}/{len(workers)} is ready (try #{try_count})")
+                    prev_ready = ready_count
+
+                if ready_count == len(workers):
+                    break
 
-            self.client().approve_csr()
-            self.bluefield_workarounds()
-            time.sleep(30)
+                self.bluefield_workarounds()
+                # In case the approver missed one (e.g. a failed approval).
+                client.approve_csr()
+                client.wait_nodes_ready(workers, count=ready_count + 1, timeout=30)
 
     def bluefield_workarounds(self) -> None:
+        # Checks all BF workers concurrently, each in a few round trips.
         bf_workers = [x for x in self._cc.workers if x.kind == "bf"]
-        lh = host.LocalHost()
-
-        if len(self.bf_connections) != len(bf_workers):
-            for e in filter(lambda x: x.name not in self.bf_connections, bf_workers):
-                ai_ip = self._ai.get_ai_ip(e.name, self._cc.full_ip_range)
-                if ai_ip is None:
-                    continue
-                h = host.Host(ai_ip)
-                h.ssh_connect("core")
-                logger.info(f'connected to {e.name}, setting user:pw')
-                h.run("echo root:redhat | sudo chpasswd")
-                self.bf_connections[e.name] = h
+        if not bf_workers:
+            return
+        with ThreadPoolExecutor(max_workers=len(bf_workers)) as executor:
+            for f in [executor.submit(self._bluefield_workaround, w) for w in bf_workers]:
+                f.result()
+
+    def _bluefield_workaround(self, w: NodeConfig) -> None:
+        if w.name not in self.bf_connections:
+            ai_ip = self._ai.get_ai_ip(w.name, self._cc.full_ip_range)
+            if ai_ip is None:
+                return
+            h = host.Host(ai_ip)
+            h.ssh_connect("core")
+            logger.info(f'connected to {w.name}, setting user:pw')
+            h.run("echo root:redhat | sudo chpasswd")
+            self.bf_connections[w.name] = h
+        h = self.bf_connections[w.name]
 
         # Workaround: Time is not set and consequently HTTPS doesn't work
-        for w in bf_workers:
-            if w.name not in self.bf_connections:
-                continue
-            h = self.bf_connections[w.name]
-            host.sync_time(lh, h)
-
-            # Workaround: images might become corrupt for an unknown reason. In that case, remove it to allow retries
-            out = h.run("sudo podman images", logging.DEBUG).out
-            reg = re.search(r".*Top layer (\w+) of image (\w+) not found in layer tree. The storage may be corrupted, consider running", out)
-            if reg:
-                logger.warning(f'Removing corrupt image from worker {w.name}')
-                logger.warning(h.run(f"sudo podman rmi {reg.group(2)}"))
-            try:
-                out = h.run("sudo podman images --format json", logging.DEBUG).out
-                podman_images = json.loads(out)
-                for image in podman_images:
-                    inspect_output = h.run(f"sudo podman image inspect {image['Id']}", logging.DEBUG).out
-                    if "A storage corruption might have occurred" in inspect_output:
-                        logger.warning("Corrupt image found")
-                        h.run(f"sudo podman rmi {image['id']}")
-            except Exception as e:
-                logger.info(e)
+        now = time.monotonic()
+        if now - self._bf_time_synced.get(w.name, -BF_TIME_SYNC_INTERVAL) >= BF_TIME_SYNC_INTERVAL:
+            host.sync_time(host.LocalHost(), h)
+            self._bf_time_synced[w.name] = now
+
+        # Workaround: images might become corrupt for an unknown reason. In that case, remove it to allow retries
+        images, images_json = _run_batch_or_each(h, ["sudo podman images", "sudo podman images --format json"])
+        reg = re.search(r".*Top layer (\w+) of image (\w+) not found in layer tree. The storage may be corrupted, consider running", images.out)
+        if reg:
+            logger.warning(f'Removing corrupt image from worker {w.name}')
+            logger.warning(h.run(f"sudo podman rmi {reg.group(2)}"))
+        try:
+            # Images are only inspected once (by ID), all new ones in one batch.
+            checked = self._bf_images_checked.setdefault(w.name, set())
+            ids = [image["Id"] for image in json.loads(images_json.out)]
+            new_ids = [i for i in ids if i not in checked]
+            for image_id, r in zip(new_ids, _run_batch_or_each(h, [f"sudo podman image inspect {i}" for i in new_ids])):
+                if "A storage corruption might have occurred" in r.out + r.err:
+                    logger.warning(f"Corrupt image {image_id} found on worker {w.name}")
+                    h.run(f"sudo podman rmi {image_id}")
+                elif r.success():
+                    checked.add(image_id)
+            checked.intersection_update(ids)
+        except Exception as e:
+            logger.info(e)
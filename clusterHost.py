@@ -1,4 +1,5 @@
 import os
+import threading
 from concurrent.futures import Future, ThreadPoolExecutor
 from logger import logger
 from typing import Optional
@@ -6,12 +7,19 @@ from typing import Optional
 import common
 import coreosBuilder
 import host
+import tracing
+import concurrencyLimits
 from clustersConfig import BridgeConfig, ClustersConfig, HostConfig, NodeConfig
 from clusterNode import ClusterNode, X86ClusterNode, VmClusterNode, BFClusterNode
 from virtualBridge import VirBridge
 from virshPool import VirshPool
 
 
+# The DHCP reply rules are flushed and added again, one host at a time when
+# several clusters use the same hosts.
+_ebtables_lock = threading.Lock()
+
+
 class ClusterHost:
     """
     Physical host representation.  Contains fields and methods that allow to:
@@ -63,7 +71,8 @@ class ClusterHost:
 
         self.k8s_master_nodes = _create_k8s_nodes(cc.masters)
         self.k8s_worker_nodes = _create_k8s_nodes(cc.workers)
-        self.hosts_vms = any(k8s_node.config.kind == "vm" for k8s_node in self._k8s_nodes())
+        # Warm pool members are VMs too (see warmPool.py).
+        self.hosts_vms = any(k8s_node.config.kind == "vm" for k8s_node in self._k8s_nodes()) or any(p.node == self.config.name for p in cc.warm_pool)
 
         if not self.config.pre_installed:
             self.hostconn.need_sudo()
@@ -93,8 +102,7 @@ class ClusterHost:
 
         image_paths = {os.path.dirname(node.config.image_path) for node in nodes}
         for image_path in image_paths:
-            self.hostconn.run(f"mkdir -p {image_path}")
-            self.hostconn.run(f"chmod a+rw {image_path}")
+            self.hostconn.run_batch([f"mkdir -p {image_path}", f"chmod a+rw {image_path}"])
             iso_path = os.path.join(image_path, f"{infra_env}.iso")
             logger.info(f"Copying {local_iso_path} to {self.hostconn.hostname()}:/{iso_path}")
             self.hostconn.copy_to(local_iso_path, iso_path)
@@ -146,21 +154,25 @@ class ClusterHost:
 
         logger.info(f"Block all DHCP replies on {self.api_port} except the ones coming from the DHCP bridge")
         # We might run ensure_linked_to_network on a host on which ebtables rules are already installed e.g. adding vms on a host already hosting vms.
-        self.hostconn.run("ebtables -t filter -F FORWARD")
-        self.hostconn.run(f"ebtables -t filter -A FORWARD -p IPv4 --in-interface {self.api_port} --src {dhcp_bridge.eth_address()} --ip-proto udp --ip-sport 67 --ip-dport 68 -j ACCEPT")
-        self.hostconn.run(f"ebtables -t filter -A FORWARD -p IPv4 --in-interface {self.api_port} --ip-proto udp --ip-sport 67 --ip-dport 68 -j DROP")
+        cmds = [
+            "ebtables -t filter -F FORWARD",
+            f"ebtables -t filter -A FORWARD -p IPv4 --in-interface {self.api_port} --src {dhcp_bridge.eth_address()} --ip-proto udp --ip-sport 67 --ip-dport 68 -j ACCEPT",
+            f"ebtables -t filter -A FORWARD -p IPv4 --in-interface {self.api_port} --ip-proto udp --ip-sport 67 --ip-dport 68 -j DROP",
+        ]
 
         logger.info(f"Link {self.api_port} to virbr0")
         br_name = "virbr0"
 
         if interface.master is None:
             logger.info(f"No master set for interface {self.api_port}, setting it to {br_name}")
-            self.hostconn.run(f"ip link set {self.api_port} master {br_name}")
+            cmds.append(f"ip link set {self.api_port} master {br_name}")
         elif interface.master != br_name:
             logger.error_and_exit(f"Incorrect master set for interface {self.api_port}")
 
         logger.info(f"Setting interface {self.api_port} as unmanaged in NetworkManager")
-        self.hostconn.run(f"nmcli device set {self.api_port} managed no")
+        cmds.append(f"nmcli device set {self.api_port} managed no")
+        with _ebtables_lock:
+            self.hostconn.run_batch(cmds)
 
     def ensure_not_linked_to_network(self) -> None:
         if not self.needs_api_network:
@@ -180,7 +192,8 @@ class ClusterHost:
         self.hostconn.run(f"nmcli device set {self.api_port} managed yes")
 
         logger.info(f"Removing DHCP reply drop rules on {self.api_port}")
-        self.hostconn.run("ebtables -t filter -F FORWARD")
+        with _ebtables_lock:
+            self.hostconn.run("ebtables -t filter -F FORWARD")
 
     def preinstall(self, external_port: str, executor: ThreadPoolExecutor) -> Future[host.Result]:
         def _preinstall() -> host.Result:
@@ -188,7 +201,8 @@ class ClusterHost:
                 return host.Result.result_success()
 
             iso = "fedora-coreos.iso"
-            coreosBuilder.ensure_fcos_exists(os.path.join(os.getcwd(), iso))
+            with concurrencyLimits.slot(concurrencyLimits.CPU_HEAVY):
+                coreosBuilder.ensure_fcos_exists(os.path.join(os.getcwd(), iso))
             logger.debug(f"Provisioning Host {self.config.name}")
 
             # Use the X86 node provisioning infrastructure to provision the host
@@ -199,5 +213,11 @@ class ClusterHost:
         return executor.submit(_preinstall)
 
     def teardown_nodes(self, nodes: list[ClusterNode]) -> None:
-        for node in nodes:
-            node.teardown()
+        # The VMs are torn down in one batch, the other nodes concurrently.
+        vms = [n for n in nodes if isinstance(n, VmClusterNode) and n.hostconn is self.hostconn]
+        others = [n for n in nodes if n not in vms]
+        with tracing.span("teardown nodes", tracing.HOST, self.config.name), ThreadPoolExecutor(max_workers=max(len(others), 1)) as executor:
+            futures = [executor.submit(n.teardown) for n in others]
+            VmClusterNode.teardown_all(self.hostconn, vms)
+            for f in futures:
+                f.result()
@@ -8,9 +8,11 @@ from typing import Optional
 
 import common
 import host
+from asyncHost import AsyncHost
 from clustersConfig import NodeConfig
 from bmc import BMC
 from nfs import NFS
+from waiter import Waiter
 
 
 class ClusterNode:
@@ -65,10 +67,15 @@ class ClusterNode:
         rh.ssh_connect("core")
         rh.run_or_die(f"echo {user}:{password} | sudo chpasswd")
 
+    async def set_password_async(self, user: str = "root", password: str = "redhat") -> None:
+        rh = AsyncHost(host.RemoteHost(self.ip()))
+        await rh.ssh_connect("core")
+        await rh.run_or_die(f"echo {user}:{password} | sudo chpasswd")
+
     def print_logs(self) -> None:
         rh = host.RemoteHost(self.ip())
         logger.info(f"Gathering logs from {self.config.name}")
-        logger.info(rh.run("sudo journalctl TAG=agent --no-pager").out)
+        rh.stream("sudo journalctl TAG=agent --no-pager", on_line=lambda _, line: logger.info(f"{self.config.name}: {line}")).wait()
 
     def _verify_package_is_installed(self, package: str) -> bool:
         rh = host.RemoteHost(self.ip())
@@ -175,21 +182,65 @@ class VmClusterNode(ClusterNode):
             r = self.hostconn.run(f"virsh undefine {self.config.name}")
             logger.info(r.err if r.err else r.out.strip())
 
-    def ensure_reboot(self) -> bool:
+    @staticmethod
+    def teardown_all(h: host.Host, nodes: list["VmClusterNode"]) -> None:
+        # Same as teardown() on each of the VMs of "h", in two round trips.
+        if not nodes:
+            return
+        defined = set(h.run("virsh list --all --name").out.split())
+        cmds = []
+        for n in nodes:
+            image_path = n.config.image_path
+            cmds.append(f"rm -f {image_path.replace('.qcow2', '.img')} {image_path}")
+            if n.config.name in defined:
+                cmds += [f"virsh destroy {n.config.name}", f"virsh undefine {n.config.name}"]
+        for cmd, r in zip(cmds, h.run_batch(cmds)):
+            if cmd.startswith("virsh"):
+                logger.info(r.err if r.err else r.out.strip())
+
+    def ensure_reboot(self, adopt: Optional["VmClusterNode"] = None) -> bool:
+        # With "adopt", it's the VM of "adopt" (a warm pool member) that
+        # reboots, and it becomes this node's VM while it's powered off.
         def vm_state(h: host.Host, node_name: str, running: bool) -> bool:
             return running == h.vm_is_running(node_name)
 
+        # The VM state changes within seconds, don't back off as far as the
+        # default.
         name = self.config.name
-        common.wait_true(f"reboot of {name} to occur", 0, vm_state, h=self.hostconn, node_name=name, running=False)
+        logger.info(f"Waiting for reboot of {name} to occur")
+        vm = adopt.config.name if adopt is not None else name
+        Waiter(f"reboot of {name} to occur", max_interval=5).until(vm_state, h=self.hostconn, node_name=vm, running=False)
+
+        if adopt is not None and not self.adopt(adopt):
+            return False
 
         r = self.hostconn.run(f"virsh start {name}")
         if not r.success():
             return False
 
-        common.wait_true(f"reboot of {name} to finish", 0, vm_state, h=self.hostconn, node_name=name, running=True)
+        logger.info(f"Waiting for reboot of {name} to finish")
+        Waiter(f"reboot of {name} to finish", max_interval=5).until(vm_state, h=self.hostconn, node_name=name, running=True)
 
         return True
 
+    def adopt(self, member: "VmClusterNode") -> bool:
+        # Renames the powered off VM of "member", its disk and MAC to this
+        # node's, as if it had been created by setup_vm().
+        name = self.config.name
+        cmds = [
+            f"virsh domrename {member.config.name} {name}",
+            f"mv {member.config.image_path} {self.config.image_path}",
+            # Selects the member's disk and NIC, not the first ones (e.g. the CD-ROM).
+            f"virt-xml {name} --edit path={member.config.image_path} --disk path={self.config.image_path}",
+            f"virt-xml {name} --edit mac={member.config.mac} --network mac={self.config.mac}",
+        ]
+        results = self.hostconn.run_batch(cmds, stop_on_error=True)
+        if len(results) != len(cmds) or not results[-1].success():
+            logger.error(f"Failed to adopt VM {member.config.name} as {name}: {results[-1] if results else 'no output'}")
+            return False
+        logger.info(f"VM {member.config.name} is now {name}")
+        return True
+
 
 class X86ClusterNode(ClusterNode):
     external_port: str
@@ -291,22 +342,18 @@ class BFClusterNode(ClusterNode):
 
         # ip is printed as the last thing when bf is pxeboot'ed
         bf_ip = output.out.strip().split("\n")[-1].strip()
-        h.connect_to_bf(bf_ip)
+        bf = h.connect_to_bf(bf_ip)
         max_tries = 3
         bf_interfaces = ["enp3s0f0", "enp3s0f0np0"]
         logger.info(f'Will try {max_tries} times to get an IP on {" or ".join(bf_interfaces)}')
         ip = None
         tries = 0
         while True:
-            # FIXME: instead of calling h.run_on_bf(), we should be able to
-            # have a host.Host instace where h.run() does the right thing. With
-            # such abstraction, we could call common.ip_addrs(h).
-            ipa = h.run_on_bf("ip -json addr").out
-            detected = common.ip_addrs_parse(ipa)
+            detected = common.ip_addrs(bf)
             found = [e for e in detected if e.ifname in bf_interfaces]
             if len(found) != 1:
                 logger.error(f"Failed to find expected number of interfaces on bf {self.config.node}")
-                logger.error(f"Output was: {ipa}")
+                logger.error(f"Detected interfaces: {detected}")
                 sys.exit(-1)
 
             ip = None
@@ -315,7 +362,7 @@ class BFClusterNode(ClusterNode):
                     ip = e.local
             if ip is not None:
                 break
-            logger.info(f"IP missing on {found[0]}, output was {ipa}")
+            logger.info(f"IP missing on {found[0]}")
             tries += 1
             if tries >= max_tries:
                 logger.error(f"IP missing on {found[0]}")
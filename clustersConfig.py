@@ -135,6 +135,25 @@ class NodeConfig:
         return self.preallocated == "true"
 
 
+@dataclass
+class WarmPoolConfig:
+    # VMs kept booted into discovery on host "node" for new VM workers of
+    # the same size (see warmPool.py).
+    node: str
+    size: int = 2
+    preallocated: str = "true"
+    os_variant: str = "rhel8.6"
+    disk_size: str = "48"
+    ram: str = "32768"
+    cpu: str = "8"
+
+    def matches(self, n: NodeConfig) -> bool:
+        def size(c: Union[NodeConfig, "WarmPoolConfig"]) -> tuple[str, ...]:
+            return tuple(str(x) for x in (c.os_variant, c.disk_size, c.ram, c.cpu))
+
+        return n.kind == "vm" and n.node == self.node and size(n) == size(self)
+
+
 @dataclass
 class HostConfig:
     name: str
@@ -152,6 +171,8 @@ class BridgeConfig:
     ip: str
     mask: str
     dynamic_ip_range: Optional[tuple[str, str]] = None
+    # Used by several clusters at once (see multiCluster.py).
+    shared: bool = False
 
 
 class ClustersConfig:
@@ -171,6 +192,7 @@ class ClustersConfig:
     full_ip_range: tuple[str, str]
     ip_range: tuple[str, str]
     hosts: list[HostConfig]
+    warm_pool: list[WarmPoolConfig]
     proxy: Optional[str]
     noproxy: Optional[str]
     preconfig: list[ExtraConfigArgs]
@@ -187,6 +209,7 @@ class ClustersConfig:
         secrets_path: str = "",
         worker_range: common.RangeList = common.RangeList.UNLIMITED,
         test_only: bool = False,
+        index: int = 0,
     ):
         self.external_port = None
         self.kind = "openshift"
@@ -205,7 +228,7 @@ class ClustersConfig:
         self.install_iso = ""
 
         self._cluster_info: Optional[ClusterInfo] = None
-        self._load_full_config(yaml_path)
+        self._load_full_config(yaml_path, index)
         self._check_deprecated_config()
 
         cc = self.fullConfig
@@ -240,6 +263,7 @@ class ClustersConfig:
 
         self.configured_workers = [NodeConfig(self.name, **w) for w in cc["workers"]]
         self.workers = [NodeConfig(self.name, **w) for w in worker_range.filter(cc["workers"])]
+        self.warm_pool = [WarmPoolConfig(**p) for p in cc["warm_pool"]]
 
         self.set_cc_hosts_defaults(cc)
 
@@ -333,6 +357,8 @@ class ClustersConfig:
             cc["proxy"] = None
         if "hosts" not in cc:
             cc["hosts"] = [{"name": "localhost"}]
+        if "warm_pool" not in cc:
+            cc["warm_pool"] = []
         if "ip_range" not in cc:
             cc["ip_range"] = "192.168.122.1-192.168.122.254"
         if "ip_mask" not in cc:
@@ -341,16 +367,16 @@ class ClustersConfig:
     def set_cc_hosts_defaults(self, cc: dict[str, list[dict[str, str]]]) -> None:
         # creates hosts entries for each referenced node name
         node_names = {x["name"] for x in cc["hosts"]}
-        for node in self.all_nodes():
-            if node.node not in node_names:
-                cc["hosts"].append({"name": node.node})
-                node_names.add(node.node)
+        for name in [n.node for n in self.all_nodes()] + [p.node for p in self.warm_pool]:
+            if name not in node_names:
+                cc["hosts"].append({"name": name})
+                node_names.add(name)
 
         for e in cc["hosts"]:
             if "network_api_port" not in e:
                 e["network_api_port"] = self.network_api_port
 
-    def _load_full_config(self, yaml_path: str) -> None:
+    def _load_full_config(self, yaml_path: str, index: int) -> None:
         if not path.exists(yaml_path):
             logger.error(f"could not find config in path: '{yaml_path}'")
             sys.exit(1)
@@ -359,9 +385,9 @@ class ClustersConfig:
             contents = f.read()
             # load it twice, to get the name of the cluster so
             # that that can be used as a var
-            loaded = safe_load(io.StringIO(contents))["clusters"][0]
+            loaded = safe_load(io.StringIO(contents))["clusters"][index]
             contents = self._apply_jinja(contents, loaded["name"])
-            self.fullConfig = safe_load(io.StringIO(contents))["clusters"][0]
+            self.fullConfig = safe_load(io.StringIO(contents))["clusters"][index]
 
     def _check_deprecated_config(self) -> None:
         # All configurations that used to be supported but are not anymore.
@@ -510,6 +536,11 @@ class ClustersConfig:
         return len(self.masters) == 1 and self.kind == "openshift"
 
 
+def cluster_count(yaml_path: str) -> int:
+    with open(yaml_path, 'r') as f:
+        return len(safe_load(f)["clusters"])
+
+
 def main() -> None:
     pass
 
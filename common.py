@@ -11,6 +11,7 @@ from git.repo import Repo
 import shutil
 import host
 from logger import logger
+import waiter
 import json
 import functools
 import os
@@ -21,8 +22,6 @@ import tempfile
 import typing
 from collections.abc import Iterable
 from typing import Union
-import time
-import itertools
 import signal
 import types
 
@@ -637,11 +636,10 @@ def current_host() -> str:
     chost = os.environ.get("CDA_CURRENT_HOST")
     if chost:
         return chost
-    lh = host.LocalHost()
-    res = lh.run("hostname -f")
-    if res.returncode == 0 and (c := res.out.strip()):
+    c = host.LocalHost().facts().fqdn
+    if c:
         return c
-    raise RuntimeError(f"Failure detecting current hostname: {res}")
+    raise RuntimeError("Failure detecting current hostname")
 
 
 def empty_future(result_type: type[T]) -> Future[Optional[T]]:
@@ -652,20 +650,16 @@ def empty_future(result_type: type[T]) -> Future[Optional[T]]:
 
 def wait_true(name: str, n_tries: int, func: Callable[..., bool], **func_kwargs: Any) -> bool:
     # Wait until the "func" is successful, or we will reach "n_tries".
-    # When "n_tries" is zero it will run until "func" succeeds.
+    # When "n_tries" is zero it will run until "func" succeeds. Tries are
+    # done with backoff (see waiter.Waiter), "n_tries" gives as much time as
+    # that many tries every 30s did.
     logger.info(f"Waiting for {name}")
-    for try_count in itertools.count(0):
-        if func(**func_kwargs):
-            logger.info(f"Took {try_count} tries for {name}")
-            return True
-
-        if n_tries and try_count >= n_tries:
-            logger.info(f"The limit of {n_tries} tries was reached for {name}")
-            return False
-
-        time.sleep(30)
-
-    return True
+    w = waiter.Waiter(name, timeout=n_tries * waiter.MAX_INTERVAL if n_tries else None)
+    if w.until(func, **func_kwargs):
+        logger.info(f"Took {w.attempts} tries for {name}")
+        return True
+    logger.info(f"The limit of {n_tries} tries was reached for {name}")
+    return False
 
 
 def wait_futures(msg: str, futures: list[tuple[str, Future[bool]]], cb: Callable[[], None] = lambda: None) -> None:
@@ -681,21 +675,17 @@ def wait_futures(msg: str, futures: list[tuple[str, Future[bool]]], cb: Callable
     logger.info(f"Waiting for {msg}: {state}")
     max_tries = 200
 
-    for tries in itertools.count(0):
+    def on_change() -> None:
+        nonlocal state
         new_state = {name: get_future_state(future) for (name, future) in futures}
-
         if set(state.items()) - set(new_state.items()):
             logger.info(f"State change of {msg}: {new_state}")
-
         state = new_state
-
-        if all(future.done() for (_, future) in futures):
-            break
-
-        time.sleep(30)
         cb()
-        if tries == max_tries:
-            logger.error_and_exit(f"Failed to wait for futures after {tries} tries")
+
+    # Woken up as soon as any of the futures is done.
+    if not waiter.Waiter(msg, timeout=max_tries * waiter.MAX_INTERVAL).futures([f for _, f in futures], on_change):
+        logger.error_and_exit(f"Failed to wait for futures after {max_tries * waiter.MAX_INTERVAL}s")
 
     if any(not future.result() for (_, future) in futures):
         logger.error_and_exit(f"Failed to {msg}: {state}")
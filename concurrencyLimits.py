@@ -0,0 +1,34 @@
+import contextlib
+import threading
+from typing import Iterator
+
+
+"""
+Limits on operations shared by all deployments run by this process (e.g.
+several clusters deployed concurrently), whatever task or thread runs
+them. Unlimited unless configure()d.
+"""
+
+ISO_DOWNLOAD = "iso_download"
+BMC = "bmc"
+CPU_HEAVY = "cpu_heavy"
+
+_limits: dict[str, threading.BoundedSemaphore] = {}
+
+
+def configure(name: str, n: int) -> None:
+    # Only before anything uses the limit. 0 removes it.
+    if n <= 0:
+        _limits.pop(name, None)
+    else:
+        _limits[name] = threading.BoundedSemaphore(n)
+
+
+@contextlib.contextmanager
+def slot(name: str) -> Iterator[None]:
+    sem = _limits.get(name)
+    if sem is None:
+        yield
+        return
+    with sem:
+        yield
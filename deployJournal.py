@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from typing import IO, Any, Optional
+from logger import logger
+
+
+"""
+Journal of a deployment's progress, to resume it after a crash.
+
+The journal is an append-only file of JSON lines, flushed and fsync'ed on
+every entry, next to the ISOs and kubeconfig. It records the tasks of the
+deployment graph that finished and the phases each node went through. A
+line cut short by a crash is ignored when reading it back.
+
+The journal only says what happened; before skipping anything, the
+deployer checks the recorded progress against the Assisted Installer and
+k8s state (see ClusterDeployer._reconcile()).
+"""
+
+# Phases of a node, in order.
+IMAGE_COPIED = "image-copied"
+VM_DEFINED = "vm-defined"
+BOOTED = "booted"
+RENAMED = "renamed"
+KNOWN = "known"
+INSTALLING = "installing"
+REBOOTED = "rebooted"
+READY = "ready"
+PHASES = [IMAGE_COPIED, VM_DEFINED, BOOTED, RENAMED, KNOWN, INSTALLING, REBOOTED, READY]
+
+
+def default_path(cluster_name: str) -> str:
+    return os.path.join(os.getcwd(), f"{cluster_name}.journal")
+
+
+class Journal:
+    def __init__(self, path: str, resume: bool = False):
+        # Without "resume", the previous journal is replaced on the first write.
+        self.path = path
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+        self._tasks: set[str] = set()
+        self._phases: dict[str, str] = {}
+        self._info: dict[str, dict[str, Any]] = {}
+        if resume:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            logger.info(f"No journal at {self.path}, nothing to resume")
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.debug(f"Ignoring truncated journal entry {line!r}")
+                    continue
+                self._apply(e)
+        logger.info(f"Resuming from {self.path}: tasks {sorted(self._tasks)}, nodes {self._phases}")
+
+    def _apply(self, e: dict[str, Any]) -> None:
+        if e["event"] == "task":
+            self._tasks.add(e["name"])
+        elif e["event"] == "phase":
+            self._phases[e["node"]] = e["phase"]
+            self._info.setdefault(e["node"], {}).update(e.get("info", {}))
+        elif e["event"] == "reset":
+            self._phases.pop(e["node"], None)
+            self._info.pop(e["node"], None)
+
+    def _write(self, e: dict[str, Any]) -> None:
+        e["time"] = time.time()
+        with self._lock:
+            self._apply(e)
+            if self._file is None:
+                self._file = open(self.path, "a" if self.resume else "w")
+                if self._file.tell() and not self._ends_with_newline():
+                    # Don't append to the entry cut short by the crash.
+                    self._file.write("\n")
+            self._file.write(json.dumps(e) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def task_done(self, name: str) -> None:
+        self._write({"event": "task", "name": name})
+
+    def node_phase(self, node: str, phase: str, **info: Any) -> None:
+        # "info" (e.g. a dynamic IP) is kept with the node until it's reset.
+        self._write({"event": "phase", "node": node, "phase": phase, "info": info})
+
+    def reset_node(self, node: str) -> None:
+        # The node is started over (e.g. after a failed install).
+        self._write({"event": "reset", "node": node})
+
+    def done(self, task: str) -> bool:
+        with self._lock:
+            return task in self._tasks
+
+    def tasks(self) -> set[str]:
+        with self._lock:
+            return set(self._tasks)
+
+    def phase(self, node: str) -> Optional[str]:
+        with self._lock:
+            return self._phases.get(node)
+
+    def info(self, node: str) -> dict[str, Any]:
+        with self._lock:
+            return dict(self._info.get(node, {}))
+
+    def reached(self, node: str, phase: str) -> bool:
+        current = self.phase(node)
+        return current is not None and PHASES.index(current) >= PHASES.index(phase)
+
+    def remove(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._tasks.clear()
+            self._phases.clear()
+            self._info.clear()
@@ -1,12 +1,14 @@
 from clustersConfig import ClustersConfig
 from clustersConfig import NodeConfig
 from concurrent.futures import Future
-from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from logger import logger
 from clustersConfig import ExtraConfigArgs
+from asyncHost import AsyncHost, default_executor
 import host
+from outputCapture import CapturePolicy
 import json
+import shlex
 import sys
 
 ORIGINAL_IMAGE = "ovnk-image:original"
@@ -15,8 +17,9 @@ DEFAULT_OVN_REPO = "https://github.com/ovn-org/ovn.git"
 DEFAULT_OVN_REF = "main"
 # OVN build dependencies that can be removed to simplify build on UBI.
 REMOVE_DEPS = "graphviz groff sphinx-build unbound checkpolicy selinux-policy-devel"
-EXECUTOR_SIZE = 20
 IMAGE_PATH = "/tmp/image.tar"
+# The complete build log stays in /tmp/ovn-custom-image.log on the node.
+BUILD_CAPTURE = CapturePolicy(max_chars=1 << 20)
 
 
 def ExtraConfigCustomOvn(cc: ClustersConfig, cfg: ExtraConfigArgs, futures: dict[str, Future[Optional[host.Result]]]) -> None:
@@ -34,13 +37,10 @@ def ExtraConfigCustomOvn(cc: ClustersConfig, cfg: ExtraConfigArgs, futures: dict
     build_image(node, cfg)
     save_image(node)
 
-    executor = ThreadPoolExecutor(max_workers=EXECUTOR_SIZE)
-
     all = cc.masters[1:] + cc.workers
-    futures = {c.name: executor.submit(load_image, c) for c in all}
-    for name, future in futures.items():
-        result = future.result()
-        if result is not None and not result.success():
+    results = default_executor().run_all([load_image(c) for c in all])
+    for name, result in zip((c.name for c in all), results):
+        if not result.success():
             die(f"Failed to load image on \"{name}\": {result}")
 
 
@@ -65,15 +65,18 @@ def tag_ovnk_image(node: host.Host) -> None:
 def build_image(node: host.Host, cfg: ExtraConfigArgs) -> None:
     logger.info("Building custom OVN image")
     node.copy_to("manifests/ovn/Dockerfile", "/tmp/Dockerfile")
-    node.run_or_die(
+    # The build output is streamed back (and logged) while it runs, and still
+    # kept in /tmp/ovn-custom-image.log on the node.
+    build_cmd = (
         f"sudo podman build -t {CUSTOM_IMAGE} "
         f"--build-arg OVNK_IMAGE={ORIGINAL_IMAGE} "
         f"--build-arg OVN_REPO={cfg.ovn_repo or DEFAULT_OVN_REPO} "
         f"--build-arg OVN_REF={cfg.ovn_ref or DEFAULT_OVN_REF} "
         f"--build-arg OVN_REMOVE_DEPS=\"{REMOVE_DEPS}\" "
         "-f /tmp/Dockerfile . "
-        ">/tmp/ovn-custom-image.log 2>&1"
+        "2>&1 | tee /tmp/ovn-custom-image.log"
     )
+    node.run_or_die(f"bash -o pipefail -c {shlex.quote(build_cmd)}", capture=BUILD_CAPTURE)
 
 
 def save_image(node: host.Host) -> None:
@@ -82,21 +85,21 @@ def save_image(node: host.Host) -> None:
     node.copy_from(IMAGE_PATH, IMAGE_PATH)
 
 
-def load_image(config: NodeConfig) -> host.Result:
+async def load_image(config: NodeConfig) -> host.Result:
     logger.info(f"Loading custom OVN image on \"{config.name}\"")
 
     assert config.ip is not None
-    node = host.RemoteHost(config.ip)
-    node.ssh_connect("core")
+    node = AsyncHost(host.RemoteHost(config.ip))
+    await node.ssh_connect("core")
 
     # Running commandline SCP here because of the performance. SFTP was able to transfer with 20Mbps at most,
     # SCP over commandline is able to transfer with >800Mbps.
-    local_node = host.LocalHost()
-    result = local_node.run(f"scp {IMAGE_PATH} core@{config.ip}:{IMAGE_PATH}")
+    local_node = AsyncHost(host.LocalHost())
+    result = await local_node.run(f"scp {IMAGE_PATH} core@{config.ip}:{IMAGE_PATH}")
     if not result.success():
         return result
 
-    return node.run(f"sudo podman load -i {IMAGE_PATH}")
+    return await node.run(f"sudo podman load -i {IMAGE_PATH}")
 
 
 def die(msg: str) -> None:
@@ -32,8 +32,7 @@ def ensure_go_installed(host: host.Host) -> None:
 
 
 def go_install(host: host.Host) -> None:
-    ret = host.run_or_die("uname -m")
-    architecture = ret.out.strip()
+    architecture = host.facts().arch
     if architecture == "x86_64":
         go_tarball = "go1.23.6.linux-amd64.tar.gz"
     elif architecture == "aarch64":
@@ -0,0 +1,140 @@
+import functools
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import paramiko
+from logger import logger
+
+
+CHUNK_SIZE = 64 * 1024 * 1024
+WRITE_SIZE = 1024 * 1024
+PARALLEL_CHUNKS = 4
+MAX_RETRIES = 5
+
+_digest_cache: dict[tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def local_sha256(path: str) -> str:
+    # Hashing a multi-GB ISO takes a while, and the same ISO is copied to
+    # many hosts, so cache the digest as long as the file doesn't change.
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        if key in _digest_cache:
+            return _digest_cache[key]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while data := f.read(WRITE_SIZE):
+            h.update(data)
+    digest = h.hexdigest()
+    with _digest_lock:
+        _digest_cache[key] = digest
+    return digest
+
+
+def retriable(e: Exception) -> bool:
+    # Errors reported by the server won't go away by reconnecting.
+    return not isinstance(e, (FileNotFoundError, PermissionError))
+
+
+class ChunkedUpload:
+    """
+    Uploads a file over SFTP as independent chunks, several in parallel, each
+    over its own SFTP session (all on the same SSH connection) and with
+    pipelined writes. Data is written to "<dst>.part", verified with sha256
+    and then renamed to "dst".
+
+    If the connection drops, only the chunks that didn't complete are sent
+    again after reconnecting, up to "max_retries" times per chunk. The whole
+    copy is skipped when "dst" already has the same sha256.
+    """
+
+    def __init__(
+        self,
+        open_sftp: Callable[[], paramiko.SFTPClient],
+        reconnect: Callable[[], None],
+        remote_sha256: Callable[[str], Optional[str]],
+        *,
+        chunk_size: int = CHUNK_SIZE,
+        parallel: int = PARALLEL_CHUNKS,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self._open_sftp = open_sftp
+        self._reconnect = reconnect
+        self._remote_sha256 = remote_sha256
+        self._chunk_size = chunk_size
+        self._parallel = parallel
+        self._max_retries = max_retries
+        self._reconnect_lock = threading.Lock()
+
+    def upload(self, src: str, dst: str) -> bool:
+        # Returns False if the copy was skipped since dst is already up to date.
+        digest = local_sha256(src)
+        if self._remote_sha256(dst) == digest:
+            logger.info(f"{dst} is up to date (sha256 {digest}), skipping copy")
+            return False
+
+        size = os.path.getsize(src)
+        part = f"{dst}.part"
+        self._retry(lambda: self._prepare(part, size))
+
+        offsets = range(0, size, self._chunk_size)
+        with ThreadPoolExecutor(max_workers=self._parallel) as executor:
+            futures = [executor.submit(self._retry, functools.partial(self._send_chunk, src, part, offset)) for offset in offsets]
+            for f in futures:
+                f.result()
+
+        remote_digest = self._remote_sha256(part)
+        if remote_digest != digest:
+            raise RuntimeError(f"sha256 mismatch after copying {src} to {part}: {remote_digest} != {digest}")
+        self._retry(lambda: self._rename(part, dst))
+        return True
+
+    def _retry(self, op: Callable[[], None]) -> None:
+        for attempt in range(self._max_retries + 1):
+            try:
+                op()
+                return
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                if attempt == self._max_retries or not retriable(e):
+                    raise
+                logger.info(f"{e}: transfer interrupted, reconnecting ({attempt + 1}/{self._max_retries})...")
+                # Serialize reconnects of the chunk workers.
+                with self._reconnect_lock:
+                    self._reconnect()
+
+    def _prepare(self, part: str, size: int) -> None:
+        sftp = self._open_sftp()
+        try:
+            with sftp.open(part, "w"):
+                pass
+            sftp.truncate(part, size)
+        finally:
+            sftp.close()
+
+    def _send_chunk(self, src: str, part: str, offset: int) -> None:
+        sftp = self._open_sftp()
+        try:
+            with open(src, "rb") as local, sftp.open(part, "r+") as remote:
+                remote.set_pipelined(True)
+                local.seek(offset)
+                remote.seek(offset)
+                left = self._chunk_size
+                while left > 0:
+                    data = local.read(min(WRITE_SIZE, left))
+                    if not data:
+                        break
+                    remote.write(data)
+                    left -= len(data)
+        finally:
+            sftp.close()
+
+    def _rename(self, part: str, dst: str) -> None:
+        sftp = self._open_sftp()
+        try:
+            sftp.posix_rename(part, dst)
+        finally:
+            sftp.close()
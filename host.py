@@ -1,6 +1,10 @@
 import socket
 import subprocess
-import io
+import hashlib
+import codecs
+import select
+import selectors
+import threading
 import os
 import re
 import time
@@ -8,16 +12,34 @@ import shlex
 import shutil
 import sys
 import logging
-import tempfile
+import uuid
+import itertools
+import random
+import json
 from bmc import BMC
 from typing import Optional
-from typing import Union
+from typing import Callable
+from typing import Generator
+from typing import Iterator
+from types import TracebackType
+from dataclasses import dataclass
 from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import paramiko
-from paramiko import ssh_exception, RSAKey, Ed25519Key
+from paramiko import ssh_exception
 from logger import logger
 from abc import ABC, abstractmethod
-import timer
+import reachability
+import fileTransfer
+from sshPool import ssh_pool, PoolKey
+from sshCredentials import credentials
+from remoteFS import RemoteFS
+import hostFacts
+from hostFacts import HostFacts
+import tracing
+import concurrencyLimits
+import outputCapture
+from outputCapture import CapturePolicy, OutputCapture, KEEP_ALL
 
 
 def default_id_rsa_path() -> str:
@@ -29,10 +51,13 @@ def default_ed25519_path() -> str:
 
 
 class Result:
-    def __init__(self, out: str, err: str, returncode: int):
+    def __init__(self, out: str, err: str, returncode: int, out_file: Optional[str] = None, err_file: Optional[str] = None):
         self.out = out
         self.err = err
         self.returncode = returncode
+        # Complete output spilled to disk (see outputCapture.CapturePolicy).
+        self.out_file = out_file
+        self.err_file = err_file
 
     def __str__(self) -> str:
         return f"(returncode: {self.returncode}, error: {self.err})"
@@ -40,23 +65,142 @@ class Result:
     def success(self) -> bool:
         return self.returncode == 0
 
+    def full_out(self) -> str:
+        # "out" might have been truncated, this reads the spilled output.
+        return outputCapture.read_spill(self.out_file) if self.out_file else self.out
+
+    def full_err(self) -> str:
+        return outputCapture.read_spill(self.err_file) if self.err_file else self.err
+
     @staticmethod
     def result_success() -> 'Result':
         return Result("", "", 0)
 
 
+STDOUT = "stdout"
+STDERR = "stderr"
+# Error of the commands a remote batch didn't get to (see Host.run_batch()).
+BATCH_CUT_SHORT = "batch cut short"
+
+_READ_SIZE = 32768
+
+
+@dataclass(frozen=True)
+class OutputChunk:
+    stream: str  # STDOUT or STDERR
+    data: str
+
+
+# A reader yields (stream, data) tuples as the output arrives and returns the
+# exit code of the command. It must stop (and clean up the command) once the
+# event is set.
+_Reader = Generator[tuple[str, bytes], None, int]
+
+
+class CommandStream:
+    """
+    Output of a running command, see Host.stream().
+
+    Iterating yields OutputChunks of stdout and stderr, interleaved in the
+    order in which they arrive. Chunks are not kept, so memory usage doesn't
+    depend on how much the command prints. Once the iteration is done,
+    "returncode" is set.
+
+    "on_line" is called with (stream, line) for each complete line (without
+    the line terminator). Lines longer than "max_line_length" are split.
+    """
+
+    def __init__(self, reader: Callable[[threading.Event], _Reader], on_line: Optional[Callable[[str, str], None]] = None, max_line_length: int = 65536):
+        self.returncode: Optional[int] = None
+        self._cancelled = threading.Event()
+        self._gen = reader(self._cancelled)
+        self._on_line = on_line
+        self._max_line_length = max_line_length
+        self._partial = {STDOUT: "", STDERR: ""}
+
+    def __iter__(self) -> Iterator[OutputChunk]:
+        decoders = {s: codecs.getincrementaldecoder("utf-8")(errors="replace") for s in (STDOUT, STDERR)}
+        while True:
+            try:
+                stream, data = next(self._gen)
+            except StopIteration as e:
+                self.returncode = e.value
+                break
+            text = decoders[stream].decode(data)
+            if text:
+                self._feed_lines(stream, text)
+                yield OutputChunk(stream, text)
+
+        for stream, decoder in decoders.items():
+            text = decoder.decode(b"", final=True)
+            if text:
+                self._feed_lines(stream, text)
+                yield OutputChunk(stream, text)
+            if self._partial[stream] and self._on_line is not None:
+                self._on_line(stream, self._partial[stream])
+            self._partial[stream] = ""
+
+    def _feed_lines(self, stream: str, text: str) -> None:
+        if self._on_line is None:
+            return
+        lines = (self._partial[stream] + text).split("\n")
+        self._partial[stream] = lines.pop()
+        for line in lines:
+            self._on_line(stream, line.rstrip("\r"))
+        while len(self._partial[stream]) > self._max_line_length:
+            self._on_line(stream, self._partial[stream][: self._max_line_length])
+            self._partial[stream] = self._partial[stream][self._max_line_length :]
+
+    def wait(self) -> int:
+        # Drain the output (only passing it to "on_line") and return the
+        # exit code.
+        for _ in self:
+            pass
+        assert self.returncode is not None
+        return self.returncode
+
+    def cancel(self) -> None:
+        # Can be called from any thread. The command is killed (local) or its
+        # channel is closed (remote) and the iteration ends shortly after.
+        self._cancelled.set()
+
+    def close(self) -> None:
+        self.cancel()
+        self._gen.close()
+
+    def __enter__(self) -> 'CommandStream':
+        return self
+
+    def __exit__(self, exc_type: Optional[type[BaseException]], exc_value: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+
 class Login(ABC):
-    def __init__(self, hostname: str, username: str) -> None:
+    def __init__(self, hostname: str, username: str, via: Optional['Host'] = None) -> None:
         self._username = username
         self._hostname = hostname
+        self._via = via
 
     def debug_details(self) -> str:
-        return str({k: v for k, v in vars(self).items() if k not in ['_key', '_password']})
+        details = {k: v for k, v in vars(self).items() if k not in ['_key', '_password', '_via']}
+        if self._via is not None:
+            details['_via'] = self._via.hostname()
+        return str(details)
 
     def login(self) -> paramiko.SSHClient:
         self._log()
         return self.quiet_login()
 
+    def pool_key(self) -> PoolKey:
+        hostname = self._hostname if self._via is None else f"{self._hostname} via {self._via.hostname()}"
+        return (hostname, self._username, self._auth_id())
+
+    def _sock(self) -> Optional[paramiko.Channel]:
+        # Connections through a jump host are tunneled over its connection.
+        if self._via is None:
+            return None
+        return self._via.open_forward(self._hostname, 22)
+
     def _host(self) -> paramiko.SSHClient:
         host = paramiko.SSHClient()
         host.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -66,161 +210,366 @@ class Login(ABC):
     def quiet_login(self) -> paramiko.SSHClient:
         pass
 
+    @abstractmethod
+    def _auth_id(self) -> str:
+        pass
+
     @abstractmethod
     def _log(self) -> None:
         pass
 
 
 class KeyLogin(Login):
-    def __init__(self, hostname: str, username: str, key_path: str) -> None:
-        super().__init__(hostname, username)
+    def __init__(self, hostname: str, username: str, key_path: str, via: Optional['Host'] = None) -> None:
+        super().__init__(hostname, username, via)
         self._key_path = key_path
-        with open(key_path, "r") as f:
-            self._key = f.read().strip()
-
-        key_loader = self._key_loader()
-        self._pkey = key_loader.from_private_key(io.StringIO(self._key))
-
-    def _key_loader(self) -> Union[type[Ed25519Key], type[RSAKey]]:
-        if self._is_rsa():
-            return RSAKey
-        else:
-            return Ed25519Key
+        self._key = credentials.load_key(key_path)
+        self._pkey = self._key.pkey
 
     def _is_rsa(self) -> bool:
-        lh = LocalHost()
-        result = lh.run(f"ssh-keygen -vvv -l -f {self._key_path}")
-        logger.debug(result.out)
-        return "---[RSA " in result.out
+        return self._key.is_rsa()
 
     def quiet_login(self) -> paramiko.SSHClient:
         host = self._host()
-        host.connect(self._hostname, username=self._username, pkey=self._pkey, look_for_keys=False, allow_agent=False)
+        host.connect(self._hostname, username=self._username, pkey=self._pkey, look_for_keys=False, allow_agent=False, sock=self._sock())
         return host
 
+    def _auth_id(self) -> str:
+        return f"key:{self._key_path}"
+
     def _log(self) -> None:
         logger.info(f"Logging in into {self._hostname} with {self._key_path}")
 
 
 class PasswordLogin(Login):
-    def __init__(self, hostname: str, username: str, password: str) -> None:
-        super().__init__(hostname, username)
+    def __init__(self, hostname: str, username: str, password: str, via: Optional['Host'] = None) -> None:
+        super().__init__(hostname, username, via)
         self._password = password
 
     def quiet_login(self) -> paramiko.SSHClient:
         host = self._host()
-        host.connect(self._hostname, username=self._username, password=self._password, look_for_keys=False, allow_agent=False)
+        host.connect(self._hostname, username=self._username, password=self._password, look_for_keys=False, allow_agent=False, sock=self._sock())
         return host
 
+    def _auth_id(self) -> str:
+        # Don't keep the password itself in the pool key.
+        return f"password:{hashlib.sha256(self._password.encode('utf-8')).hexdigest()}"
+
     def _log(self) -> None:
         logger.info(f"Logging into {self._hostname} with password")
 
 
 class AutoLogin(Login):
-    def __init__(self, hostname: str, username: str) -> None:
-        super().__init__(hostname, username)
+    def __init__(self, hostname: str, username: str, via: Optional['Host'] = None) -> None:
+        super().__init__(hostname, username, via)
 
     def quiet_login(self) -> paramiko.SSHClient:
         host = self._host()
-        host.connect(self._hostname, username=self._username, look_for_keys=True, allow_agent=True)
+        host.connect(self._hostname, username=self._username, look_for_keys=True, allow_agent=True, sock=self._sock())
         return host
 
+    def _auth_id(self) -> str:
+        return "auto"
+
     def _log(self) -> None:
         logger.info(f"Logging into {self._hostname} with Paramiko 'Auto key discovery' & 'Ssh-Agent'")
 
 
+DPU_TOOLS_IMAGE = "quay.io/bnemeth/bf"
+
+# pxeboot prints a lot, only the end of it (with the BF's IP) is used.
+PXEBOOT_CAPTURE = CapturePolicy(max_chars=1 << 20)
+
+
+class DpuToolsSidecar:
+    """
+    Long-lived dpu-tools container on a host. It's started once (pulling the
+    image only if the registry has a newer one) and commands are then run in
+    it with "podman exec", instead of starting a new container and pulling
+    the image for every command. If the container is gone (e.g. the host
+    rebooted), it's started again.
+
+    There's one per host (the container name is fixed), the dpu-tools flags
+    are passed with each command.
+    """
+
+    NAME = "dpu-tools-sidecar"
+    # Seconds to wait for removing the container when stopping.
+    STOP_TIMEOUT = 30
+
+    def __init__(self, h: 'Host', image: str = DPU_TOOLS_IMAGE):
+        self._host = h
+        self._image = image
+        self._lock = threading.Lock()
+        self._entrypoint: Optional[list[str]] = None
+        self._boot_id = ""
+
+    def _start(self) -> list[str]:
+        logger.info(f"Starting {self.NAME} container on {self._host.hostname()}")
+        self._host.run_or_die(f"sudo podman run -d --replace --pull newer --pid host --network host --user 0 --name {self.NAME} --privileged -v /dev:/dev --entrypoint sleep {self._image} infinity")
+        # Commands are run with the image's own entrypoint, as "podman run" would.
+        ret = self._host.run_or_die(f"sudo podman image inspect -f '{{{{json .Config.Entrypoint}}}}' {self._image}")
+        entrypoint: list[str] = json.loads(ret.out) or []
+        self._boot_id = self._host.facts().boot_id
+        return entrypoint
+
+    def _ensure_started(self) -> list[str]:
+        with self._lock:
+            if self._entrypoint is None or self._boot_id != self._host.facts().boot_id:
+                self._entrypoint = self._start()
+            return self._entrypoint
+
+    def run(self, args: list[str], cmd: str, log_level: int, capture: CapturePolicy = KEEP_ALL) -> Result:
+        for attempt in range(2):
+            entrypoint = self._ensure_started()
+            full_command = shlex.join(["sudo", "podman", "exec", self.NAME, *entrypoint, *args]) + f" {cmd}"
+            ret = self._host.run(full_command, log_level, capture=capture)
+            if attempt or not ret.returncode or "no such container" not in ret.err.lower():
+                return ret
+            logger.info(f"{self.NAME} is gone on {self._host.hostname()}, restarting it")
+            with self._lock:
+                self._entrypoint = None
+        raise AssertionError("unreachable")
+
+    def stop(self) -> None:
+        # Called on exit, possibly after a failure that made the host
+        # unreachable: doesn't wait for it to come back.
+        with self._lock:
+            if self._entrypoint is not None:
+                if self._host.run_once(f"sudo podman rm -f -t 0 {self.NAME}", timeout=self.STOP_TIMEOUT) is None:
+                    logger.info(f"Couldn't remove {self.NAME} on {self._host.hostname()}")
+                self._entrypoint = None
+
+
 class Host:
-    def __new__(cls, hostname: str, bmc: Optional[BMC] = None) -> 'Host':
-        key = (hostname, bmc.url if bmc else None)
+    # True when operations are recorded/replayed (see set_backend()), in which
+    # case they must go through the public methods.
+    intercepted: bool = False
+    _host: paramiko.SSHClient
+    _pool_key: Optional[PoolKey]
+    _remote_fs: Optional[RemoteFS]
+    _dpu_tools: Optional[DpuToolsSidecar]
+    # Gathered facts, with the connection and sudo setting they were gathered
+    # with (the home directory depends on sudo).
+    _facts: Optional[tuple[HostFacts, Optional[paramiko.SSHClient], bool]]
+
+    def __new__(cls, hostname: str, bmc: Optional[BMC] = None, via: Optional['Host'] = None) -> 'Host':
+        key = (hostname, bmc.url if bmc else None, via.hostname() if via else None)
         if key not in host_instances:
-            host_instances[key] = super().__new__(cls)
+            h = super().__new__(_backend(cls) if _backend is not None else cls)
+            # The connection state is not reset by __init__, as Host objects
+            # are shared and re-initialized on each Host(...) call.
+            h._pool_key = None
+            h._remote_fs = None
+            h._facts = None
+            h._dpu_tools = None
+            host_instances[key] = h
         return host_instances[key]
 
-    def __init__(self, hostname: str, bmc: Optional[BMC] = None):
+    def __init__(self, hostname: str, bmc: Optional[BMC] = None, via: Optional['Host'] = None):
+        """
+        With "via", the host is reached through the SSH connection of another
+        (already connected) host, like ssh's ProxyJump. The parent connection
+        is re-established if needed when reconnecting.
+        """
+        assert via is None or not via.is_localhost()
         self._hostname = hostname
         self._bmc = bmc
+        self._via = via
         self._logins: list[Login] = []
         self.sudo_needed = False
 
     @lru_cache(maxsize=None)
     def is_localhost(self) -> bool:
-        return self._hostname in ("localhost", socket.gethostname())
+        return self._via is None and self._hostname in ("localhost", socket.gethostname())
 
     def ssh_connect(self, username: str, password: Optional[str] = None, *, discover_auth: bool = True, rsa_path: str = default_id_rsa_path(), ed25519_path: str = default_ed25519_path(), timeout: float = 3600) -> None:
         assert not self.is_localhost()
-        if not self.ping():
-            logger.info(f"waiting for '{self._hostname}' to respond to ping")
-            self.wait_ping()
-        logger.info(f"{self._hostname} up, connecting with {username}")
-
         self._logins = []
 
         if password is not None:
-            pw = PasswordLogin(self._hostname, username, password)
+            pw = PasswordLogin(self._hostname, username, password, self._via)
             self._logins.append(pw)
 
         if os.path.exists(rsa_path):
             try:
-                id_rsa = KeyLogin(self._hostname, username, rsa_path)
+                id_rsa = KeyLogin(self._hostname, username, rsa_path, self._via)
                 self._logins.append(id_rsa)
             except Exception:
                 pass
         if os.path.exists(ed25519_path):
             try:
-                id_ed25519 = KeyLogin(self._hostname, username, ed25519_path)
+                id_ed25519 = KeyLogin(self._hostname, username, ed25519_path, self._via)
                 self._logins.append(id_ed25519)
             except Exception:
                 pass
 
         if discover_auth:
-            auto = AutoLogin(self._hostname, username)
+            auto = AutoLogin(self._hostname, username, self._via)
             self._logins.append(auto)
 
+        if self._connect_pooled(self._logins):
+            logger.info(f"Reusing SSH connection to {self._hostname} with {username}")
+            return
+
+        if self._via is not None:
+            # Not reachable from here, ssh_connect_looped() waits for it.
+            logger.info(f"Connecting to {self._hostname} with {username} via {self._via.hostname()}")
+        else:
+            if not self.ping():
+                logger.info(f"waiting for '{self._hostname}' to respond to ping")
+                self.wait_ping()
+            logger.info(f"{self._hostname} up, connecting with {username}")
+
         self.ssh_connect_looped(self._logins, timeout)
 
+    def _connect_pooled(self, logins: list[Login]) -> bool:
+        for login in logins:
+            client = ssh_pool.get(login.pool_key())
+            if client is not None:
+                self._host = client
+                self._pool_key = login.pool_key()
+                return True
+        return False
+
+    def _ssh_client(self) -> paramiko.SSHClient:
+        # Returns the pooled connection, reconnecting if it died or was evicted
+        # since it was last used.
+        client = ssh_pool.get(self._pool_key) if self._pool_key is not None else None
+        if client is None:
+            self.ssh_connect_looped(self._logins)
+            return self._host
+        self._host = client
+        return client
+
+    def open_forward(self, hostname: str, port: int) -> paramiko.Channel:
+        # Opens a "direct-tcpip" channel (like ssh -W) from this host to
+        # hostname:port, over this host's SSH connection.
+        transport = self._ssh_client().get_transport()
+        assert transport is not None
+        return transport.open_channel("direct-tcpip", (hostname, port), ("127.0.0.1", 0))
+
+    def _drop_connection(self) -> None:
+        if self._pool_key is not None:
+            ssh_pool.discard(self._pool_key, self._host)
+
+    def _reconnect(self) -> None:
+        transport = self._host.get_transport()
+        if transport is not None and transport.is_active():
+            # Only the channel failed. Keep the pooled connection, since
+            # other commands might be running on it.
+            time.sleep(1)
+            return
+        self._drop_connection()
+        self.ssh_connect_looped(self._logins)
+
     def ssh_connect_looped(self, logins: list[Login], timeout: float = 3600) -> None:
         if not logins:
             raise RuntimeError("No usable logins found")
 
+        # Try the login that worked last time first.
+        last_success = credentials.last_success(self._hostname, logins[0]._username)
+        logins = sorted(logins, key=lambda login: login._auth_id() != last_success)
+
         login_details = ", ".join([login.debug_details() for login in logins])
         logger.info(f"Attempting SSH connections on {self._hostname} with logins: {login_details}")
 
-        first_attempt = True
-        end_time = time.monotonic() + timeout
-        while time.monotonic() < end_time:
-            for login in logins:
-                try:
-                    self._host = login.quiet_login()
-                    logger.info(f"Login successful on {self._hostname}")
+        start = time.monotonic()
+        end_time = start + timeout
+        delay = CONNECT_INITIAL_BACKOFF
+        attempt = 0
+        while True:
+            attempt += 1
+            # Don't go through the logins (and their TCP and SSH handshakes)
+            # before sshd accepts connections.
+            if self._via is not None or _port_open(self._hostname, 22, min(CONNECT_PROBE_TIMEOUT, max(end_time - time.monotonic(), 0.1))):
+                if last_success is not None and logins[0]._auth_id() == last_success:
+                    login, errors = self._try_logins(logins[:1], attempt)
+                    if login is None:
+                        login, more_errors = self._try_logins(logins[1:], attempt)
+                        errors += more_errors
+                else:
+                    login, errors = self._try_logins(logins, attempt)
+                if login is not None:
+                    elapsed = time.monotonic() - start
+                    credentials.remember_success(self._hostname, login._username, login._auth_id(), elapsed)
+                    logger.info(f"Login successful on {self._hostname} with {login._auth_id()} after {elapsed:.1f}s ({attempt} attempts)")
                     return
-                except (ssh_exception.AuthenticationException, ssh_exception.NoValidConnectionsError, ssh_exception.SSHException, socket.error, socket.timeout, EOFError) as e:
-                    if first_attempt:
-                        logger.info(f"{type(e).__name__} - {str(e)} for login {login.debug_details()} on host {self._hostname}")
-                        first_attempt = False
-                    else:
-                        logger.debug(f"{type(e).__name__} - {str(e)} for login {login.debug_details()} on host {self._hostname}")
-                    time.sleep(10)
-                except Exception as e:
-                    logger.exception(f"SSH connect, login {login.debug_details()} user {login._username} on host {self._hostname}: {type(e).__name__} - {str(e)}")
-                    raise e
+                for e in errors:
+                    if not isinstance(e, _CONNECT_ERRORS):
+                        raise e
+            elif attempt == 1:
+                logger.info(f"Port 22 on {self._hostname} not reachable yet")
+
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                break
+            # Exponential backoff with jitter, so that hosts brought up together
+            # don't retry in lockstep.
+            time.sleep(min(remaining, random.uniform(delay / 2, delay)))
+            delay = min(delay * 2, CONNECT_MAX_BACKOFF)
 
         raise ConnectionError(f"Failed to establish an SSH connection to {self._hostname}")
 
+    def _try_logins(self, logins: list[Login], attempt: int) -> tuple[Optional[Login], list[Exception]]:
+        # Tries all logins concurrently. The first one that succeeds is added to
+        # the pool and used, connections made by the others are closed.
+        if not logins:
+            return None, []
+        errors: list[Exception] = []
+        executor = ThreadPoolExecutor(max_workers=len(logins))
+        futures = {executor.submit(login.quiet_login): login for login in logins}
+        winner: Optional[Login] = None
+        used: Optional[paramiko.SSHClient] = None
+
+        def close_unused(future: "Future[paramiko.SSHClient]") -> None:
+            if not future.cancelled() and future.exception() is None and future.result() is not used:
+                future.result().close()
+
+        try:
+            for future in as_completed(futures):
+                login = futures[future]
+                try:
+                    client = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    log_level = logging.INFO if attempt == 1 else logging.DEBUG
+                    if not isinstance(e, _CONNECT_ERRORS):
+                        logger.exception(f"SSH connect, login {login.debug_details()} user {login._username} on host {self._hostname}: {type(e).__name__} - {str(e)}")
+                    else:
+                        logger.log(log_level, f"{type(e).__name__} - {str(e)} for login {login.debug_details()} on host {self._hostname}")
+                    continue
+                winner = login
+                self._host = ssh_pool.connect(login.pool_key(), lambda: client)
+                self._pool_key = login.pool_key()
+                used = self._host
+                break
+        finally:
+            for future in futures:
+                future.add_done_callback(close_unused)
+            executor.shutdown(wait=False)
+        return winner, errors
+
     def _rsa_login(self) -> Optional[KeyLogin]:
         for x in self._logins:
             if isinstance(x, KeyLogin) and x._is_rsa():
                 return x
         return None
 
+    def fs(self) -> RemoteFS:
+        # File system access over a persistent SFTP session (remote hosts only).
+        assert not self.is_localhost()
+        if self._remote_fs is None:
+            self._remote_fs = RemoteFS(lambda: self._ssh_client().open_sftp())
+        return self._remote_fs
+
     def remove(self, source: str) -> None:
         if self.is_localhost():
             if os.path.exists(source):
                 os.remove(source)
         else:
-            assert self._host is not None
             try:
-                sftp = self._host.open_sftp()
-                sftp.remove(source)
+                self.fs().remove(source)
             except FileNotFoundError:
                 pass
 
@@ -228,93 +577,216 @@ class Host:
     def copy_to(self, src_file: str, dst_file: str) -> None:
         if not os.path.exists(src_file):
             raise FileNotFoundError(2, f"No such file or dir: {src_file}")
-        self._copy(src_file, dst_file, True)
+        size = os.path.getsize(src_file)
+        with tracing.span(f"copy {src_file} to {dst_file}", tracing.TRANSFER, self._hostname, bytes=size):
+            if not self.is_localhost() and size >= fileTransfer.CHUNK_SIZE:
+                upload = fileTransfer.ChunkedUpload(lambda: self._ssh_client().open_sftp(), self._reconnect, self._sha256)
+                upload.upload(src_file, dst_file)
+                return
+            self._copy(src_file, dst_file, True)
 
     # Copying remote_file from "Host", which can be local or remote
     def copy_from(self, src_file: str, dst_file: str) -> None:
-        self._copy(src_file, dst_file, False)
+        with tracing.span(f"copy {src_file} from host to {dst_file}", tracing.TRANSFER, self._hostname):
+            self._copy(src_file, dst_file, False)
 
     def _copy(self, src_file: str, dst_file: str, to: bool) -> None:
         if self.is_localhost():
             shutil.copy(src_file, dst_file)
-        else:
-            while True:
+            return
+
+        for attempt in range(fileTransfer.MAX_RETRIES + 1):
+            try:
+                sftp = self._ssh_client().open_sftp()
                 try:
-                    sftp = self._host.open_sftp()
                     if to:
                         sftp.put(src_file, dst_file)
                     else:
                         sftp.get(src_file, dst_file)
-                    break
-                except Exception as e:
-                    logger.info(e)
-                    logger.info("Disconnected during sftpd, reconnecting...")
-                    self.ssh_connect_looped(self._logins)
+                finally:
+                    sftp.close()
+                return
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                if attempt == fileTransfer.MAX_RETRIES or not fileTransfer.retriable(e):
+                    raise
+                logger.info(e)
+                logger.info("Disconnected during sftpd, reconnecting...")
+                self._reconnect()
+
+    def _sha256(self, path: str) -> Optional[str]:
+        ret = self.run(f"sha256sum {shlex.quote(path)}")
+        if ret.returncode:
+            return None
+        return ret.out.split(maxsplit=1)[0]
 
     def need_sudo(self) -> None:
         self.sudo_needed = True
 
-    def run(self, cmd: str, log_level: int = logging.DEBUG, env: dict[str, str] = os.environ.copy(), quiet: bool = False) -> Result:
+    def run(self, cmd: str, log_level: int = logging.DEBUG, env: dict[str, str] = os.environ.copy(), quiet: bool = False, capture: CapturePolicy = KEEP_ALL) -> Result:
+        """
+        "capture" limits how much of the output is kept in memory, for
+        commands with a lot of output (see outputCapture.CapturePolicy).
+        """
         if self.sudo_needed:
             cmd = "sudo " + cmd
 
         if not quiet and log_level >= 0:
             logger.log(log_level, f"running command {cmd} on {self._hostname}")
-        if self.is_localhost():
-            ret_val = self._run_local(cmd, env)
-        else:
-            ret_val = self._run_remote(cmd, log_level)
+        with tracing.span(cmd, tracing.RUN, self._hostname) as span:
+            if self.is_localhost():
+                ret_val = self._run_local(cmd, env, capture)
+            else:
+                ret_val = self._run_remote(cmd, log_level, capture)
+            if ret_val.returncode:
+                span.outcome = f"exit {ret_val.returncode}"
 
         if log_level >= 0:
             logger.log(log_level, ret_val)
         return ret_val
 
-    def _run_local(self, cmd: str, env: dict[str, str]) -> Result:
+    def stream(self, cmd: str, *, on_line: Optional[Callable[[str, str], None]] = None, env: dict[str, str] = os.environ.copy()) -> CommandStream:
+        """
+        Start "cmd" and return a CommandStream that yields stdout and stderr
+        as they arrive. Unlike run(), a remote command is not restarted if the
+        connection is lost while it runs.
+        """
+        if self.sudo_needed:
+            cmd = "sudo " + cmd
+        return self._stream(cmd, on_line, env)
+
+    def _stream(self, cmd: str, on_line: Optional[Callable[[str, str], None]], env: Optional[dict[str, str]] = None) -> CommandStream:
+        if self.is_localhost():
+            return CommandStream(lambda cancelled: self._read_local(cmd, env, cancelled), on_line)
+        return CommandStream(lambda cancelled: self._read_remote(cmd, cancelled), on_line)
+
+    def _read_local(self, cmd: str, env: Optional[dict[str, str]], cancelled: threading.Event) -> _Reader:
         args = shlex.split(cmd)
         pipe = subprocess.PIPE
         with subprocess.Popen(args, stdout=pipe, stderr=pipe, env=env) as proc:
-            if proc.stdout is None:
-                logger.info("Can't find stdout")
-                sys.exit(-1)
-            if proc.stderr is None:
-                logger.info("Can't find stderr")
-                sys.exit(-1)
-            out, err = proc.communicate()
-            ret = proc.returncode
-        return Result(out.decode("utf-8"), err.decode("utf-8"), ret)
-
-    def _run_remote(self, cmd: str, log_level: int) -> Result:
-        def read_output(cmd: str, log_level: int) -> Result:
-            assert self._host is not None
-            _, stdout, stderr = self._host.exec_command(cmd)
-
-            out = []
-            for line in iter(stdout.readline, ""):
-                if log_level >= 0:
-                    logger.log(log_level, f"{self._hostname}: {line.rstrip()}")
-                out.append(line)
-
-            err = []
-            for line in iter(stderr.readline, ""):
-                err.append(line)
-
-            exit_code = stdout.channel.recv_exit_status()
-
-            return Result("".join(out), "".join(err), exit_code)
-
+            assert proc.stdout is not None and proc.stderr is not None
+            open_streams = 2
+            try:
+                with selectors.DefaultSelector() as sel:
+                    sel.register(proc.stdout, selectors.EVENT_READ, STDOUT)
+                    sel.register(proc.stderr, selectors.EVENT_READ, STDERR)
+                    while open_streams and not cancelled.is_set():
+                        for key, _ in sel.select(timeout=1):
+                            data = os.read(key.fd, _READ_SIZE)
+                            if not data:
+                                sel.unregister(key.fileobj)
+                                open_streams -= 1
+                                continue
+                            yield key.data, data
+            finally:
+                if open_streams:
+                    proc.kill()
+            return proc.wait()
+
+    def _open_session(self) -> paramiko.Channel:
+        while True:
+            try:
+                transport = self._ssh_client().get_transport()
+                assert transport is not None
+                return transport.open_session()
+            except paramiko.ChannelException as e:
+                # The connection is fine, but the server refused another
+                # session on it (e.g. sshd's MaxSessions). Wait for one of the
+                # other users of the pooled connection to finish.
+                logger.debug(f"Failed to open channel on {self._hostname} ({e}), retrying...")
+                time.sleep(1)
+            except Exception as e:
+                # The command didn't start yet, so it's safe to retry.
+                logger.debug(f"Failed to open channel on {self._hostname} ({e}), reconnecting...")
+                self._reconnect()
+
+    def _exec_channel(self, cmd: str) -> paramiko.Channel:
+        # Commands can change anything on the host.
+        if self._remote_fs is not None:
+            self._remote_fs.invalidate()
         # Make sure multiline command is not seen as multiple commands
         cmd = cmd.replace("\n", "\\\n")
+        chan = self._open_session()
+        try:
+            chan.exec_command(cmd)
+        except Exception:
+            chan.close()
+            raise
+        return chan
+
+    def _read_remote(self, cmd: str, cancelled: threading.Event) -> _Reader:
+        chan = self._exec_channel(cmd)
+        try:
+            while not cancelled.is_set():
+                got_data = False
+                while chan.recv_ready():
+                    got_data = True
+                    yield STDOUT, chan.recv(_READ_SIZE)
+                while chan.recv_stderr_ready():
+                    got_data = True
+                    yield STDERR, chan.recv_stderr(_READ_SIZE)
+                if not got_data:
+                    if chan.exit_status_ready() and not chan.recv_ready() and not chan.recv_stderr_ready():
+                        return chan.recv_exit_status()
+                    select.select([chan], [], [], 1)
+            return -1
+        finally:
+            chan.close()
+
+    def _capture(self, s: CommandStream, policy: CapturePolicy) -> Result:
+        capture = OutputCapture(policy, self._hostname)
+        try:
+            for chunk in s:
+                (capture.out if chunk.stream == STDOUT else capture.err).feed(chunk.data)
+        finally:
+            capture.close()
+        assert s.returncode is not None
+        return Result(capture.out.text(), capture.err.text(), s.returncode, capture.out.spill_path, capture.err.spill_path)
+
+    def _run_local(self, cmd: str, env: dict[str, str], capture: CapturePolicy = KEEP_ALL) -> Result:
+        return self._capture(self._stream(cmd, None, env), capture)
+
+    def _run_remote(self, cmd: str, log_level: int, capture: CapturePolicy = KEEP_ALL) -> Result:
+        def log_line(stream: str, line: str) -> None:
+            if stream == STDOUT:
+                logger.log(log_level, f"{self._hostname}: {line}")
+
         while True:
             try:
-                return read_output(cmd, log_level)
+                return self._capture(self._stream(cmd, log_line if log_level >= 0 else None), capture)
             except Exception as e:
                 if log_level >= 0:
                     logger.log(log_level, e)
                     logger.log(log_level, "Connection lost while running command, reconnecting...")
-                self.ssh_connect_looped(self._logins)
-
-    def run_or_die(self, cmd: str) -> Result:
-        ret = self.run(cmd)
+                self._reconnect()
+
+    def run_once(self, cmd: str, timeout: float) -> Optional[Result]:
+        """
+        Runs "cmd" on the current connection without reconnecting or
+        retrying, for cleanups that must not wait for an unreachable host.
+        Returns None if the host isn't connected or "cmd" didn't finish within
+        "timeout" seconds.
+        """
+        if self.is_localhost() or self.intercepted:
+            return self.run(cmd)
+        client = ssh_pool.get(self._pool_key) if self._pool_key is not None else None
+        transport = client.get_transport() if client is not None else None
+        if transport is None or not transport.is_active():
+            return None
+        if self.sudo_needed:
+            cmd = "sudo " + cmd
+        try:
+            with transport.open_session(timeout=timeout) as chan:
+                chan.settimeout(timeout)
+                chan.exec_command(cmd)
+                out = chan.makefile("rb").read().decode("utf-8", errors="replace")
+                err = chan.makefile_stderr("rb").read().decode("utf-8", errors="replace")
+                return Result(out, err, chan.recv_exit_status())
+        except Exception as e:
+            logger.debug(f"{cmd} on {self._hostname} failed: {e}")
+            return None
+
+    def run_or_die(self, cmd: str, capture: CapturePolicy = KEEP_ALL) -> Result:
+        ret = self.run(cmd, capture=capture)
         if ret.returncode:
             logger.error(f"{cmd} failed: {ret.err}")
             sys.exit(-1)
@@ -322,61 +794,143 @@ class Host:
             logger.debug(ret.out.strip())
         return ret
 
-    def run_in_container(self, cmd: str, interactive: bool = False, verbose: bool = True, dry_run: bool = False) -> Result:
-        name = "dpu-tools"
-        it = "-it" if interactive else ""
-        v = "--verbose" if verbose else ""
-        d = "--dry-run" if dry_run else ""
-        full_command = f"sudo podman run {it} --rm --pull always --replace --pid host --network host --user 0 --name {name} --privileged -v /dev:/dev quay.io/bnemeth/bf {v} {d} {cmd}"
-        return self.run(full_command, logging.INFO)
+    def run_batch(self, cmds: list[str], *, stop_on_error: bool = False, log_level: int = logging.DEBUG) -> list[Result]:
+        """
+        Run a list of commands and return a Result for each of them. On a
+        remote host, all commands are sent in a single exec session (one
+        channel, one round trip), each in its own subshell. The output of the
+        commands is framed with per-batch markers to split it up again. On
+        the local host, each command runs in its own shell too, so shell
+        syntax (";", "&&", redirections, variables) works the same.
+
+        With "stop_on_error", the commands after the first failing one are
+        not run and no Result is returned for them. Without it, the commands
+        a remote batch didn't get to (e.g. the session was dropped) get a
+        failed Result.
+        """
+        if not cmds:
+            return []
+        if self.is_localhost():
+            results = []
+            for cmd in cmds:
+                results.append(self.run(f"bash -c {shlex.quote(cmd)}", log_level))
+                if stop_on_error and not results[-1].success():
+                    break
+            return results
+
+        if self.sudo_needed:
+            cmds = ["sudo " + cmd for cmd in cmds]
+
+        marker = f"__cda_batch_{uuid.uuid4().hex}"
+        parts = []
+        for idx, cmd in enumerate(cmds):
+            report = f"printf '\\n%s %d %d\\n' {marker} {idx} $__rc"
+            part = f"( {cmd} ) </dev/null; __rc=$?; {report}; {report} >&2"
+            if stop_on_error:
+                part += "; [ $__rc -eq 0 ] || exit 0"
+            parts.append(part)
+
+        if log_level >= 0:
+            logger.log(log_level, f"running batch of {len(cmds)} commands on {self._hostname}")
+        with tracing.span(f"batch of {len(cmds)}: {cmds[0]}", tracing.RUN, self._hostname):
+            ret = self._run_remote("; ".join(parts), -1)
+
+        outs = _split_batch_output(ret.out, marker)
+        errs = _split_batch_output(ret.err, marker)
+        results = []
+        for (out, returncode), (err, _) in zip(outs, errs):
+            results.append(Result(out, err, returncode))
+        if len(results) < len(cmds) and (not results or results[-1].success()):
+            logger.warning(f"Batch on {self._hostname} cut short after {len(results)} of {len(cmds)} commands")
+            if not stop_on_error:
+                results += [Result("", BATCH_CUT_SHORT, -1) for _ in cmds[len(results) :]]
+        if log_level >= 0:
+            for cmd, result in zip(cmds, results):
+                logger.log(log_level, f"{cmd} on {self._hostname}: {result}")
+        return results
+
+    def run_in_container(self, cmd: str, interactive: bool = False, verbose: bool = True, dry_run: bool = False, capture: CapturePolicy = KEEP_ALL) -> Result:
+        return self._run_dpu_tools([], cmd, interactive, verbose, dry_run, logging.INFO, capture)
+
+    def _run_dpu_tools(self, args: list[str], cmd: str, interactive: bool, verbose: bool, dry_run: bool, log_level: int, capture: CapturePolicy = KEEP_ALL) -> Result:
+        flags = args + (["--verbose"] if verbose else []) + (["--dry-run"] if dry_run else [])
+        if not interactive:
+            if self._dpu_tools is None:
+                self._dpu_tools = DpuToolsSidecar(self)
+            return self._dpu_tools.run(flags, cmd, log_level, capture)
+        # Interactive commands (e.g. pxeboot) keep their own container.
+        full_command = f"sudo podman run -it --rm --pull newer --replace --pid host --network host --user 0 --name dpu-tools --privileged -v /dev:/dev {DPU_TOOLS_IMAGE} {shlex.join(flags)} {cmd}"
+        return self.run(full_command, log_level, capture=capture)
+
+    def stop_dpu_tools(self) -> None:
+        if self._dpu_tools is not None:
+            self._dpu_tools.stop()
+            self._dpu_tools = None
 
     def close(self) -> None:
-        assert self._host is not None
-        self._host.close()
+        # The connection might be shared with other users of the same host and
+        # credentials, closing it removes it from the pool for everybody.
+        if self._remote_fs is not None:
+            self._remote_fs.close()
+        self._drop_connection()
+        self._pool_key = None
 
     def boot_iso_redfish(self, iso_path: str) -> None:
         if self._bmc is None:
             raise Exception(f"Can't boot iso without bmc on {self.hostname()}")
-        self._bmc.boot_iso_redfish(iso_path)
+        with concurrencyLimits.slot(concurrencyLimits.BMC):
+            self._bmc.boot_iso_redfish(iso_path)
 
     def stop(self) -> None:
         if self._bmc is None:
             raise Exception(f"Can't stop host without bmc on {self.hostname()}")
-        self._bmc.stop()
+        with concurrencyLimits.slot(concurrencyLimits.BMC):
+            self._bmc.stop()
 
     def start(self) -> None:
         if self._bmc is None:
             raise Exception(f"Can't start host without bmc on {self.hostname()}")
-        self._bmc.start()
+        with concurrencyLimits.slot(concurrencyLimits.BMC):
+            self._bmc.start()
 
     def cold_boot(self) -> None:
         if self._bmc is None:
             raise Exception(f"Can't cold boot host without bmc on {self.hostname()}")
-        self._bmc.cold_boot()
+        with concurrencyLimits.slot(concurrencyLimits.BMC):
+            self._bmc.cold_boot()
 
     def wait_ping(self) -> None:
-        t = timer.Timer("1h")
-        while not self.ping():
-            if t.triggered():
-                logger.error_and_exit(f"Waited for 1h for ping to {self.hostname()}")
-            pass
-
-    def ping(self) -> bool:
-        lh = Host("localhost")
-        ping_cmd = f"timeout 1 ping -4 -c 1 {self._hostname}"
-        r = lh.run(ping_cmd)
-        return r.returncode == 0
+        if not self.ping(timeout=3600):
+            logger.error_and_exit(f"Waited for 1h for ping to {self.hostname()}")
+
+    def ping(self, timeout: float = 1) -> bool:
+        # Returns as soon as the host answers (ICMP or TCP), or False if it
+        # didn't answer within "timeout" seconds.
+        return reachability.prober.wait(self._hostname, timeout)
+
+    def facts(self) -> HostFacts:
+        """
+        Facts about the host (os-release, home dir, nproc, arch, ...),
+        gathered in one round trip and reused until the SSH connection is
+        re-established (e.g. after a reboot, in which case boot_id changes).
+        """
+        client = None if self.is_localhost() else self._ssh_client()
+        cached = self._facts
+        if cached is not None and cached[1] is client and cached[2] == self.sudo_needed:
+            return cached[0]
+
+        results = self.run_batch(hostFacts.COMMANDS)
+        facts = hostFacts.parse([r.out if r.success() else None for r in results])
+        if cached is not None and cached[0].boot_id != facts.boot_id:
+            logger.info(f"{self._hostname} rebooted since facts were last gathered")
+        self._facts = (facts, client, self.sudo_needed)
+        return facts
 
     def os_release(self) -> dict[str, str]:
-        d = {}
-        for e in self.read_file("/etc/os-release").split("\n"):
-            split_e = e.split("=", maxsplit=1)
-            if len(split_e) != 2:
-                continue
-            k, v = split_e
-            v = v.strip("\"'")
-            d[k] = v
-        return d
+        d = self.facts().os_release
+        if not d:
+            raise Exception("Error reading /etc/os-release")
+        return dict(d)
 
     def running_fcos(self) -> bool:
         d = self.os_release()
@@ -397,28 +951,47 @@ class Host:
 
             with open(fn, "w") as f:
                 f.write(contents)
-        else:
+            return
+
+        try:
+            if dir_path:
+                self.fs().makedirs(dir_path)
+            self.fs().write_text(fn, contents)
+        except PermissionError:
+            # Not writable by the login user, go through a temporary file
+            # and let "cp" (with sudo if needed) put it in place.
             self.run_or_die(f"mkdir -p {dir_path}")
-            with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                tmp_filename = tmp_file.name
-                tmp_file.write(contents.encode('utf-8'))
-            self.copy_to(tmp_filename, fn)
-            os.remove(tmp_filename)
+            tmp = f"/tmp/.cda-{uuid.uuid4().hex}"
+            self.fs().write_text(tmp, contents)
+            self.run_or_die(f"cp {tmp} {fn}")
+            self.remove(tmp)
 
     def read_file(self, file_name: str) -> str:
         if self.is_localhost():
             with open(file_name) as f:
                 return f.read()
-        else:
-            ret = self.run(f"cat {file_name}")
-            if ret.returncode == 0:
-                return ret.out
+        try:
+            return self.fs().read_text(file_name)
+        except PermissionError:
+            pass
+        except OSError:
             raise Exception(f"Error reading {file_name}")
+        ret = self.run(f"cat {file_name}")
+        if ret.returncode == 0:
+            return ret.out
+        raise Exception(f"Error reading {file_name}")
 
     def listdir(self, path: Optional[str] = None) -> list[str]:
         if self.is_localhost():
             return os.listdir(path)
         path = path if path is not None else ""
+        try:
+            # Same output as "ls".
+            return sorted(name for name in self.fs().listdir(path or ".") if not name.startswith("."))
+        except PermissionError:
+            pass
+        except OSError:
+            raise Exception(f"Error listing dir {path}")
         ret = self.run(f"ls {path}")
         if ret.returncode == 0:
             return ret.out.strip().split("\n")
@@ -428,15 +1001,19 @@ class Host:
         return self._hostname
 
     def home_dir(self, *path_components: str) -> str:
-        ret = self.run("bash -c 'echo -n ~'")
-        path = ret.out
-        if not ret.success() or not path or path[0] != "/":
+        path = self.facts().home_dir
+        if not path:
             raise RuntimeError("Failure getting home directory")
         if path_components:
             path = os.path.join(path, *path_components)
         return path
 
     def exists(self, path: str) -> bool:
+        if not self.is_localhost():
+            try:
+                return self.fs().exists(path)
+            except PermissionError:
+                pass
         return self.run(f"stat {path}", logging.DEBUG).returncode == 0
 
     def disk_usage(self, disk: str) -> tuple[int, int, int]:
@@ -453,59 +1030,27 @@ class HostWithCX(Host):
 
 
 class HostWithBF2(Host):
-    def connect_to_bf(self, bf_addr: str) -> None:
+    def connect_to_bf(self, bf_addr: str) -> Host:
+        # The BF is only reachable from the host, so connect to it through
+        # the host's SSH connection.
         self.ssh_connect("core")
-        prov_host = self._host
-        rsa_login = self._rsa_login()
-        if rsa_login is None:
-            logger.error("Missing login with key")
-            sys.exit(-1)
-        pkey = rsa_login._pkey
-
         logger.info(f"Connecting to BF through host {self._hostname}")
-
-        jumpbox_private_addr = '172.31.100.1'  # TODO
-
-        transport = prov_host.get_transport()
-        if transport is None:
-            return
-        src_addr = (jumpbox_private_addr, 22)
-        dest_addr = (bf_addr, 22)
-        chan = transport.open_channel("direct-tcpip", dest_addr, src_addr)
-
-        self._bf_host = paramiko.SSHClient()
-        self._bf_host.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self._bf_host.connect(bf_addr, username='core', pkey=pkey, sock=chan)
+        self._bf_host = Host(bf_addr, via=self)
+        self._bf_host.ssh_connect("core")
+        return self._bf_host
 
     def run_on_bf(self, cmd: str, log_level: int = logging.DEBUG) -> Result:
-        _, stdout, stderr = self._bf_host.exec_command(cmd)
+        return self._bf_host.run(cmd, log_level)
 
-        out = []
-        for line in iter(stdout.readline, ""):
-            logger.log(log_level, f"{self._hostname} -> BF: {line.strip()}")
-            out.append(line)
-
-        err: list[str] = []
-        for line in iter(stderr.readline, ""):
-            err.append(line)
-
-        exit_code = stdout.channel.recv_exit_status()
-        return Result("".join(out), "".join(err), exit_code)
-
-    def run_in_container(self, cmd: str, interactive: bool = False, verbose: bool = True, dry_run: bool = False) -> Result:
-        name = "dpu-tools"
-        it = "-it" if interactive else ""
-        v = "--verbose" if verbose else ""
-        d = "--dry-run" if dry_run else ""
-        full_command = f"sudo podman run {it} --rm --pull always --replace --pid host --network host --user 0 --name {name} --privileged -v /dev:/dev quay.io/bnemeth/bf --dpu-type bf {v} {d} {cmd}"
-        return self.run(full_command, logging.DEBUG)
+    def run_in_container(self, cmd: str, interactive: bool = False, verbose: bool = True, dry_run: bool = False, capture: CapturePolicy = KEEP_ALL) -> Result:
+        return self._run_dpu_tools(["--dpu-type", "bf"], cmd, interactive, verbose, dry_run, logging.DEBUG, capture)
 
     def bf_pxeboot(self, nfs_iso: str, nfs_key: str) -> Result:
         cmd = "sudo killall python3"
         self.run(cmd)
         logger.info("starting pxe server and booting bf")
         cmd = f"pxeboot {nfs_iso} -w {nfs_key}"
-        return self.run_in_container(cmd, True)
+        return self.run_in_container(cmd, True, capture=PXEBOOT_CAPTURE)
 
     def bf_firmware_upgrade(self) -> Result:
         logger.info("Upgrading BF firmware")
@@ -531,7 +1076,60 @@ class HostWithBF2(Host):
         return self.run_in_container("bfb")
 
 
-host_instances: dict[tuple[str, Optional[str]], Host] = {}
+_CONNECT_ERRORS = (ssh_exception.AuthenticationException, ssh_exception.NoValidConnectionsError, ssh_exception.SSHException, socket.error, socket.timeout, EOFError)
+
+# Backoff between ssh_connect_looped() attempts, in seconds.
+CONNECT_INITIAL_BACKOFF = 1.0
+CONNECT_MAX_BACKOFF = 30.0
+CONNECT_PROBE_TIMEOUT = 3.0
+
+
+def _port_open(hostname: str, port: int, timeout: float) -> bool:
+    try:
+        with socket.create_connection((hostname, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def _split_batch_output(output: str, marker: str) -> list[tuple[str, int]]:
+    # Each command's output is followed by "\n<marker> <index> <returncode>\n".
+    ret = []
+    pos = 0
+    for idx in itertools.count(0):
+        start = output.find(f"\n{marker} {idx} ", pos)
+        if start < 0:
+            break
+        end = output.find("\n", start + 1)
+        if end < 0:
+            break
+        returncode = int(output[start + 1 : end].split()[2])
+        ret.append((output[pos:start], returncode))
+        pos = end + 1
+    return ret
+
+
+host_instances: dict[tuple[str, Optional[str], Optional[str]], Host] = {}
+
+# Maps a Host class to the class to instantiate instead (e.g. to record or
+# replay everything done on hosts, see hostReplay.py). None means real hosts.
+_backend: Optional[Callable[[type[Host]], type[Host]]] = None
+
+
+def set_backend(backend: Optional[Callable[[type[Host]], type[Host]]]) -> None:
+    global _backend
+    _backend = backend
+    # Hosts created with the previous backend must not be reused.
+    host_instances.clear()
+
+
+def stop_dpu_tools() -> None:
+    # Removes the dpu-tools sidecars started during the run.
+    for h in list(host_instances.values()):
+        try:
+            h.stop_dpu_tools()
+        except Exception as e:
+            logger.info(f"Failed to stop dpu-tools on {h.hostname()}: {e}")
 
 
 def sync_time(src: Host, dst: Host) -> Result:
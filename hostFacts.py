@@ -0,0 +1,58 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class HostFacts:
+    """
+    Facts about a host that don't change while it's up. Gathered in one
+    round trip (see Host.facts()). Facts that couldn't be gathered are
+    empty / 0.
+    """
+
+    boot_id: str = ""
+    os_release: dict[str, str] = field(default_factory=dict)
+    home_dir: str = ""
+    nproc: int = 0
+    arch: str = ""
+    kernel: str = ""
+    fqdn: str = ""
+
+
+# Commands to gather the facts, in the order expected by parse().
+COMMANDS = [
+    "cat /proc/sys/kernel/random/boot_id",
+    "cat /etc/os-release",
+    "bash -c 'echo -n ~'",
+    "nproc",
+    "uname -m",
+    "uname -r",
+    "hostname -f",
+]
+
+
+def parse_os_release(contents: str) -> dict[str, str]:
+    d = {}
+    for e in contents.split("\n"):
+        split_e = e.split("=", maxsplit=1)
+        if len(split_e) != 2:
+            continue
+        k, v = split_e
+        v = v.strip("\"'")
+        d[k] = v
+    return d
+
+
+def parse(outputs: list[Optional[str]]) -> HostFacts:
+    # "outputs" holds the output of each of COMMANDS, or None if it failed.
+    outputs = outputs + [None] * (len(COMMANDS) - len(outputs))
+    boot_id, os_release, home_dir, nproc, arch, kernel, fqdn = (o or "" for o in outputs)
+    return HostFacts(
+        boot_id=boot_id.strip(),
+        os_release=parse_os_release(os_release),
+        home_dir=home_dir if home_dir.startswith("/") else "",
+        nproc=int(nproc) if nproc.strip().isdigit() else 0,
+        arch=arch.strip(),
+        kernel=kernel.strip(),
+        fqdn=fqdn.strip(),
+    )
@@ -0,0 +1,299 @@
+import collections
+import dataclasses
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, TypeVar
+import host
+from hostFacts import HostFacts
+from logger import logger
+
+
+"""
+Record/replay backend for host.Host.
+
+While recording, every operation done through a Host (commands, file
+operations, connects, BMC calls) is executed for real and appended to a
+transcript (JSON lines) with its result and timing. While replaying, the
+same operations return the recorded results after sleeping for the
+recorded duration (scaled by "latency_scale"), without any network access.
+This allows benchmarking the orchestration code (CPU time, number of
+operations, wall clock) offline and deterministically.
+
+Only what goes through Host is recorded; the Assisted Installer and k8s API
+clients are not.
+"""
+
+# Operations that are recorded. Nested calls (e.g. run_or_die -> run, or
+# home_dir -> facts -> run_batch) only record the outermost one.
+RECORDED_METHODS = [
+    "ssh_connect",
+    "ping",
+    "wait_ping",
+    "run",
+    "run_batch",
+    "facts",
+    "read_file",
+    "write",
+    "exists",
+    "listdir",
+    "remove",
+    "copy_to",
+    "copy_from",
+    "boot_iso_redfish",
+    "stop",
+    "start",
+    "cold_boot",
+    "close",
+    "connect_to_bf",
+    "run_on_bf",
+]
+
+_MISSING_DEFAULTS: dict[str, Callable[[tuple[Any, ...]], Any]] = {
+    "ping": lambda args: True,
+    "run": lambda args: host.Result.result_success(),
+    "run_on_bf": lambda args: host.Result.result_success(),
+    "run_batch": lambda args: [host.Result.result_success() for _ in args[0]],
+    "facts": lambda args: HostFacts(),
+    "read_file": lambda args: "",
+    "exists": lambda args: False,
+    "listdir": lambda args: [],
+}
+
+T = TypeVar("T")
+_local = threading.local()
+
+
+def _encode(v: Any) -> Any:
+    if isinstance(v, host.Result):
+        return {"__result__": [v.out, v.err, v.returncode]}
+    if isinstance(v, HostFacts):
+        return {"__facts__": dataclasses.asdict(v)}
+    if isinstance(v, tuple):
+        return {"__tuple__": [_encode(x) for x in v]}
+    if isinstance(v, list):
+        return [_encode(x) for x in v]
+    if isinstance(v, dict):
+        return {"__dict__": {k: _encode(x) for k, x in v.items()}}
+    return v
+
+
+def _decode(v: Any) -> Any:
+    if isinstance(v, list):
+        return [_decode(x) for x in v]
+    if isinstance(v, dict):
+        if "__result__" in v:
+            return host.Result(*v["__result__"])
+        if "__facts__" in v:
+            return HostFacts(**v["__facts__"])
+        if "__tuple__" in v:
+            return tuple(_decode(x) for x in v["__tuple__"])
+        if "__dict__" in v:
+            return {k: _decode(x) for k, x in v["__dict__"].items()}
+    return v
+
+
+def _key(args: tuple[Any, ...], kwargs: dict[str, Any]) -> str:
+    # Operations are matched on their first argument (the command, path,
+    # user name, ...). Other arguments (log levels, callbacks) don't change
+    # the result.
+    first = args[0] if args else next(iter(kwargs.values()), None)
+    return json.dumps(first if isinstance(first, (str, int, float, bool, list, type(None))) else None)
+
+
+def _outermost(call: Callable[[], T], on_done: Callable[[float, T], None]) -> T:
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    try:
+        start = time.monotonic()
+        ret = call()
+        if depth == 0:
+            on_done(time.monotonic() - start, ret)
+        return ret
+    finally:
+        _local.depth = depth
+
+
+@dataclass
+class Entry:
+    host: str
+    method: str
+    key: str
+    start: float
+    duration: float
+    value: Any
+
+
+class Recorder:
+    def __init__(self, path: str):
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+
+    def add(self, h: host.Host, method: str, key: str, duration: float, value: Any) -> None:
+        entry = Entry(h.hostname(), method, key, time.monotonic() - duration - self._t0, duration, _encode(value))
+        with self._lock:
+            self._file.write(json.dumps(dataclasses.asdict(entry)) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def backend(self, cls: type[host.Host]) -> type[host.Host]:
+        recorder = self
+
+        def recorded(method: str) -> Callable[..., Any]:
+            real = getattr(cls, method)
+
+            def wrapper(self: host.Host, *args: Any, **kwargs: Any) -> Any:
+                return _outermost(lambda: real(self, *args, **kwargs), lambda duration, ret: recorder.add(self, method, _key(args, kwargs), duration, ret))
+
+            return wrapper
+
+        def stream(self: host.Host, cmd: str, *, on_line: Optional[Callable[[str, str], None]] = None, **kwargs: Any) -> host.CommandStream:
+            real = cls.stream(self, cmd, **kwargs)
+            start = time.monotonic()
+
+            def reader(cancelled: threading.Event) -> host._Reader:
+                chunks = []
+                for chunk in real:
+                    chunks.append([chunk.stream, chunk.data])
+                    yield chunk.stream, chunk.data.encode("utf-8")
+                    if cancelled.is_set():
+                        real.cancel()
+                assert real.returncode is not None
+                recorder.add(self, "stream", _key((cmd,), {}), time.monotonic() - start, {"chunks": chunks, "returncode": real.returncode})
+                return real.returncode
+
+            return host.CommandStream(reader, on_line=on_line)
+
+        methods: dict[str, Any] = {m: recorded(m) for m in RECORDED_METHODS if hasattr(cls, m)}
+        methods["stream"] = stream
+        methods["intercepted"] = True
+        return type(f"Recording{cls.__name__}", (cls,), methods)
+
+
+@dataclass
+class ReplayStats:
+    operations: collections.Counter[str] = field(default_factory=collections.Counter)
+    misses: int = 0
+    simulated_latency: float = 0
+    cpu_time: float = 0
+    wall_time: float = 0
+
+    def __str__(self) -> str:
+        ops = sum(self.operations.values())
+        return f"{ops} host operations ({dict(self.operations)}), {self.misses} not in transcript, wall {self.wall_time:.2f}s (simulated latency {self.simulated_latency:.2f}s), cpu {self.cpu_time:.2f}s"
+
+
+class Replayer:
+    """
+    Replays a transcript. Operations are matched by host, method and first
+    argument, in the recorded order. When an operation is done more often
+    than recorded (e.g. polling), the last recorded result is repeated.
+    Operations that were never recorded fail with "strict", otherwise they
+    return a neutral result (successful command, empty file, ...).
+    """
+
+    def __init__(self, path: str, *, latency_scale: float = 1.0, strict: bool = False):
+        self._latency_scale = latency_scale
+        self._strict = strict
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str, str], collections.deque[Entry]] = collections.defaultdict(collections.deque)
+        self._last: dict[tuple[str, str, str], Entry] = {}
+        self.stats = ReplayStats()
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    e = Entry(**json.loads(line))
+                    self._entries[(e.host, e.method, e.key)].append(e)
+
+    def _lookup(self, h: host.Host, method: str, key: str) -> Optional[Entry]:
+        k = (h.hostname(), method, key)
+        with self._lock:
+            self.stats.operations[method] += 1
+            queue = self._entries.get(k)
+            if queue:
+                self._last[k] = queue.popleft()
+                return self._last[k]
+            if k in self._last:
+                return self._last[k]
+            self.stats.misses += 1
+        if self._strict:
+            raise KeyError(f"{method} {key} on {h.hostname()} not in transcript")
+        logger.debug(f"replay: {method} {key} on {h.hostname()} not in transcript")
+        return None
+
+    def _sleep(self, entry: Entry) -> None:
+        latency = entry.duration * self._latency_scale
+        with self._lock:
+            self.stats.simulated_latency += latency
+        time.sleep(latency)
+
+    def backend(self, cls: type[host.Host]) -> type[host.Host]:
+        replayer = self
+
+        def replayed(method: str) -> Callable[..., Any]:
+            def wrapper(self: host.Host, *args: Any, **kwargs: Any) -> Any:
+                entry = replayer._lookup(self, method, _key(args, kwargs))
+                if entry is None:
+                    default = _MISSING_DEFAULTS.get(method)
+                    return default(args) if default is not None else None
+                replayer._sleep(entry)
+                return _decode(entry.value)
+
+            return wrapper
+
+        def stream(self: host.Host, cmd: str, *, on_line: Optional[Callable[[str, str], None]] = None, **kwargs: Any) -> host.CommandStream:
+            entry = replayer._lookup(self, "stream", _key((cmd,), {}))
+
+            def reader(cancelled: threading.Event) -> host._Reader:
+                if entry is None:
+                    return 0
+                replayer._sleep(entry)
+                value = _decode(entry.value)
+                for stream, data in value["chunks"]:
+                    yield stream, data.encode("utf-8")
+                return int(value["returncode"])
+
+            return host.CommandStream(reader, on_line=on_line)
+
+        methods: dict[str, Any] = {m: replayed(m) for m in RECORDED_METHODS if hasattr(cls, m)}
+        methods["stream"] = stream
+        methods["intercepted"] = True
+        return type(f"Replaying{cls.__name__}", (cls,), methods)
+
+    def benchmark(self, func: Callable[[], T]) -> T:
+        # Runs "func" and adds its CPU and wall clock time to the stats.
+        cpu = time.process_time()
+        wall = time.monotonic()
+        try:
+            return func()
+        finally:
+            self.stats.cpu_time += time.process_time() - cpu
+            self.stats.wall_time += time.monotonic() - wall
+
+
+def record(path: str) -> Recorder:
+    recorder = Recorder(path)
+    host.set_backend(recorder.backend)
+    return recorder
+
+
+def replay(path: str, *, latency_scale: float = 1.0, strict: bool = False) -> Replayer:
+    replayer = Replayer(path, latency_scale=latency_scale, strict=strict)
+    host.set_backend(replayer.backend)
+    return replayer
+
+
+def stop() -> None:
+    host.set_backend(None)
+
+
+def iter_transcript(path: str) -> Iterator[Entry]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield Entry(**json.loads(line))
@@ -13,9 +13,8 @@ class ImageRegistry:
     def __init__(self, rsh: host.Host, listen_port: int = 5000) -> None:
         self.rsh = rsh
 
-        ret = self.rsh.run("hostname -f")
-        h = ret.out.strip().lower()
-        if not ret.success() or not h:
+        h = self.rsh.facts().fqdn.lower()
+        if not h:
             raise RuntimeError("Failure to get hostname")
         self.hostname = h
         self.listen_port = listen_port
@@ -53,10 +52,7 @@ class ImageRegistry:
         dir_name_data = os.path.join(dir_name, "data")
         dir_name_auth = os.path.join(dir_name, "auth")
 
-        self.rsh.run(shlex.join(["mkdir", "-p", dir_name]))
-        self.rsh.run(shlex.join(["mkdir", "-p", dir_name_certs]))
-        self.rsh.run(shlex.join(["mkdir", "-p", dir_name_data]))
-        self.rsh.run(shlex.join(["mkdir", "-p", dir_name_auth]))
+        self.rsh.run_batch([shlex.join(["mkdir", "-p", d]) for d in (dir_name, dir_name_certs, dir_name_data, dir_name_auth)])
 
         self.rsh.run_or_die(
             shlex.join(
@@ -68,21 +68,18 @@ class IPUClusterNode(ClusterNode):
         logger.info("Waiting for ACC to come up")
         failures = 0
         while True:
-            if acc.ping():
+            if acc.ping(timeout=timeout):
                 logger.info("ACC responded to ping, connecting")
                 break
-            time.sleep(20)
-            timeout -= 20
-            if timeout <= 0:
-                failures += 1
-                if failures == 5:
-                    logger.error_and_exit("Too many failures trying to get ACC up")
-                logger.info("ACC has not responded in a reasonable amount of time, rebooting IMC")
-                assert self.config.bmc is not None
-                imc = host.RemoteHost(self.config.bmc.url)
-                imc.ssh_connect(self.config.bmc.user, self.config.bmc.password)
-                imc.run("reboot")
-                timeout = 240
+            failures += 1
+            if failures == 5:
+                logger.error_and_exit("Too many failures trying to get ACC up")
+            logger.info("ACC has not responded in a reasonable amount of time, rebooting IMC")
+            assert self.config.bmc is not None
+            imc = host.RemoteHost(self.config.bmc.url)
+            imc.ssh_connect(self.config.bmc.user, self.config.bmc.password)
+            imc.run("reboot")
+            timeout = 240
 
         acc.ssh_connect("root", "redhat")
         logger.info(acc.run("uname -a"))
@@ -1,12 +1,26 @@
+import copy
+import threading
 import kubernetes
 import yaml
 import time
 import host
 import sys
-from typing import Optional
+from typing import Any, Optional
 from typing import Callable
 from logger import logger
 from common import calculate_elapsed_time
+from k8sInformer import Informer
+
+
+def node_ready(node: Any) -> bool:
+    for con in node.status.conditions or []:
+        if con.type == "Ready":
+            return str(con.status) == "True"
+    return False
+
+
+def csr_pending(csr: Any) -> bool:
+    return not (csr.status and csr.status.conditions)
 
 
 class K8sClient:
@@ -15,37 +29,53 @@ class K8sClient:
         c = yaml.safe_load(host.read_file(kubeconfig))
         self._api_client = kubernetes.config.new_client_from_config_dict(c)
         self._client = kubernetes.client.CoreV1Api(self._api_client)
+        self._certs_api = kubernetes.client.CertificatesV1Api(self._api_client)
         self._host = host
+        self._lock = threading.Lock()
+        self._nodes: Optional[Informer] = None
+        self._csr_approver: Optional[Informer] = None
         self._ensure_oc_installed()
 
     def _ensure_oc_installed(self) -> None:
         if self._host.run("which oc").returncode == 0:
             return
-        uname = self._host.run_or_die("uname -m").out.strip()
+        uname = self._host.facts().arch
         url = f"https://mirror.openshift.com/pub/openshift-v4/{uname}/clients/ocp/stable/openshift-client-linux.tar.gz"
         self._host.run_or_die(f"curl -L {url} -o /tmp/openshift-client-linux.tar.gz")
         self._host.run_or_die("sudo tar -U -C /usr/local/bin -xzf /tmp/openshift-client-linux.tar.gz")
 
+    def nodes(self) -> Informer:
+        # Watched nodes, shared by everybody checking or waiting for readiness.
+        with self._lock:
+            if self._nodes is None:
+                self._nodes = Informer("node", self._client.list_node).start()
+            return self._nodes
+
     def is_ready(self, name: str) -> bool:
-        for e in self._client.list_node().items:
-            for con in e.status.conditions:
-                if con.type == "Ready":
-                    if name == e.metadata.name:
-                        return str(con.status) == "True"
-        return False
+        node = self.nodes().get(name)
+        return node is not None and node_ready(node)
+
+    def ready_nodes(self, names: list[str]) -> list[str]:
+        return [n for n in names if self.is_ready(n)]
+
+    def wait_nodes_ready(self, names: list[str], count: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        # Waits until at least "count" (default: all) of the nodes are Ready,
+        # woken up by the node watch. Returns False on timeout.
+        count = len(names) if count is None else count
+
+        def enough_ready(nodes: dict[str, Any]) -> bool:
+            return sum(n in nodes and node_ready(nodes[n]) for n in names) >= count
+
+        return self.nodes().wait(enough_ready, timeout)
 
     def get_nodes(self) -> list[str]:
         return [e.metadata.name for e in self._client.list_node().items]
 
     def wait_ready(self, name: str, cb: Callable[[], None] = lambda: None) -> None:
         logger.info(f"waiting for {name} to be ready")
-        while True:
-            if self.is_ready(name):
-                break
-            else:
-                time.sleep(1)
+        self.start_csr_approver()
+        while not self.wait_nodes_ready([name], timeout=1):
             cb()
-            self.approve_csr()
 
     def wait_ready_all(self, cb: Callable[[], None] = lambda: None) -> None:
         for n in self.get_nodes():
@@ -56,10 +86,35 @@ class K8sClient:
         self.oc(f"delete node {node}")
 
     def approve_csr(self) -> None:
-        certs_api = kubernetes.client.CertificatesV1Api(self._api_client)
-        for e in certs_api.list_certificate_signing_request().items:
-            if e.status.conditions is None:
-                self.oc(f"adm certificate approve {e.metadata.name}")
+        for e in self._certs_api.list_certificate_signing_request().items:
+            if csr_pending(e):
+                self._approve(e)
+
+    def start_csr_approver(self) -> None:
+        # Approves every pending CSR as soon as it's created, until the end.
+        with self._lock:
+            if self._csr_approver is None:
+                self._csr_approver = Informer("csr", self._certs_api.list_certificate_signing_request, self._on_csr).start()
+
+    def _on_csr(self, type: str, csr: Any) -> None:
+        if type != "DELETED" and csr_pending(csr):
+            self._approve(csr)
+
+    def _approve(self, csr: Any) -> None:
+        # Like "oc adm certificate approve", through the API.
+        name = csr.metadata.name
+        approved = copy.deepcopy(csr)
+        if approved.status is None:
+            approved.status = kubernetes.client.V1CertificateSigningRequestStatus()
+        condition = kubernetes.client.V1CertificateSigningRequestCondition(type="Approved", status="True", reason="CdaApprove", message="Approved by cluster-deployment-automation")
+        approved.status.conditions = [condition]
+        try:
+            self._certs_api.replace_certificate_signing_request_approval(name, approved)
+            logger.info(f"Approved CSR {name}")
+        except kubernetes.client.exceptions.ApiException as e:
+            # E.g. approved concurrently, the next event has the new version.
+            # Otherwise approve_csr() tries again.
+            logger.info(f"Failed to approve CSR {name}: {e.reason}")
 
     def get_ip(self, name: str) -> Optional[str]:
         for e in self._client.list_node().items:
@@ -0,0 +1,126 @@
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+import kubernetes
+from logger import logger
+
+
+# Seconds a watch runs before it's restarted (from where it stopped).
+WATCH_TIMEOUT = 300
+# Seconds to wait before listing again after a failed watch.
+RELIST_DELAY = 5.0
+# Seconds after start() for the first list to succeed, get() and wait() raise
+# its error after that.
+SYNC_TIMEOUT = 300.0
+
+Watch = Callable[[Callable[..., Any], str, int], Iterator[dict[str, Any]]]
+
+
+def _watch(list_func: Callable[..., Any], resource_version: str, timeout: int) -> Iterator[dict[str, Any]]:
+    return kubernetes.watch.Watch().stream(list_func, resource_version=resource_version, timeout_seconds=timeout)  # type: ignore
+
+
+class Informer:
+    """
+    In-memory copy of the objects of one kind (e.g. nodes), by name: lists
+    them once and then follows a watch from there, listing again when the
+    watch fails (e.g. the resource version expired).
+
+    "on_event" is called with the event type ("ADDED", "MODIFIED",
+    "DELETED") and the object for every change, and for every object after
+    listing. wait() blocks until a condition on the objects holds and is
+    woken up on every change, instead of listing all objects in a loop.
+    Both raise the list error if the first list didn't succeed within
+    SYNC_TIMEOUT seconds.
+    """
+
+    def __init__(self, kind: str, list_func: Callable[..., Any], on_event: Callable[[str, Any], None] = lambda type, obj: None, watch: Watch = _watch):
+        self._kind = kind
+        self._list_func = list_func
+        self._on_event = on_event
+        self._watch = watch
+        self._cond = threading.Condition()
+        self._objects: dict[str, Any] = {}
+        self._synced = False
+        self._error: Optional[Exception] = None
+        self._sync_deadline = 0.0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "Informer":
+        with self._cond:
+            if self._thread is None:
+                self._sync_deadline = time.monotonic() + SYNC_TIMEOUT
+                self._thread = threading.Thread(target=self._run, name=f"informer-{self._kind}", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        # The thread exits after the next event or watch timeout.
+        self._stopped.set()
+
+    def _run(self) -> None:
+        resource_version: Optional[str] = None
+        while not self._stopped.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._list()
+                resource_version = self._follow(resource_version)
+            except Exception as e:
+                if resource_version is None:
+                    logger.warning(f"Listing {self._kind}s failed: {e}, retrying")
+                else:
+                    logger.debug(f"Watching {self._kind}s failed: {e}, listing again")
+                with self._cond:
+                    self._error = e
+                resource_version = None
+                self._stopped.wait(RELIST_DELAY)
+
+    def _list(self) -> str:
+        ret = self._list_func()
+        objects = {o.metadata.name: o for o in ret.items}
+        with self._cond:
+            self._objects = objects
+            self._synced = True
+            self._cond.notify_all()
+        for o in objects.values():
+            self._on_event("ADDED", o)
+        return str(ret.metadata.resource_version)
+
+    def _follow(self, resource_version: str) -> str:
+        # Returns the resource version to continue from once the watch ends.
+        for event in self._watch(self._list_func, resource_version, WATCH_TIMEOUT):
+            if self._stopped.is_set():
+                break
+            type, obj = event["type"], event["object"]
+            if type == "ERROR":
+                raise RuntimeError(f"watch error {obj}")
+            if type == "BOOKMARK":
+                resource_version = obj.metadata.resource_version
+                continue
+            with self._cond:
+                if type == "DELETED":
+                    self._objects.pop(obj.metadata.name, None)
+                else:
+                    self._objects[obj.metadata.name] = obj
+                self._cond.notify_all()
+            resource_version = obj.metadata.resource_version
+            self._on_event(type, obj)
+        return resource_version
+
+    def _wait_synced(self) -> None:
+        # Called with the lock held.
+        if not self._cond.wait_for(lambda: self._synced, max(self._sync_deadline - time.monotonic(), 0)):
+            raise RuntimeError(f"Couldn't list {self._kind}s in {SYNC_TIMEOUT:.0f}s: {self._error}") from self._error
+
+    def get(self, name: str) -> Optional[Any]:
+        with self._cond:
+            self._wait_synced()
+            return self._objects.get(name)
+
+    def wait(self, condition: Callable[[dict[str, Any]], bool], timeout: Optional[float] = None) -> bool:
+        # Waits for the first list (see SYNC_TIMEOUT) and for "condition" to
+        # hold. Returns False on timeout.
+        with self._cond:
+            self._wait_synced()
+            return self._cond.wait_for(lambda: condition(self._objects), timeout)
@@ -28,8 +28,7 @@ class Libvirt:
         if not self._service_is_active("virtqemud.service"):
             self.hostconn.run_or_die("systemctl start virtqemud.service")
 
-        for service in MODULAR_SERVICES:
-            self._enable_modular(service)
+        self._enable_modular(MODULAR_SERVICES)
 
     def restart(self, service: Optional[str] = None) -> None:
         if service is not None:
@@ -48,22 +47,47 @@ class Libvirt:
             self.hostconn.run_or_die("systemctl disable libvirtd.service")
             self._run_per_suffix("systemctl disable", "libvirtd", MONOLITHIC_SOCKET_SUFFIXES)
 
-    def _enable_modular(self, service: str) -> None:
-        if not self._service_is_enabled(f"virt{service}d.service"):
-            self.hostconn.run_or_die(f"systemctl enable virt{service}d.service")
+    def _enable_modular(self, services: list[str]) -> None:
+        # Query the state of all units in one go, then enable/start the ones
+        # that need it in one go.
+        units = []
+        for service in services:
+            units.append(f"virt{service}d.service")
+            units.extend(f"virt{service}d{suffix}" for suffix in MODULAR_SOCKET_SUFFIXES)
+        enabled, active = self._service_states(units)
+
+        cmds = []
+        for service in services:
+            if not enabled[f"virt{service}d.service"]:
+                cmds.append(f"systemctl enable virt{service}d.service")
+
+            for suffix in MODULAR_SOCKET_SUFFIXES:
+                socket_service = f"virt{service}d{suffix}"
 
-        for suffix in MODULAR_SOCKET_SUFFIXES:
-            socket_service = f"virt{service}d{suffix}"
+                if not enabled[socket_service]:
+                    cmds.append(f"systemctl enable {socket_service}")
 
-            if not self._service_is_enabled(socket_service):
-                self.hostconn.run_or_die(f"systemctl enable {socket_service}")
+                if not active[socket_service]:
+                    cmds.append(f"systemctl start {socket_service}")
 
-            if not self._service_is_active(socket_service):
-                self.hostconn.run_or_die(f"systemctl start {socket_service}")
+        self._run_batch_or_die(cmds)
 
     def _run_per_suffix(self, cmd: str, service: str, suffixes: list[str]) -> None:
-        for suffix in suffixes:
-            self.hostconn.run_or_die(f"{cmd} {service}{suffix}")
+        self._run_batch_or_die([f"{cmd} {service}{suffix}" for suffix in suffixes])
+
+    def _run_batch_or_die(self, cmds: list[str]) -> None:
+        results = self.hostconn.run_batch(cmds, stop_on_error=True)
+        for cmd, ret in zip(cmds, results):
+            if not ret.success():
+                logger.error_and_exit(f"{cmd} failed: {ret.err}")
+        if len(results) < len(cmds):
+            logger.error_and_exit(f"{cmds[len(results)]} wasn't run, the batch was cut short")
+
+    def _service_states(self, units: list[str]) -> tuple[dict[str, bool], dict[str, bool]]:
+        ret = self.hostconn.run_batch([f"systemctl is-enabled {u}" for u in units] + [f"systemctl is-active {u}" for u in units])
+        enabled = {u: r.out.strip() == "enabled" for u, r in zip(units, ret[: len(units)])}
+        active = {u: r.out.strip() == "active" for u, r in zip(units, ret[len(units) :])}
+        return enabled, active
 
     def _service_is_active(self, service: str) -> bool:
         return self.hostconn.run(f"systemctl is-active {service}").out.strip() == "active"
@@ -159,8 +159,7 @@ def wait_for_build_to_finish(h: host.Host, build_id_two: Optional[str] = None) -
 # generates an iso file that builds microshift
 def iso_builder(h: host.Host, name_of_final_iso: str, secrets_path: str, version: str) -> None:
     rhel_number = '9'
-    cmd = "uname -m"
-    uname_m = h.run(cmd).out.strip()
+    uname_m = h.facts().arch
 
     cleanup_microshift(h, version)
     generate_kickstart(rhel_number, uname_m, secrets_path)
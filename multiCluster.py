@@ -0,0 +1,117 @@
+import ipaddress
+import threading
+from collections import Counter
+from typing import Callable
+from clustersConfig import BridgeConfig, ClustersConfig
+import common
+from logger import logger
+
+
+"""
+Deploying several clusters in one run, each in its own thread.
+
+The clusters share the Assisted Installer, the local "default" network (one
+bridge and DHCP server for all of them) and the hosts' CPUs, disks and
+BMCs. Everything else is already kept apart by cluster name (infraenv,
+ISOs, journal, kubeconfig, dnsmasq configuration), so validate() only has
+to make sure that the clusters don't step on each other's names and IPs.
+
+The shared network is never destroyed or restarted (see BridgeConfig.shared),
+and the clusters are all torn down before any of them creates its nodes
+(see Barrier), since tearing down unlinks the hosts from the network.
+"""
+
+
+def _duplicates(values: list[str]) -> list[str]:
+    return sorted(v for v, n in Counter(values).items() if n > 1)
+
+
+def validate(ccs: list[ClustersConfig]) -> None:
+    errors = []
+
+    def check(what: str, values: list[str]) -> None:
+        dups = _duplicates(values)
+        if dups:
+            errors.append(f"{what} used by more than one cluster: {', '.join(dups)}")
+
+    check("Cluster names", [cc.name for cc in ccs])
+    check("Kubeconfigs", [cc.kubeconfig for cc in ccs])
+    check("Node names", [n.name for cc in ccs for n in cc.all_nodes()])
+    check("MAC addresses", [n.mac for cc in ccs for n in cc.all_nodes()])
+    check("BMCs", [n.bmc.url for cc in ccs for n in cc.all_nodes() if n.bmc is not None])
+
+    ips = [n.ip for cc in ccs for n in cc.all_nodes() if n.ip is not None]
+    ips += [vip["ip"] for cc in ccs if not cc.is_sno() for vip in (cc.api_vip, cc.ingress_vip)]
+    check("IPs", ips)
+
+    # All clusters are served by the same bridge.
+    ranges = {(cc.fullConfig["ip_range"], cc.fullConfig["ip_mask"]) for cc in ccs}
+    if len(ranges) > 1:
+        errors.append(f"Clusters deployed together need the same ip_range and ip_mask, got {sorted(ranges)}")
+
+    # The local Assisted Installer is set up with a single release.
+    versions = {cc.version for cc in ccs}
+    if len(versions) > 1:
+        errors.append(f"Clusters deployed together need the same version, got {', '.join(sorted(versions))}")
+
+    for e in errors:
+        logger.error(e)
+    if errors:
+        logger.error_and_exit(f"Can't deploy clusters {', '.join(cc.name for cc in ccs)} together")
+
+
+def shared_bridge(ccs: list[ClustersConfig]) -> BridgeConfig:
+    # Each cluster reserved the IPs for its nodes at the start of the (same)
+    # ip_range, the dynamic range starts after the largest reservation.
+    full_ip_range = ccs[0].full_ip_range
+    reserved_end = max((cc.ip_range[1] for cc in ccs), key=ipaddress.IPv4Address)
+    dynamic_ip_range = common.ip_range(reserved_end, common.ip_range_size((reserved_end, full_ip_range[1])))
+    return BridgeConfig(ip=full_ip_range[0], mask=ccs[0].local_bridge_config.mask, dynamic_ip_range=dynamic_ip_range, shared=True)
+
+
+class Barrier:
+    """
+    Lets the clusters wait until all of them reached a point, e.g. are torn
+    down. Unlike threading.Barrier, a cluster that failed before reaching it
+    (and called arrive() on its way out) doesn't keep the others waiting.
+    """
+
+    def __init__(self, names: list[str]):
+        self._pending = set(names)
+        self._cond = threading.Condition()
+
+    def arrive(self, name: str) -> None:
+        with self._cond:
+            self._pending.discard(name)
+            self._cond.notify_all()
+
+    def wait(self) -> None:
+        with self._cond:
+            if self._pending:
+                logger.info(f"Waiting for clusters {', '.join(sorted(self._pending))} to be torn down")
+            self._cond.wait_for(lambda: not self._pending)
+
+
+def run(ccs: list[ClustersConfig], func: Callable[[ClustersConfig], None]) -> None:
+    # Runs "func" for all clusters at once. A failing cluster (including one
+    # that exits through logger.error_and_exit()) doesn't stop the others.
+    failures: dict[str, BaseException] = {}
+    lock = threading.Lock()
+
+    def run_one(cc: ClustersConfig) -> None:
+        try:
+            func(cc)
+        except BaseException as e:
+            logger.error(f"Cluster {cc.name} failed: {e!r}")
+            with lock:
+                failures[cc.name] = e
+
+    threads = [threading.Thread(target=run_one, args=(cc,), name=f"cluster-{cc.name}") for cc in ccs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if failures:
+        logger.error_and_exit(f"Failed clusters: {', '.join(sorted(failures))}, succeeded: {', '.join(cc.name for cc in ccs if cc.name not in failures) or 'none'}")
+    logger.info(f"Clusters {', '.join(cc.name for cc in ccs)} done")
@@ -0,0 +1,104 @@
+import collections
+import gzip
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import IO, Optional
+
+
+@dataclass(frozen=True)
+class CapturePolicy:
+    """
+    How much of a command's output Host.run() keeps in memory.
+
+    With "max_chars", only the first and last max_chars / 2 characters of
+    stdout and stderr are kept and the middle is replaced by a marker. With
+    "spill_dir", the complete output is also written to gzip'ed files under
+    spill_dir/<hostname>/, see Result.full_out() / full_err().
+
+    The default keeps everything, like before.
+    """
+
+    max_chars: int = 0
+    spill_dir: Optional[str] = None
+
+
+KEEP_ALL = CapturePolicy()
+
+_spill_counter = itertools.count()
+
+
+class StreamCapture:
+    # Head and tail of one output stream, with an optional spill file.
+
+    def __init__(self, max_chars: int, spill_path: Optional[str] = None):
+        self._head_size = max_chars // 2 if max_chars else -1
+        self._tail_size = max_chars - self._head_size if max_chars else 0
+        self._head: list[str] = []
+        self._head_len = 0
+        self._tail: collections.deque[str] = collections.deque()
+        self._tail_len = 0
+        self.dropped = 0
+        self.spill_path = spill_path
+        self._spill: Optional[IO[str]] = None
+        if spill_path is not None:
+            os.makedirs(os.path.dirname(spill_path), exist_ok=True)
+            self._spill = gzip.open(spill_path, "wt", encoding="utf-8")
+
+    def feed(self, text: str) -> None:
+        if self._spill is not None:
+            self._spill.write(text)
+        if self._head_size < 0:
+            self._head.append(text)
+            return
+        if self._head_len < self._head_size:
+            part = text[: self._head_size - self._head_len]
+            self._head.append(part)
+            self._head_len += len(part)
+            text = text[len(part) :]
+        if not text:
+            return
+        self._tail.append(text)
+        self._tail_len += len(text)
+        while self._tail_len > self._tail_size:
+            excess = self._tail_len - self._tail_size
+            if len(self._tail[0]) <= excess:
+                self._tail_len -= len(self._tail[0])
+                self.dropped += len(self._tail.popleft())
+            else:
+                self._tail[0] = self._tail[0][excess:]
+                self._tail_len -= excess
+                self.dropped += excess
+
+    def text(self) -> str:
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if not self.dropped:
+            return head + tail
+        spill = f", full output in {self.spill_path}" if self.spill_path else ""
+        return f"{head}\n[... {self.dropped} characters dropped{spill} ...]\n{tail}"
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+class OutputCapture:
+    def __init__(self, policy: CapturePolicy, hostname: str):
+        out_path = err_path = None
+        if policy.spill_dir is not None:
+            base = os.path.join(policy.spill_dir, hostname, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_spill_counter)}")
+            out_path, err_path = f"{base}.out.gz", f"{base}.err.gz"
+        self.out = StreamCapture(policy.max_chars, out_path)
+        self.err = StreamCapture(policy.max_chars, err_path)
+
+    def close(self) -> None:
+        self.out.close()
+        self.err.close()
+
+
+def read_spill(path: str) -> str:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,231 @@
+import errno
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from logger import logger
+
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+SSH_PORT = 22
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    s: int = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
+
+
+def _echo_request(ident: int, seq: int) -> bytes:
+    payload = b"cda-reachability"
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = _checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+
+def _open_icmp_socket() -> tuple[Optional[socket.socket], bool]:
+    # Unprivileged ICMP ("ping") sockets need net.ipv4.ping_group_range to
+    # include our group. Raw sockets need CAP_NET_RAW. If neither works, we
+    # only do TCP probes. Returns the socket and whether it's a raw one.
+    for kind, raw in ((socket.SOCK_DGRAM, False), (socket.SOCK_RAW, True)):
+        try:
+            s = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+        except OSError:
+            continue
+        s.setblocking(False)
+        return s, raw
+    logger.debug("ICMP sockets not available, using TCP probes only")
+    return None, False
+
+
+@dataclass
+class _Target:
+    address: str
+    ip: Optional[str] = None
+    interval: float = 0
+    next_probe: float = 0
+    callbacks: list[Callable[[str], None]] = field(default_factory=list)
+
+
+class ReachabilityProber:
+    """
+    Watches many hosts at once from a single background thread, without
+    forking "ping". Every round sends an ICMP echo request (when ICMP sockets
+    are available) and starts a non-blocking TCP connect to port 22. Any echo
+    reply, accepted connection or refused connection means the host is up.
+
+    Targets that don't answer are probed with exponential backoff (from
+    "initial_interval" up to "max_interval"). Subscribing to a target probes it
+    right away. Subscriptions are one-shot: the callback runs (on the prober
+    thread) once the target answers and the target is then forgotten.
+    """
+
+    def __init__(self, initial_interval: float = 0.25, max_interval: float = 4, probe_timeout: float = 1, port: int = SSH_PORT):
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._probe_timeout = probe_timeout
+        self._port = port
+        self._lock = threading.Lock()
+        self._targets: dict[str, _Target] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._ident = os.getpid() & 0xFFFF
+        self._seq = 0
+
+    def subscribe(self, address: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            target = self._targets.setdefault(address, _Target(address))
+            target.callbacks.append(callback)
+            target.interval = self._initial_interval
+            target.next_probe = 0
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="reachability", daemon=True)
+                self._thread.start()
+        self._wakeup()
+
+    def unsubscribe(self, address: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            target = self._targets.get(address)
+            if target is None:
+                return
+            if callback in target.callbacks:
+                target.callbacks.remove(callback)
+            if not target.callbacks:
+                del self._targets[address]
+
+    def wait(self, address: str, timeout: float) -> bool:
+        # Returns True as soon as "address" answers, or False after "timeout"
+        # seconds without an answer.
+        reachable = threading.Event()
+
+        def on_reachable(_: str) -> None:
+            reachable.set()
+
+        self.subscribe(address, on_reachable)
+        if reachable.wait(timeout):
+            return True
+        self.unsubscribe(address, on_reachable)
+        return reachable.is_set()
+
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_w.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def _loop(self) -> None:
+        sel = selectors.DefaultSelector()
+        sel.register(self._wakeup_r, selectors.EVENT_READ, None)
+        icmp, raw = _open_icmp_socket()
+        if icmp is not None:
+            sel.register(icmp, selectors.EVENT_READ, "icmp")
+        # Pending TCP probes: socket -> (target address, deadline)
+        pending: dict[socket.socket, tuple[str, float]] = {}
+
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                due = [t for t in self._targets.values() if t.next_probe <= now]
+                for t in due:
+                    t.next_probe = now + t.interval
+                    t.interval = min(t.interval * 2, self._max_interval)
+                next_probe = min((t.next_probe for t in self._targets.values()), default=now + 60)
+
+            for t in due:
+                self._probe(t, icmp, sel, pending)
+
+            deadline = min([next_probe] + [d for _, d in pending.values()])
+            for key, _ in sel.select(max(0, deadline - time.monotonic())):
+                if key.data is None:
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif key.data == "icmp":
+                    assert icmp is not None
+                    self._read_icmp(icmp, raw)
+                else:
+                    s = key.fileobj
+                    assert isinstance(s, socket.socket)
+                    address, _ = pending.pop(s)
+                    sel.unregister(s)
+                    err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    s.close()
+                    # A refused connection still means the host is up.
+                    if err in (0, errno.ECONNREFUSED):
+                        self._reachable(address)
+
+            now = time.monotonic()
+            for s, (_, d) in list(pending.items()):
+                if d <= now:
+                    del pending[s]
+                    sel.unregister(s)
+                    s.close()
+
+    def _probe(self, t: _Target, icmp: Optional[socket.socket], sel: selectors.BaseSelector, pending: dict[socket.socket, tuple[str, float]]) -> None:
+        if t.ip is None:
+            try:
+                t.ip = str(socket.getaddrinfo(t.address, self._port, socket.AF_INET, socket.SOCK_STREAM)[0][4][0])
+            except socket.gaierror:
+                return
+
+        if icmp is not None:
+            self._seq = (self._seq + 1) & 0xFFFF
+            try:
+                icmp.sendto(_echo_request(self._ident, self._seq), (t.ip, 0))
+            except OSError:
+                pass
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setblocking(False)
+        err = s.connect_ex((t.ip, self._port))
+        if err not in (0, errno.EINPROGRESS):
+            s.close()
+            if err == errno.ECONNREFUSED:
+                self._reachable(t.address)
+            return
+        pending[s] = (t.address, time.monotonic() + self._probe_timeout)
+        sel.register(s, selectors.EVENT_WRITE, "tcp")
+
+    def _read_icmp(self, icmp: socket.socket, raw: bool) -> None:
+        while True:
+            try:
+                data, (ip, _) = icmp.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            if raw:
+                # Raw sockets see every ICMP packet, including the IP header.
+                data = data[(data[0] & 0x0F) * 4 :]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, _ = struct.unpack("!BBHHH", data[:8])
+            # For ping sockets, the kernel sets the identifier and only
+            # passes us our replies.
+            if icmp_type != ICMP_ECHO_REPLY or (raw and ident != self._ident):
+                continue
+            with self._lock:
+                addresses = [t.address for t in self._targets.values() if t.ip == ip]
+            for address in addresses:
+                self._reachable(address)
+
+    def _reachable(self, address: str) -> None:
+        with self._lock:
+            target = self._targets.pop(address, None)
+        if target is None:
+            return
+        for cb in target.callbacks:
+            cb(address)
+
+
+prober = ReachabilityProber()
@@ -0,0 +1,186 @@
+import os
+import stat
+import threading
+import time
+import uuid
+from typing import Callable, Optional, TypeVar
+import paramiko
+from logger import logger
+
+
+T = TypeVar("T")
+
+# How long stat/listdir results are reused. Writes through RemoteFS (and
+# commands run on the host) invalidate them right away.
+CACHE_TTL = 2.0
+
+
+class RemoteFS:
+    """
+    File system operations on a remote host over one persistent SFTP session,
+    instead of running cat/ls/stat or opening a new SFTP session per call.
+
+    stat() and listdir() results are cached for "cache_ttl" seconds. If the
+    session breaks (for example because the SSH connection was re-established),
+    it is reopened once and the operation retried. Errors like
+    FileNotFoundError or PermissionError are passed on to the caller.
+    """
+
+    def __init__(self, open_sftp: Callable[[], paramiko.SFTPClient], cache_ttl: float = CACHE_TTL):
+        self._open_sftp = open_sftp
+        self._cache_ttl = cache_ttl
+        self._lock = threading.RLock()
+        self._sftp: Optional[paramiko.SFTPClient] = None
+        self._stat_cache: dict[str, tuple[float, Optional[paramiko.SFTPAttributes]]] = {}
+        self._listdir_cache: dict[str, tuple[float, list[str]]] = {}
+
+    def _call(self, op: Callable[[paramiko.SFTPClient], T]) -> T:
+        with self._lock:
+            for attempt in range(2):
+                if self._sftp is None:
+                    self._sftp = self._open_sftp()
+                try:
+                    return op(self._sftp)
+                except (EOFError, paramiko.SSHException) as e:
+                    self._sftp = None
+                    if attempt:
+                        raise
+                    logger.debug(f"SFTP session broken ({e}), reopening")
+            raise AssertionError("unreachable")
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._stat_cache.clear()
+                self._listdir_cache.clear()
+                return
+            path = os.path.normpath(path)
+            self._stat_cache.pop(path, None)
+            self._listdir_cache.pop(path, None)
+            self._listdir_cache.pop(os.path.dirname(path), None)
+
+    def stat(self, path: str) -> Optional[paramiko.SFTPAttributes]:
+        # Returns None if path doesn't exist.
+        path = os.path.normpath(path)
+        with self._lock:
+            cached = self._stat_cache.get(path)
+            if cached is not None and time.monotonic() - cached[0] < self._cache_ttl:
+                return cached[1]
+
+            def do_stat(sftp: paramiko.SFTPClient) -> Optional[paramiko.SFTPAttributes]:
+                try:
+                    return sftp.stat(path)
+                except FileNotFoundError:
+                    return None
+
+            attrs = self._call(do_stat)
+            self._stat_cache[path] = (time.monotonic(), attrs)
+            return attrs
+
+    def exists(self, path: str) -> bool:
+        return self.stat(path) is not None
+
+    def isdir(self, path: str) -> bool:
+        attrs = self.stat(path)
+        return attrs is not None and attrs.st_mode is not None and stat.S_ISDIR(attrs.st_mode)
+
+    def listdir(self, path: str = ".") -> list[str]:
+        path = os.path.normpath(path)
+        with self._lock:
+            cached = self._listdir_cache.get(path)
+            if cached is not None and time.monotonic() - cached[0] < self._cache_ttl:
+                return list(cached[1])
+            names = self._call(lambda sftp: sftp.listdir(path))
+            self._listdir_cache[path] = (time.monotonic(), names)
+            return list(names)
+
+    def read_bytes(self, path: str) -> bytes:
+        def read(sftp: paramiko.SFTPClient) -> bytes:
+            with sftp.open(path, "rb") as f:
+                f.prefetch()
+                return f.read()
+
+        return self._call(read)
+
+    def read_text(self, path: str) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def write_bytes(self, path: str, data: bytes, *, atomic: bool = False) -> None:
+        # Writes "path" in place (like "sftp put"), keeping its owner, links
+        # and inode. With "atomic", the data is written to a temporary file
+        # next to "path" and renamed over it instead, so readers never see a
+        # partially written file (this needs write access to the directory
+        # and replaces the file, only its mode is kept).
+        self.invalidate(path)
+        if not atomic:
+
+            def write_in_place(sftp: paramiko.SFTPClient) -> None:
+                with sftp.open(path, "wb") as f:
+                    f.set_pipelined(True)
+                    f.write(data)
+
+            try:
+                self._call(write_in_place)
+            finally:
+                self.invalidate(path)
+            return
+
+        tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+        old = self.stat(path)
+
+        def write(sftp: paramiko.SFTPClient) -> None:
+            try:
+                with sftp.open(tmp, "wb") as f:
+                    f.set_pipelined(True)
+                    f.write(data)
+                if old is not None and old.st_mode is not None:
+                    sftp.chmod(tmp, stat.S_IMODE(old.st_mode))
+                sftp.posix_rename(tmp, path)
+            except Exception:
+                try:
+                    sftp.remove(tmp)
+                except (IOError, EOFError, paramiko.SSHException):
+                    pass
+                raise
+
+        try:
+            self._call(write)
+        finally:
+            self.invalidate(path)
+
+    def write_text(self, path: str, contents: str, *, atomic: bool = False) -> None:
+        self.write_bytes(path, contents.encode("utf-8"), atomic=atomic)
+
+    def makedirs(self, path: str) -> None:
+        path = os.path.normpath(path)
+        if path in ("", ".", "/") or self.isdir(path):
+            return
+        self.makedirs(os.path.dirname(path))
+        try:
+            self._call(lambda sftp: sftp.mkdir(path))
+        except IOError:
+            # Somebody else might have created it in the meantime.
+            self.invalidate(path)
+            if not self.isdir(path):
+                raise
+        self.invalidate(path)
+
+    def rename(self, src: str, dst: str) -> None:
+        try:
+            self._call(lambda sftp: sftp.posix_rename(src, dst))
+        finally:
+            self.invalidate(src)
+            self.invalidate(dst)
+
+    def remove(self, path: str) -> None:
+        try:
+            self._call(lambda sftp: sftp.remove(path))
+        finally:
+            self.invalidate(path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sftp is not None:
+                self._sftp.close()
+                self._sftp = None
+            self.invalidate()
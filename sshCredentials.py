@@ -0,0 +1,92 @@
+import dataclasses
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+import paramiko
+from paramiko import Ed25519Key, RSAKey
+from logger import logger
+
+
+@dataclass(frozen=True)
+class PrivateKey:
+    path: str
+    key_type: str
+    pkey: paramiko.PKey
+
+    def is_rsa(self) -> bool:
+        return self.key_type == "rsa"
+
+
+@dataclass
+class LoginTiming:
+    # How often a login method won on a host, and how long it took (from the
+    # start of ssh_connect_looped() until logged in).
+    wins: int = 0
+    total_seconds: float = 0
+    last_seconds: float = 0
+
+
+_KEY_CLASSES: list[tuple[str, type[paramiko.PKey]]] = [("rsa", RSAKey), ("ed25519", Ed25519Key)]
+
+
+class CredentialCache:
+    """
+    Process-wide cache of SSH credentials.
+
+    Private keys are parsed (and their type detected by paramiko) once per
+    file, as long as the file doesn't change, and the resulting PKey objects
+    are shared by every login (PKey objects are not modified when signing, so
+    they are safe to share between threads).
+
+    The cache also remembers which login last succeeded for a
+    (hostname, username), so that it can be tried first next time, and how
+    long logging in took with each method.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._keys: dict[tuple[str, int], PrivateKey] = {}
+        self._last_success: dict[tuple[str, str], str] = {}
+        self._timings: dict[tuple[str, str], LoginTiming] = {}
+
+    def load_key(self, path: str) -> PrivateKey:
+        key = (os.path.realpath(path), os.stat(path).st_mtime_ns)
+        with self._lock:
+            cached = self._keys.get(key)
+        if cached is not None:
+            return cached
+
+        errors = []
+        for key_type, cls in _KEY_CLASSES:
+            try:
+                pkey = cls.from_private_key_file(path)
+            except paramiko.SSHException as e:
+                errors.append(f"{key_type}: {e}")
+                continue
+            logger.debug(f"Loaded {key_type} key {path}")
+            private_key = PrivateKey(path, key_type, pkey)
+            with self._lock:
+                self._keys[key] = private_key
+            return private_key
+        raise paramiko.SSHException(f"Unsupported private key {path} ({', '.join(errors)})")
+
+    def remember_success(self, hostname: str, username: str, auth_id: str, seconds: float = 0) -> None:
+        with self._lock:
+            self._last_success[(hostname, username)] = auth_id
+            timing = self._timings.setdefault((hostname, auth_id), LoginTiming())
+            timing.wins += 1
+            timing.total_seconds += seconds
+            timing.last_seconds = seconds
+
+    def last_success(self, hostname: str, username: str) -> Optional[str]:
+        with self._lock:
+            return self._last_success.get((hostname, username))
+
+    def timings(self, hostname: str) -> dict[str, LoginTiming]:
+        # Per login method (auth id) that succeeded on "hostname".
+        with self._lock:
+            return {auth_id: dataclasses.replace(t) for (h, auth_id), t in self._timings.items() if h == hostname}
+
+
+credentials = CredentialCache()
@@ -0,0 +1,119 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+import paramiko
+from logger import logger
+
+
+# (hostname, username, auth). The auth part identifies the credential (key
+# path, password digest, ...) without containing the secret itself.
+PoolKey = tuple[str, str, str]
+
+
+@dataclass
+class _PoolEntry:
+    client: paramiko.SSHClient
+    last_used: float
+
+
+def _is_alive(client: paramiko.SSHClient) -> bool:
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+def _has_open_channels(client: paramiko.SSHClient) -> bool:
+    # Commands, SFTP sessions and tunnels (direct-tcpip channels of hosts
+    # reached through this one) that are still running. Paramiko only keeps
+    # the open channels in the transport's channel map.
+    transport = client.get_transport()
+    return transport is not None and len(getattr(transport, "_channels", ())) > 0
+
+
+class SSHConnectionPool:
+    """
+    Process-wide pool of authenticated SSH connections.
+
+    Connections are keyed by (hostname, username, auth). Everybody that
+    connects with the same key shares one paramiko Transport, and every
+    command/SFTP session opens its own channel on it. This avoids doing a new
+    key exchange and authentication each time a host.Host is connected.
+
+    Dead connections are detected through the transport state (keepalives
+    are enabled on every pooled transport) and connections that have not been
+    used for "idle_timeout" seconds and have no open channels are closed.
+    """
+
+    def __init__(self, idle_timeout: float = 900, keepalive_interval: int = 30):
+        self._idle_timeout = idle_timeout
+        self._keepalive_interval = keepalive_interval
+        self._lock = threading.Lock()
+        self._entries: dict[PoolKey, _PoolEntry] = {}
+        self._connect_locks: dict[PoolKey, threading.Lock] = {}
+
+    def get(self, key: PoolKey) -> Optional[paramiko.SSHClient]:
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not _is_alive(entry.client):
+                logger.debug(f"Dropping dead SSH connection to {key[0]} ({key[1]})")
+                del self._entries[key]
+                entry.client.close()
+                return None
+            entry.last_used = time.monotonic()
+            return entry.client
+
+    def connect(self, key: PoolKey, login: Callable[[], paramiko.SSHClient]) -> paramiko.SSHClient:
+        # Serialize connecting per key so that concurrent users of the same
+        # host do a single handshake and then share the result.
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+
+        with connect_lock:
+            client = self.get(key)
+            if client is not None:
+                return client
+
+            client = login()
+            transport = client.get_transport()
+            if transport is not None:
+                transport.set_keepalive(self._keepalive_interval)
+
+            with self._lock:
+                self._entries[key] = _PoolEntry(client, time.monotonic())
+            return client
+
+    def discard(self, key: PoolKey, client: Optional[paramiko.SSHClient] = None) -> None:
+        # Remove a connection that turned out to be broken. If "client" is
+        # given, only remove the entry if it still refers to that client (some
+        # other thread might have already replaced it with a fresh one).
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (client is not None and entry.client is not client):
+                return
+            del self._entries[key]
+        entry.client.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.client.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _evict_idle_locked(self) -> None:
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if now - entry.last_used > self._idle_timeout and not _has_open_channels(entry.client):
+                logger.debug(f"Closing idle SSH connection to {key[0]} ({key[1]})")
+                del self._entries[key]
+                entry.client.close()
+
+
+ssh_pool = SSHConnectionPool()
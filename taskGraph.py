@@ -0,0 +1,165 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from logger import logger
+import tracing
+
+
+@dataclass
+class Task:
+    name: str
+    func: Callable[[], None]
+    # Names of the things (artifacts, states) the task needs and makes. A task
+    # depends on every task that provides one of its inputs.
+    inputs: frozenset[str] = frozenset()
+    outputs: frozenset[str] = frozenset()
+    # Units of limited resources held while running, e.g. {"ai_api": 1}.
+    resources: dict[str, int] = field(default_factory=dict)
+    start: Optional[float] = None
+    end: Optional[float] = None
+
+    def duration(self) -> float:
+        if self.start is None or self.end is None:
+            return 0
+        return self.end - self.start
+
+
+class TaskGraph:
+    """
+    Runs tasks as soon as the tasks providing their inputs are done, each
+    in its own thread, as long as the resources they need are available.
+
+    When a task fails (raises, or calls sys.exit()), no new tasks are
+    started, the running ones are waited for and the exception is raised
+    from run().
+    """
+
+    def __init__(self, limits: Optional[dict[str, int]] = None, max_workers: int = 16):
+        self._tasks: dict[str, Task] = {}
+        self._limits = limits or {}
+        self._max_workers = max_workers
+
+    def add(self, name: str, func: Callable[[], None], *, inputs: tuple[str, ...] = (), outputs: tuple[str, ...] = (), resources: Optional[dict[str, int]] = None) -> Task:
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task {name}")
+        task = Task(name, func, frozenset(inputs), frozenset(outputs), resources or {})
+        self._tasks[name] = task
+        return task
+
+    def tasks(self) -> list[Task]:
+        return list(self._tasks.values())
+
+    def dependencies(self, task: Task) -> list[Task]:
+        return [t for t in self._tasks.values() if t is not task and t.outputs & task.inputs]
+
+    def validate(self) -> None:
+        provided = set().union(*(t.outputs for t in self._tasks.values()))
+        for t in self._tasks.values():
+            missing = t.inputs - provided
+            if missing:
+                raise ValueError(f"Nothing provides {sorted(missing)} needed by {t.name}")
+            for r, n in t.resources.items():
+                if n > self._limits.get(r, n):
+                    raise ValueError(f"{t.name} needs {n} {r}, but only {self._limits[r]} available")
+        self.levels()
+
+    def levels(self) -> list[list[Task]]:
+        # Tasks grouped by depth in the graph (all tasks of a level can run
+        # concurrently). Raises on cycles.
+        depth: dict[str, int] = {}
+        visiting: set[str] = set()
+
+        def visit(t: Task) -> int:
+            if t.name in depth:
+                return depth[t.name]
+            if t.name in visiting:
+                raise ValueError(f"Dependency cycle through {t.name}")
+            visiting.add(t.name)
+            depth[t.name] = 1 + max((visit(d) for d in self.dependencies(t)), default=-1)
+            visiting.discard(t.name)
+            return depth[t.name]
+
+        for t in self._tasks.values():
+            visit(t)
+        levels: list[list[Task]] = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for t in self._tasks.values():
+            levels[depth[t.name]].append(t)
+        return levels
+
+    def plan(self) -> str:
+        lines = []
+        for i, level in enumerate(self.levels()):
+            for t in level:
+                deps = ", ".join(d.name for d in self.dependencies(t))
+                lines.append(f"{i}: {t.name}" + (f" (after {deps})" if deps else ""))
+        return "\n".join(lines)
+
+    def run(self) -> None:
+        self.validate()
+        pending = dict(self._tasks)
+        done: set[str] = set()
+        in_use: dict[str, int] = {}
+        running: dict[Future[None], Task] = {}
+        lock = threading.Lock()
+        error: Optional[BaseException] = None
+
+        def fits(t: Task) -> bool:
+            return all(in_use.get(r, 0) + n <= self._limits.get(r, n) for r, n in t.resources.items())
+
+        def timed(t: Task) -> None:
+            with lock:
+                t.start = time.monotonic()
+            try:
+                with tracing.span(t.name, tracing.TASK):
+                    t.func()
+            finally:
+                with lock:
+                    t.end = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    for t in list(pending.values()):
+                        if all(d.name in done for d in self.dependencies(t)) and fits(t):
+                            logger.info(f"Starting task {t.name}")
+                            for r, n in t.resources.items():
+                                in_use[r] = in_use.get(r, 0) + n
+                            del pending[t.name]
+                            running[executor.submit(timed, t)] = t
+                if not running:
+                    if error is None and pending:
+                        raise RuntimeError(f"Tasks {list(pending)} can't be started")
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    t = running.pop(f)
+                    for r, n in t.resources.items():
+                        in_use[r] -= n
+                    try:
+                        f.result()
+                    except BaseException as e:
+                        logger.info(f"Task {t.name} failed after {t.duration():.1f}s: {type(e).__name__} {e}")
+                        error = error or e
+                        continue
+                    done.add(t.name)
+                    logger.info(f"Task {t.name} done after {t.duration():.1f}s")
+        if error is not None:
+            raise error
+
+    def critical_path(self) -> list[Task]:
+        # The chain of dependent tasks that took the longest (of the last
+        # run). Speeding up anything else doesn't make the run faster.
+        best: dict[str, tuple[float, list[Task]]] = {}
+        for level in self.levels():
+            for t in level:
+                prev = max((best[d.name] for d in self.dependencies(t)), key=lambda b: b[0], default=(0.0, []))
+                best[t.name] = (prev[0] + t.duration(), prev[1] + [t])
+        return max(best.values(), key=lambda b: b[0], default=(0.0, []))[1]
+
+    def report(self) -> str:
+        path = self.critical_path()
+        total = sum(t.duration() for t in path)
+        steps = " -> ".join(f"{t.name} ({t.duration():.1f}s)" for t in path)
+        return f"Critical path ({total:.1f}s): {steps}"
@@ -0,0 +1,56 @@
+import json
+import threading
+from typing import Optional
+
+from aiPoller import Snapshot, StatusPoller
+
+
+def _host(name: str, status: str, ip: str) -> dict[str, str]:
+    inventory = json.dumps({"interfaces": [{"ipv4_addresses": [f"{ip}/24"]}]})
+    return {"requested_hostname": name, "id": f"id-{name}", "status": status, "status_info": "", "inventory": inventory}
+
+
+def test_snapshot_shared_and_indexed() -> None:
+    calls = 0
+
+    def fetch_hosts() -> list[dict[str, str]]:
+        nonlocal calls
+        calls += 1
+        return [_host("w1", "known", "192.168.122.10"), {"requested_hostname": "no-inventory", "id": "x", "status": "discovering", "status_info": ""}]
+
+    poller = StatusPoller(fetch_hosts, lambda: {"c": "installing"}, interval=60)
+    for _ in range(10):
+        s = poller.snapshot()
+    assert calls == 1
+    assert s.by_name["w1"].status == "known"
+    assert s.by_ip["192.168.122.10"].name == "w1"
+    assert list(s.by_name) == ["w1"]
+    assert s.clusters == {"c": "installing"}
+
+    poller.invalidate()
+    poller.snapshot()
+    assert calls == 2
+
+
+def test_wait_and_transitions() -> None:
+    status = "discovering"
+    transitions: list[tuple[str, Optional[str], str]] = []
+    poller = StatusPoller(lambda: [_host("w1", status, "10.0.0.1")], lambda: {}, interval=0.01)
+    poller.subscribe(lambda name, old, new: transitions.append((name, old, new)))
+
+    def known(s: Snapshot) -> Optional[str]:
+        h = s.by_name.get("w1")
+        return h.status if h is not None and h.status == "known" else None
+
+    assert poller.wait(known, timeout=0.1) is None
+
+    def become_known() -> None:
+        nonlocal status
+        status = "known"
+
+    t = threading.Timer(0.05, become_known)
+    t.start()
+    assert poller.wait(known, timeout=5) == "known"
+    t.join()
+    assert transitions[0] == ("w1", None, "discovering")
+    assert ("w1", "discovering", "known") in transitions
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from typing import Iterator
+
+import pytest
+
+import host
+from asyncHost import AsyncExecutor, AsyncHost
+from logger import logger
+
+
+@pytest.fixture
+def executor() -> Iterator[AsyncExecutor]:
+    ex = AsyncExecutor(max_concurrency=2)
+    yield ex
+    ex.shutdown()
+
+
+def test_run_all_order(executor: AsyncExecutor) -> None:
+    async def delayed(value: int) -> int:
+        await asyncio.sleep(0.01 * (5 - value))
+        return value
+
+    assert executor.run_all([delayed(i) for i in range(5)]) == [0, 1, 2, 3, 4]
+
+
+def test_exception(executor: AsyncExecutor) -> None:
+    async def ok() -> int:
+        return 1
+
+    async def fails() -> int:
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        executor.run_all([ok(), fails()])
+    # The loop is still running.
+    assert executor.run(ok()) == 1
+
+
+def test_exit(executor: AsyncExecutor) -> None:
+    async def exits() -> None:
+        logger.error_and_exit("fatal", exit_code=3)
+
+    with pytest.raises(SystemExit) as e:
+        executor.run(exits())
+    assert e.value.code == 3
+    with pytest.raises(SystemExit) as e:
+        executor.run_all([exits()])
+    assert e.value.code == 3
+
+
+def test_blocking_limit(executor: AsyncExecutor) -> None:
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def work() -> None:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    executor.run_all([executor.blocking(work) for _ in range(6)])
+    assert peak == 2
+
+
+def test_run_local(executor: AsyncExecutor) -> None:
+    h = AsyncHost(host.LocalHost(), executor)
+    ret = executor.run(h.run("echo hi"))
+    assert ret.out == "hi\n" and ret.returncode == 0
@@ -0,0 +1,26 @@
+import logging
+
+import host
+import outputCapture
+from clusterDeployer import _run_batch_or_each
+
+
+class _FlakyHost(host.Host):
+    # Batches get cut short after the first command.
+    def __init__(self, hostname: str):
+        super().__init__(hostname)
+        self.runs: list[str] = []
+
+    def run_batch(self, cmds: list[str], *, stop_on_error: bool = False, log_level: int = logging.DEBUG) -> list[host.Result]:
+        return [host.Result(cmds[0], "", 0)] + [host.Result("", host.BATCH_CUT_SHORT, -1) for _ in cmds[1:]]
+
+    def run(self, cmd: str, log_level: int = 0, env: dict[str, str] = {}, quiet: bool = False, capture: outputCapture.CapturePolicy = outputCapture.KEEP_ALL) -> host.Result:
+        self.runs.append(cmd)
+        return host.Result(cmd, "", 0)
+
+
+def test_run_batch_or_each() -> None:
+    h = _FlakyHost("flaky-bf")
+    results = _run_batch_or_each(h, ["a", "b", "c"])
+    assert [r.out for r in results] == ["a", "b", "c"]
+    assert h.runs == ["b", "c"]
@@ -0,0 +1,60 @@
+import logging
+import typing
+
+import host
+import outputCapture
+from clusterNode import VmClusterNode
+from clustersConfig import NodeConfig
+
+
+class _VirshHost(host.Host):
+    # Knows about VM "vm1" only, records the batches.
+    def __init__(self, hostname: str):
+        super().__init__(hostname)
+        self.batches: list[list[str]] = []
+        # Number of Results of the next batches, as if cut short.
+        self.cut_short: typing.Optional[int] = None
+
+    def run(self, cmd: str, log_level: int = 0, env: dict[str, str] = {}, quiet: bool = False, capture: outputCapture.CapturePolicy = outputCapture.KEEP_ALL) -> host.Result:
+        assert cmd == "virsh list --all --name"
+        return host.Result("vm1\n\n", "", 0)
+
+    def run_batch(self, cmds: list[str], *, stop_on_error: bool = False, log_level: int = logging.DEBUG) -> list[host.Result]:
+        self.batches.append(cmds)
+        return [host.Result("", "", 0) for _ in cmds[: self.cut_short]]
+
+
+def test_teardown_all() -> None:
+    h = _VirshHost("teardown-test")
+    nodes = [VmClusterNode(h, NodeConfig("c", name, "localhost", "vm")) for name in ["vm1", "vm2"]]
+    VmClusterNode.teardown_all(h, nodes)
+    assert h.batches == [
+        [
+            "rm -f /home/c_guests_images/vm1.img /home/c_guests_images/vm1.qcow2",
+            "virsh destroy vm1",
+            "virsh undefine vm1",
+            "rm -f /home/c_guests_images/vm2.img /home/c_guests_images/vm2.qcow2",
+        ]
+    ]
+
+    VmClusterNode.teardown_all(h, [])
+    assert len(h.batches) == 1
+
+
+def test_adopt() -> None:
+    h = _VirshHost("adopt-test")
+    member = VmClusterNode(h, NodeConfig("c", "c-pool-h-0", "localhost", "vm", mac="52:54:01:00:00:01"))
+    worker = VmClusterNode(h, NodeConfig("c", "w1", "localhost", "vm", mac="52:54:00:00:00:42"))
+    assert worker.adopt(member)
+    assert h.batches == [
+        [
+            "virsh domrename c-pool-h-0 w1",
+            "mv /home/c_guests_images/c-pool-h-0.qcow2 /home/c_guests_images/w1.qcow2",
+            "virt-xml w1 --edit path=/home/c_guests_images/c-pool-h-0.qcow2 --disk path=/home/c_guests_images/w1.qcow2",
+            "virt-xml w1 --edit mac=52:54:01:00:00:01 --network mac=52:54:00:00:00:42",
+        ]
+    ]
+
+    # The session dropped before the first command finished.
+    h.cut_short = 0
+    assert not worker.adopt(member)
@@ -0,0 +1,41 @@
+import os
+
+import deployJournal
+from deployJournal import Journal
+
+
+def test_resume(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "c.journal")
+    j = Journal(path)
+    j.task_done("teardown_masters")
+    j.node_phase("w1", deployJournal.BOOTED, ip="192.168.122.10")
+    j.node_phase("w1", deployJournal.KNOWN)
+    j.node_phase("w2", deployJournal.INSTALLING)
+    j.reset_node("w2")
+    # A crash in the middle of a write.
+    with open(path, "a") as f:
+        f.write('{"event": "task", "na')
+
+    r = Journal(path, resume=True)
+    assert r.done("teardown_masters")
+    assert not r.done("create_cluster")
+    assert r.reached("w1", deployJournal.RENAMED)
+    assert not r.reached("w1", deployJournal.INSTALLING)
+    assert r.info("w1") == {"ip": "192.168.122.10"}
+    assert r.phase("w2") is None
+
+    r.task_done("create_cluster")
+    assert Journal(path, resume=True).tasks() == {"teardown_masters", "create_cluster"}
+
+
+def test_restart(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "c.journal")
+    Journal(path).task_done("teardown_masters")
+
+    j = Journal(path)
+    assert not j.done("teardown_masters")
+    j.task_done("create_cluster")
+    assert Journal(path, resume=True).tasks() == {"create_cluster"}
+
+    j.remove()
+    assert not os.path.exists(path)
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import pathlib
+import typing
+from typing import Any, Optional
+
+import paramiko
+
+import fileTransfer
+
+
+class FakeFile:
+    def __init__(self, path: str, mode: str):
+        self._f = open(path, mode + "b")
+
+    def set_pipelined(self, pipelined: bool) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._f, name)
+
+    def __enter__(self) -> "FakeFile":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._f.close()
+
+
+class FakeSFTP:
+    # Local filesystem SFTP, failing once on the first write at "fail_offset".
+    def __init__(self, state: dict[str, int]):
+        self._state = state
+
+    def open(self, path: str, mode: str) -> FakeFile:
+        f = FakeFile(path, mode)
+        write = f._f.write
+
+        def failing_write(data: bytes) -> int:
+            if f._f.tell() == self._state["fail_offset"] and not self._state["failed"]:
+                self._state["failed"] = 1
+                raise EOFError("connection lost")
+            return write(data)
+
+        f.write = failing_write  # type: ignore
+        return f
+
+    def truncate(self, path: str, size: int) -> None:
+        os.truncate(path, size)
+
+    def posix_rename(self, src: str, dst: str) -> None:
+        os.rename(src, dst)
+
+    def close(self) -> None:
+        pass
+
+
+def _sha256(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    return hashlib.sha256(pathlib.Path(path).read_bytes()).hexdigest()
+
+
+def test_chunked_upload(tmp_path: pathlib.Path) -> None:
+    src = tmp_path / "src"
+    dst = tmp_path / "dst"
+    src.write_bytes(os.urandom(10 * 1024 * 1024 + 123))
+
+    state = {"fail_offset": 4 * 1024 * 1024, "failed": 0}
+    reconnects: list[int] = []
+    upload = fileTransfer.ChunkedUpload(
+        lambda: typing.cast(paramiko.SFTPClient, FakeSFTP(state)),
+        lambda: reconnects.append(1),
+        _sha256,
+        chunk_size=2 * 1024 * 1024,
+    )
+
+    assert upload.upload(str(src), str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+    assert not os.path.exists(f"{dst}.part")
+    assert state["failed"] and len(reconnects) == 1
+
+    # Same content already there, nothing to do.
+    assert not upload.upload(str(src), str(dst))
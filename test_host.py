@@ -0,0 +1,171 @@
+import pathlib
+import shlex
+import threading
+import time
+import typing
+
+import pytest
+
+import host
+import hostFacts
+import outputCapture
+from libvirt import Libvirt
+
+
+def test_run_local() -> None:
+    rsh = host.LocalHost()
+    ret = rsh.run("bash -c 'echo out1; echo err1 >&2; echo out2; exit 3'")
+    assert ret.out == "out1\nout2\n"
+    assert ret.err == "err1\n"
+    assert ret.returncode == 3
+
+
+def test_stream_lines() -> None:
+    lines: list[tuple[str, str]] = []
+    s = host.LocalHost().stream("bash -c 'echo a; printf b; echo c >&2'", on_line=lambda stream, line: lines.append((stream, line)))
+    chunks = list(s)
+    assert s.returncode == 0
+    assert "".join(c.data for c in chunks if c.stream == host.STDOUT) == "a\nb"
+    assert "".join(c.data for c in chunks if c.stream == host.STDERR) == "c\n"
+    assert sorted(lines) == [(host.STDERR, "c"), (host.STDOUT, "a"), (host.STDOUT, "b")]
+
+
+def test_stream_long_line() -> None:
+    def reader(cancelled: threading.Event) -> host._Reader:
+        yield host.STDOUT, b"ab\n0123"
+        yield host.STDOUT, b"456789ab"
+        return 0
+
+    lines: list[str] = []
+    s = host.CommandStream(reader, on_line=lambda _, line: lines.append(line), max_line_length=4)
+    assert s.wait() == 0
+    assert lines == ["ab", "0123", "4567", "89ab"]
+
+
+def test_stream_cancel() -> None:
+    s = host.LocalHost().stream("sleep 30")
+    threading.Timer(0.2, s.cancel).start()
+    start = time.monotonic()
+    assert s.wait() != 0
+    assert time.monotonic() - start < 10
+
+
+def test_split_batch_output() -> None:
+    m = "__cda_batch_x"
+    out = f"a\nb\n\n{m} 0 0\nnonl\n{m} 1 3\n\n{m} 2 0\n"
+    assert host._split_batch_output(out, m) == [("a\nb\n", 0), ("nonl", 3), ("", 0)]
+    # A batch that stopped early (or whose connection broke) returns fewer entries.
+    assert host._split_batch_output(f"x\n{m} 0 1\npartial", m) == [("x", 1)]
+    assert host._split_batch_output("", m) == []
+
+
+class _ShellHost(host.Host):
+    # Runs the remote side of run_batch() in a local shell.
+    def _run_remote(self, cmd: str, log_level: int, capture: outputCapture.CapturePolicy = outputCapture.KEEP_ALL) -> host.Result:
+        return host.LocalHost().run(f"bash -c {shlex.quote(cmd)}")
+
+
+def test_run_batch_shell_syntax() -> None:
+    cmds = ["echo a; echo b", "false && echo no || echo yes", "X=1; echo $X >&2", "exit 4", "echo 'c  d' | tr -d c"]
+    local = host.LocalHost().run_batch(cmds)
+    remote = _ShellHost("batch-test").run_batch(cmds)
+    assert [(r.out, r.err, r.returncode) for r in local] == [(r.out, r.err, r.returncode) for r in remote]
+    assert [(r.out, r.err, r.returncode) for r in local] == [("a\nb\n", "", 0), ("yes\n", "", 0), ("", "1\n", 0), ("", "", 4), ("  d\n", "", 0)]
+
+
+def test_run_batch_cut_short() -> None:
+    # "kill $$" kills the shell running the whole batch, like a dropped session.
+    h = _ShellHost("batch-test")
+    results = h.run_batch(["echo a", "kill -9 $$", "echo c"])
+    assert [(r.out, r.returncode) for r in results] == [("a\n", 0), ("", -1), ("", -1)]
+    assert len(h.run_batch(["echo a", "kill -9 $$", "echo c"], stop_on_error=True)) == 1
+
+    with pytest.raises(SystemExit):
+        Libvirt(h)._run_batch_or_die(["true", "kill -9 $$"])
+
+
+def test_parse_facts() -> None:
+    f = hostFacts.parse(["abc\n", 'NAME="Fedora Linux"\nVARIANT=CoreOS\n', "/home/core", "32\n", "x86_64\n", None])
+    assert f.boot_id == "abc"
+    assert f.os_release == {"NAME": "Fedora Linux", "VARIANT": "CoreOS"}
+    assert f.home_dir == "/home/core"
+    assert f.nproc == 32
+    assert f.arch == "x86_64"
+    assert f.kernel == "" and f.fqdn == ""
+
+    local = host.LocalHost().facts()
+    assert local is host.LocalHost().facts()
+    assert local.nproc > 0
+
+
+class _ContainerHost(host.Host):
+    # Records commands instead of running them; "podman exec" fails once the
+    # container is removed, like after a reboot.
+    def __init__(self, hostname: str):
+        super().__init__(hostname)
+        self.cmds: list[str] = []
+        self.running = False
+        self.boot_id = "1"
+
+    def run(self, cmd: str, log_level: int = 0, env: dict[str, str] = {}, quiet: bool = False, capture: outputCapture.CapturePolicy = outputCapture.KEEP_ALL) -> host.Result:
+        self.cmds.append(cmd)
+        if "podman run -d" in cmd:
+            self.running = True
+        elif "image inspect" in cmd:
+            return host.Result('["/usr/bin/dpu-tools"]\n', "", 0)
+        elif "podman exec" in cmd and not self.running:
+            return host.Result("", "Error: no such container dpu-tools-sidecar", 125)
+        return host.Result("", "", 0)
+
+    def run_once(self, cmd: str, timeout: float) -> typing.Optional[host.Result]:
+        return self.run(cmd)
+
+    def facts(self) -> hostFacts.HostFacts:
+        return hostFacts.HostFacts(boot_id=self.boot_id)
+
+
+def test_dpu_tools_sidecar() -> None:
+    h = _ContainerHost("sidecar-test")
+    h.run_in_container("mode")
+    h.run_in_container("firmware version")
+    assert sum("podman run" in c for c in h.cmds) == 1
+    assert h.cmds[-1] == "sudo podman exec dpu-tools-sidecar /usr/bin/dpu-tools --verbose firmware version"
+
+    # Other flags use the same container.
+    h.run_in_container("mode", verbose=False)
+    assert sum("podman run" in c for c in h.cmds) == 1
+    assert h.cmds[-1] == "sudo podman exec dpu-tools-sidecar /usr/bin/dpu-tools mode"
+
+    h.running = False
+    assert h.run_in_container("mode").returncode == 0
+    assert sum("podman run" in c for c in h.cmds) == 2
+
+    h.boot_id = "2"
+    h.run_in_container("mode")
+    assert sum("podman run" in c for c in h.cmds) == 3
+
+    h.stop_dpu_tools()
+    assert "podman rm" in h.cmds[-1]
+
+
+def test_capture_policy(tmp_path: pathlib.Path) -> None:
+    lh = host.LocalHost()
+    cmd = "bash -c 'for i in $(seq 1000); do echo line$i; done'"
+    ret = lh.run(cmd, capture=outputCapture.CapturePolicy(max_chars=100, spill_dir=str(tmp_path)))
+    assert ret.returncode == 0
+    assert ret.out.startswith("line1\nline2\n")
+    assert ret.out.endswith("line999\nline1000\n")
+    assert "characters dropped" in ret.out
+    assert len(ret.out) < 300
+    assert ret.full_out() == "".join(f"line{i}\n" for i in range(1, 1001))
+    assert ret.full_err() == ""
+
+    assert lh.run(cmd).out == ret.full_out()
+
+
+def test_stream_capture() -> None:
+    c = outputCapture.StreamCapture(10)
+    for s in ["abc", "defgh", "ijklmnop", "qrstuvwxyz"]:
+        c.feed(s)
+    assert c.dropped == 16
+    assert c.text() == "abcde\n[... 16 characters dropped ...]\nvwxyz"
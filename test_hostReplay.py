@@ -0,0 +1,52 @@
+import pathlib
+
+import host
+import hostReplay
+
+
+def test_record_replay(tmp_path: pathlib.Path) -> None:
+    transcript = str(tmp_path / "transcript.jsonl")
+    data = tmp_path / "data.txt"
+    data.write_text("hello\n")
+
+    recorder = hostReplay.record(transcript)
+    try:
+        lh = host.LocalHost()
+        assert type(lh).__name__ == "RecordingHost"
+        lh.run_or_die("echo one")
+        lh.run("false")
+        assert lh.read_file(str(data)) == "hello\n"
+        assert lh.stream("echo streamed").wait() == 0
+        nproc = lh.facts().nproc
+    finally:
+        recorder.close()
+        hostReplay.stop()
+
+    methods = [e.method for e in hostReplay.iter_transcript(transcript)]
+    # run_or_die and facts() run commands through run/run_batch, only the
+    # outermost call is recorded.
+    assert methods == ["run", "run", "read_file", "stream", "facts"]
+
+    data.unlink()
+    replayer = hostReplay.replay(transcript, latency_scale=0)
+    try:
+        lh = host.LocalHost()
+
+        def deploy() -> None:
+            assert lh.run("echo one").out == "one\n"
+            assert lh.run("false").returncode == 1
+            assert lh.read_file(str(data)) == "hello\n"
+            lines: list[str] = []
+            assert lh.stream("echo streamed", on_line=lambda _, line: lines.append(line)).wait() == 0
+            assert lines == ["streamed"]
+            assert lh.facts().nproc == nproc
+            assert lh.run("not recorded").success()
+
+        replayer.benchmark(deploy)
+    finally:
+        hostReplay.stop()
+
+    assert replayer.stats.operations["run"] == 3
+    assert replayer.stats.misses == 1
+    assert replayer.stats.wall_time > 0
+    assert type(host.LocalHost()) is host.Host
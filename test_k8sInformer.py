@@ -0,0 +1,91 @@
+import queue
+import threading
+import pytest
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator
+
+import k8sInformer
+from k8sInformer import Informer
+from k8sClient import csr_pending, node_ready
+
+
+def _node(name: str, ready: bool, rv: str) -> Any:
+    con = SimpleNamespace(type="Ready", status=str(ready))
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=rv), status=SimpleNamespace(conditions=[con]))
+
+
+class _Api:
+    # One list, then the events put in "events" (None ends the watch).
+    def __init__(self) -> None:
+        self.lists = 0
+        self.watched_from: list[str] = []
+        self.events: queue.Queue[Any] = queue.Queue()
+
+    def list_node(self) -> Any:
+        self.lists += 1
+        return SimpleNamespace(items=[_node("w1", False, "1")], metadata=SimpleNamespace(resource_version="1"))
+
+    def watch(self, func: Callable[..., Any], rv: str, timeout: int) -> Iterator[dict[str, Any]]:
+        self.watched_from.append(rv)
+        while True:
+            e = self.events.get()
+            if e is None:
+                return
+            yield e
+
+
+def test_informer() -> None:
+    api = _Api()
+    seen: list[tuple[str, str]] = []
+    nodes = Informer("node", api.list_node, lambda type, obj: seen.append((type, obj.metadata.name)), watch=api.watch).start()
+
+    def all_ready(objects: dict[str, Any]) -> bool:
+        return len(objects) == 2 and all(node_ready(n) for n in objects.values())
+
+    assert not node_ready(nodes.get("w1"))
+    assert not nodes.wait(all_ready, timeout=0.05)
+
+    waiter = threading.Thread(target=lambda: seen.append(("ready", str(nodes.wait(all_ready, timeout=5)))))
+    waiter.start()
+    api.events.put({"type": "MODIFIED", "object": _node("w1", True, "2")})
+    api.events.put({"type": "ADDED", "object": _node("w2", True, "3")})
+    waiter.join()
+    assert seen == [("ADDED", "w1"), ("MODIFIED", "w1"), ("ADDED", "w2"), ("ready", "True")]
+
+    # The watch continues where it ended, without listing again.
+    api.events.put(None)
+    api.events.put({"type": "DELETED", "object": _node("w2", True, "4")})
+    assert nodes.wait(lambda objects: "w2" not in objects, timeout=5)
+    assert api.lists == 1 and api.watched_from == ["1", "3"]
+    nodes.stop()
+
+
+def test_informer_relists(monkeypatch: Any) -> None:
+    monkeypatch.setattr(k8sInformer, "RELIST_DELAY", 0)
+    api = _Api()
+    nodes = Informer("node", api.list_node, watch=api.watch).start()
+    api.events.put({"type": "ERROR", "object": {"code": 410}})
+    assert nodes.wait(lambda objects: api.lists == 2, timeout=5)
+    nodes.stop()
+    api.events.put(None)
+
+
+def test_informer_list_error(monkeypatch: Any) -> None:
+    monkeypatch.setattr(k8sInformer, "RELIST_DELAY", 0.01)
+    monkeypatch.setattr(k8sInformer, "SYNC_TIMEOUT", 0.1)
+
+    def list_node() -> Any:
+        raise ValueError("unauthorized")
+
+    nodes = Informer("node", list_node).start()
+    with pytest.raises(RuntimeError, match="unauthorized"):
+        nodes.get("w1")
+    with pytest.raises(RuntimeError, match="unauthorized"):
+        nodes.wait(lambda objects: True, timeout=5)
+    nodes.stop()
+
+
+def test_csr_pending() -> None:
+    assert csr_pending(SimpleNamespace(status=None))
+    assert csr_pending(SimpleNamespace(status=SimpleNamespace(conditions=None)))
+    assert not csr_pending(SimpleNamespace(status=SimpleNamespace(conditions=[SimpleNamespace(type="Approved")])))
@@ -0,0 +1,88 @@
+import os
+import threading
+import pytest
+
+import clustersConfig
+import multiCluster
+
+
+MULTI = os.path.join(os.path.dirname(__file__), "tests/configs/multi1.yaml")
+
+
+def load(index: int) -> clustersConfig.ClustersConfig:
+    return clustersConfig.ClustersConfig(MULTI, secrets_path="/secrets/path", test_only=True, index=index)
+
+
+def test_cluster_count_and_index() -> None:
+    assert clustersConfig.cluster_count(MULTI) == 2
+    assert [load(i).name for i in range(2)] == ["alpha", "beta"]
+    assert [n.name for n in load(1).masters] == ["beta-master-1", "beta-master-2", "beta-master-3"]
+
+
+def test_validate() -> None:
+    multiCluster.validate([load(0), load(1)])
+
+    with pytest.raises(SystemExit):
+        multiCluster.validate([load(0), load(0)])
+
+    beta = load(1)
+    beta.masters[0].ip = "192.168.122.99"
+    with pytest.raises(SystemExit):
+        multiCluster.validate([load(0), beta])
+
+    beta = load(1)
+    beta.version = "4.15.0-nightly"
+    with pytest.raises(SystemExit):
+        multiCluster.validate([load(0), beta])
+
+
+def test_shared_bridge() -> None:
+    ccs = [load(0), load(1)]
+    for cc, end in zip(ccs, ("192.168.122.5", "192.168.122.54")):
+        cc.full_ip_range = ("192.168.122.1", "192.168.122.254")
+        cc.ip_range = ("192.168.122.1", end)
+        cc.local_bridge_config = clustersConfig.BridgeConfig(ip="192.168.122.1", mask="255.255.0.0")
+
+    bc = multiCluster.shared_bridge(ccs)
+    assert bc == clustersConfig.BridgeConfig(ip="192.168.122.1", mask="255.255.0.0", dynamic_ip_range=("192.168.122.54", "192.168.122.254"), shared=True)
+
+
+def test_run_isolates_failures() -> None:
+    ccs = [load(0), load(1)]
+    done = []
+
+    def deploy(cc: clustersConfig.ClustersConfig) -> None:
+        if cc.name == "alpha":
+            raise SystemExit(-1)
+        done.append(cc.name)
+
+    with pytest.raises(SystemExit):
+        multiCluster.run(ccs, deploy)
+    assert done == ["beta"]
+
+    multiCluster.run(ccs, lambda cc: done.append(cc.name))
+    assert sorted(done) == ["alpha", "beta", "beta"]
+
+
+def test_barrier() -> None:
+    barrier = multiCluster.Barrier(["alpha", "beta", "gamma"])
+    passed = []
+
+    def teardown(name: str) -> None:
+        barrier.arrive(name)
+        barrier.wait()
+        passed.append(name)
+
+    alpha = threading.Thread(target=teardown, args=("alpha",))
+    alpha.start()
+    # Beta failed before being torn down.
+    barrier.arrive("beta")
+    alpha.join(0.05)
+    assert passed == []
+
+    teardown("gamma")
+    alpha.join()
+    assert sorted(passed) == ["alpha", "gamma"]
+    # Arriving again (e.g. on the way out) is fine.
+    barrier.arrive("alpha")
+    barrier.wait()
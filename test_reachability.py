@@ -0,0 +1,43 @@
+import socket
+import threading
+import time
+
+import reachability
+
+
+def test_tcp_listener() -> None:
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen()
+    prober = reachability.ReachabilityProber(port=srv.getsockname()[1])
+
+    start = time.monotonic()
+    assert prober.wait("127.0.0.1", timeout=5)
+    assert time.monotonic() - start < 1
+    srv.close()
+
+
+def test_subscribe() -> None:
+    prober = reachability.ReachabilityProber()
+    done = threading.Event()
+    seen: list[str] = []
+
+    def cb(address: str) -> None:
+        seen.append(address)
+        done.set()
+
+    # Either the echo reply or the refused connection wakes us up.
+    prober.subscribe("localhost", cb)
+    assert done.wait(5)
+    assert seen == ["localhost"]
+
+
+def test_unreachable() -> None:
+    prober = reachability.ReachabilityProber(initial_interval=0.05)
+    assert not prober.wait("nonexistent.invalid", timeout=0.5)
+    assert not prober._targets
+
+
+def test_checksum() -> None:
+    pkt = reachability._echo_request(0x1234, 1)
+    assert reachability._checksum(pkt) == 0
@@ -0,0 +1,66 @@
+import os
+import pathlib
+import typing
+from typing import Any
+
+import paramiko
+
+import remoteFS
+
+
+class FakeFile:
+    def __init__(self, path: str, mode: str):
+        self._f = open(path, mode)
+
+    def set_pipelined(self, pipelined: bool) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._f, name)
+
+    def __enter__(self) -> "FakeFile":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._f.close()
+
+
+class FakeSFTP:
+    # SFTP on the local filesystem.
+    def open(self, path: str, mode: str) -> FakeFile:
+        return FakeFile(path, mode)
+
+    def stat(self, path: str) -> paramiko.SFTPAttributes:
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    def chmod(self, path: str, mode: int) -> None:
+        os.chmod(path, mode)
+
+    def posix_rename(self, src: str, dst: str) -> None:
+        os.rename(src, dst)
+
+    def remove(self, path: str) -> None:
+        os.remove(path)
+
+
+def test_write_in_place_and_atomic(tmp_path: pathlib.Path) -> None:
+    fs = remoteFS.RemoteFS(lambda: typing.cast(paramiko.SFTPClient, FakeSFTP()))
+    target = tmp_path / "target"
+    target.write_text("old")
+    link = tmp_path / "link"
+    link.symlink_to(target)
+    inode = target.stat().st_ino
+
+    # In place: the symlink and the file (inode) stay.
+    fs.write_text(str(link), "new")
+    assert link.is_symlink()
+    assert target.read_text() == "new"
+    assert target.stat().st_ino == inode
+
+    # Atomic: a new file replaces the old one, nothing else is left behind.
+    target.chmod(0o600)
+    fs.write_text(str(target), "newer", atomic=True)
+    assert target.read_text() == "newer"
+    assert target.stat().st_ino != inode
+    assert target.stat().st_mode & 0o777 == 0o600
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["link", "target"]
@@ -0,0 +1,39 @@
+import pathlib
+
+import paramiko
+import pytest
+
+import sshCredentials
+
+
+def test_load_key(tmp_path: pathlib.Path) -> None:
+    cache = sshCredentials.CredentialCache()
+    path = str(tmp_path / "id_rsa")
+    paramiko.RSAKey.generate(2048).write_private_key_file(path)
+
+    key = cache.load_key(path)
+    assert key.is_rsa()
+    assert cache.load_key(path) is key
+
+    bad = tmp_path / "bad"
+    bad.write_text("not a key")
+    with pytest.raises(paramiko.SSHException):
+        cache.load_key(str(bad))
+
+
+def test_last_success() -> None:
+    cache = sshCredentials.CredentialCache()
+    assert cache.last_success("h", "core") is None
+    cache.remember_success("h", "core", "key:/root/.ssh/id_ed25519")
+    assert cache.last_success("h", "core") == "key:/root/.ssh/id_ed25519"
+    assert cache.last_success("h", "root") is None
+
+
+def test_timings() -> None:
+    cache = sshCredentials.CredentialCache()
+    cache.remember_success("h", "core", "auto", 2.0)
+    cache.remember_success("h", "core", "auto", 4.0)
+    cache.remember_success("other", "core", "auto", 1.0)
+    t = cache.timings("h")["auto"]
+    assert (t.wins, t.total_seconds, t.last_seconds) == (2, 6.0, 4.0)
+    assert list(cache.timings("other")) == ["auto"]
@@ -0,0 +1,127 @@
+import threading
+import time
+import typing
+
+import paramiko
+
+import sshPool
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.active = True
+        self.keepalive = 0
+        self._channels: list[int] = []
+
+    def is_active(self) -> bool:
+        return self.active
+
+    def set_keepalive(self, interval: int) -> None:
+        self.keepalive = interval
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self) -> FakeTransport:
+        return self.transport
+
+    def close(self) -> None:
+        self.closed = True
+        self.transport.active = False
+
+
+def _login(counter: list[FakeClient]) -> typing.Callable[[], paramiko.SSHClient]:
+    def login() -> paramiko.SSHClient:
+        c = FakeClient()
+        counter.append(c)
+        return typing.cast(paramiko.SSHClient, c)
+
+    return login
+
+
+KEY = ("host1", "core", "key:/root/.ssh/id_rsa")
+
+
+def test_reuse() -> None:
+    pool = sshPool.SSHConnectionPool()
+    created: list[FakeClient] = []
+
+    c1 = pool.connect(KEY, _login(created))
+    c2 = pool.connect(KEY, _login(created))
+    assert c1 is c2
+    assert len(created) == 1
+    assert created[0].transport.keepalive == 30
+    assert pool.get(KEY) is c1
+
+    pool.connect(("host1", "root", "auto"), _login(created))
+    assert len(created) == 2
+    assert len(pool) == 2
+
+
+def test_dead_and_discard() -> None:
+    pool = sshPool.SSHConnectionPool()
+    created: list[FakeClient] = []
+
+    c1 = pool.connect(KEY, _login(created))
+    created[0].transport.active = False
+    assert pool.get(KEY) is None
+    c2 = pool.connect(KEY, _login(created))
+    assert c2 is not c1
+
+    # Discarding a stale client must not drop its replacement.
+    pool.discard(KEY, c1)
+    assert pool.get(KEY) is c2
+    pool.discard(KEY, c2)
+    assert pool.get(KEY) is None
+    assert created[1].closed
+
+
+def test_idle_eviction() -> None:
+    pool = sshPool.SSHConnectionPool(idle_timeout=0.01)
+    created: list[FakeClient] = []
+
+    pool.connect(KEY, _login(created))
+    time.sleep(0.05)
+    assert pool.get(KEY) is None
+    assert created[0].closed
+
+
+def test_no_eviction_with_open_channels() -> None:
+    pool = sshPool.SSHConnectionPool(idle_timeout=0.01)
+    created: list[FakeClient] = []
+
+    c1 = pool.connect(KEY, _login(created))
+    # E.g. a long command or a tunnel of a host behind this one.
+    created[0].transport._channels.append(1)
+    time.sleep(0.05)
+    assert pool.get(("other", "core", "auto")) is None
+    assert pool.get(KEY) is c1
+    assert not created[0].closed
+
+    created[0].transport._channels.clear()
+    time.sleep(0.05)
+    assert pool.get(KEY) is None
+    assert created[0].closed
+
+
+def test_concurrent_connect() -> None:
+    pool = sshPool.SSHConnectionPool()
+    created: list[FakeClient] = []
+    login = _login(created)
+
+    def slow_login() -> paramiko.SSHClient:
+        time.sleep(0.05)
+        return login()
+
+    clients: list[paramiko.SSHClient] = []
+    threads = [threading.Thread(target=lambda: clients.append(pool.connect(KEY, slow_login))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(created) == 1
+    assert all(c is clients[0] for c in clients)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from taskGraph import TaskGraph
+
+
+def test_run_order_and_concurrency() -> None:
+    order: list[str] = []
+    lock = threading.Lock()
+    both_running = threading.Barrier(2, timeout=5)
+
+    def step(name: str, concurrent: bool = False) -> None:
+        if concurrent:
+            both_running.wait()
+        with lock:
+            order.append(name)
+
+    g = TaskGraph()
+    g.add("post", lambda: step("post"), inputs=("a", "b"))
+    g.add("a", lambda: step("a", True), inputs=("base",), outputs=("a",))
+    g.add("b", lambda: step("b", True), inputs=("base",), outputs=("b",))
+    g.add("base", lambda: step("base"), outputs=("base",))
+    g.run()
+    assert order[0] == "base" and order[-1] == "post"
+    assert [t.name for t in g.levels()[1]] == ["a", "b"]
+    assert "1: a (after base)" in g.plan()
+
+
+def test_resource_limits() -> None:
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def work() -> None:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    g = TaskGraph(limits={"bmc": 2})
+    for i in range(5):
+        g.add(f"t{i}", work, resources={"bmc": 1})
+    g.run()
+    assert max_running == 2
+
+
+def test_failure_and_critical_path() -> None:
+    g = TaskGraph()
+    g.add("slow", lambda: time.sleep(0.2), outputs=("slow",))
+    g.add("fast", lambda: None, outputs=("fast",))
+    g.add("last", lambda: time.sleep(0.05), inputs=("slow", "fast"))
+    g.run()
+    assert [t.name for t in g.critical_path()] == ["slow", "last"]
+    assert g.report().startswith("Critical path")
+
+    def fail() -> None:
+        raise SystemExit(-1)
+
+    g = TaskGraph()
+    g.add("fail", fail, outputs=("x",))
+    g.add("never", lambda: pytest.fail("ran after failure"), inputs=("x",))
+    with pytest.raises(SystemExit):
+        g.run()
+
+
+def test_validate() -> None:
+    g = TaskGraph()
+    g.add("a", lambda: None, inputs=("missing",))
+    with pytest.raises(ValueError):
+        g.run()
+
+    g = TaskGraph()
+    g.add("a", lambda: None, inputs=("b",), outputs=("a",))
+    g.add("b", lambda: None, inputs=("a",), outputs=("b",))
+    with pytest.raises(ValueError):
+        g.levels()
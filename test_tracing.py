@@ -0,0 +1,51 @@
+import json
+import pathlib
+import time
+
+import pytest
+
+import tracing
+
+
+def test_spans(tmp_path: pathlib.Path) -> None:
+    t = tracing.Tracer()
+    with t.span("create_cluster", tracing.TASK):
+        time.sleep(0.01)
+    with t.span("create_masters", tracing.TASK):
+        with t.span("virsh list", tracing.RUN, "host1") as s:
+            s.outcome = "exit 1"
+    with pytest.raises(ValueError):
+        with t.span("create_workers", tracing.TASK):
+            raise ValueError()
+
+    assert [s.name for s in t.spans(tracing.TASK)] == ["create_cluster", "create_masters", "create_workers"]
+    assert t.spans(tracing.RUN)[0].host == "host1"
+    assert t.spans(tracing.TASK)[2].outcome == "error: ValueError"
+    assert t.slowest(1)[0].name == "create_cluster"
+    assert [s.name for s in t.critical_path()] == ["create_cluster", "create_masters", "create_workers"]
+    assert "Critical path: create_cluster" in t.summary()
+
+    path = tmp_path / "trace.json"
+    t.export(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    run = next(e for e in events if e["name"] == "virsh list")
+    assert run["ph"] == "X" and run["cat"] == "run"
+    assert run["args"] == {"host": "host1", "outcome": "exit 1"}
+    assert any(e["ph"] == "M" for e in events)
+
+
+def test_critical_path_parallel() -> None:
+    t = tracing.Tracer()
+    # "b" runs next to "a" but ends first, only "a" leads to "c".
+    now = time.monotonic()
+    for name, start, end in [("a", 0, 10), ("b", 1, 5), ("c", 10, 12)]:
+        with t.span(name, tracing.TASK) as s:
+            pass
+        s.start, s.end = now + start, now + end
+    assert [s.name for s in t.critical_path()] == ["a", "c"]
+
+
+def test_disabled() -> None:
+    assert tracing.tracer() is None
+    with tracing.span("nothing", tracing.RUN) as s:
+        s.outcome = "exit 1"
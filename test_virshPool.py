@@ -0,0 +1,21 @@
+import inspect
+import os
+import pathlib
+from typing import Any
+
+import host
+from virshPool import VirshPool
+
+
+def test_ensure_removed(tmp_path: pathlib.Path, monkeypatch: Any) -> None:
+    # A fake virsh logging its arguments, with an inactive pool.
+    log = tmp_path / "virsh.log"
+    virsh = tmp_path / "virsh"
+    virsh.write_text(f'#!/bin/sh\necho "$*" >> {log}\n[ "$1" != pool-destroy ]\n')
+    virsh.chmod(0o755)
+    # LocalHost.run() uses the environment it was defined with by default.
+    env = inspect.signature(host.Host.run).parameters["env"].default
+    monkeypatch.setitem(env, "PATH", f"{tmp_path}{os.pathsep}{env.get('PATH', '')}")
+
+    VirshPool("c_guest_images", host.LocalHost()).ensure_removed()
+    assert log.read_text().splitlines() == ["pool-destroy c_guest_images", "pool-undefine c_guest_images"]
@@ -0,0 +1,58 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import waiter
+from waiter import Waiter
+
+
+def test_until_backs_off() -> None:
+    calls: list[float] = []
+
+    def ready() -> bool:
+        calls.append(time.monotonic())
+        return len(calls) == 4
+
+    w = Waiter("backoff", initial=0.01, max_interval=0.04)
+    assert w.until(ready)
+    assert w.attempts == 4
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    assert gaps[0] < gaps[1]
+    assert gaps[2] < 0.2
+    assert waiter.records()[-1] == waiter.WaitRecord("backoff", 4, waiter.records()[-1].seconds, True)
+
+
+def test_until_deadline() -> None:
+    start = time.monotonic()
+    assert not Waiter("never", initial=0.01, timeout=0.1).until(lambda: False)
+    assert time.monotonic() - start < 1
+    assert not waiter.records()[-1].succeeded
+
+
+def test_event_wakes_up() -> None:
+    event = threading.Event()
+    state = {"ready": False}
+
+    def set_ready() -> None:
+        state["ready"] = True
+        event.set()
+
+    threading.Timer(0.1, set_ready).start()
+    start = time.monotonic()
+    assert Waiter("event", initial=10, event=event).until(lambda: state["ready"])
+    assert time.monotonic() - start < 5
+
+
+def test_futures() -> None:
+    futures: list[Future[bool]] = [Future(), Future()]
+    changes = []
+
+    def finish() -> None:
+        for f in futures:
+            time.sleep(0.05)
+            f.set_result(True)
+
+    threading.Thread(target=finish).start()
+    assert Waiter("futures", max_interval=10).futures(futures, lambda: changes.append(1))
+    assert len(changes) >= 1
+    assert not Waiter("timeout", timeout=0.05).futures([Future()])
@@ -0,0 +1,42 @@
+import pytest
+from types import SimpleNamespace
+
+import warmPool
+from clustersConfig import NodeConfig, WarmPoolConfig
+
+
+def test_matches() -> None:
+    pc = WarmPoolConfig("host1.example.com", ram="16384")
+    assert pc.matches(NodeConfig("c", "w1", "host1.example.com", "vm", ram=16384))  # type: ignore
+    assert not pc.matches(NodeConfig("c", "w1", "host1.example.com", "vm"))
+    assert not pc.matches(NodeConfig("c", "w1", "host2.example.com", "vm", ram="16384"))
+
+
+def test_members() -> None:
+    pc = WarmPoolConfig("host1.example.com")
+    prefix = warmPool.member_prefix("c", pc)
+    assert prefix == "c-pool-host1-"
+    assert warmPool.new_names(prefix, {"c-pool-host1-0", "c-pool-host1-2"}, 3) == ["c-pool-host1-1", "c-pool-host1-3", "c-pool-host1-4"]
+    assert warmPool.new_names(prefix, set(), 0) == []
+
+    config = warmPool.member_config("c", pc, "c-pool-host1-1")
+    assert config.mac == warmPool.member_mac("c-pool-host1-1") != warmPool.member_mac("c-pool-host1-0")
+    assert config.mac.startswith("52:54:01:")
+    assert config.image_path == "/home/c_guests_images/c-pool-host1-1.qcow2"
+
+
+def test_replenish_failure() -> None:
+    pool = warmPool.WarmPool(SimpleNamespace(warm_pool=[]), None, {}, None, "")  # type: ignore
+
+    def fill() -> None:
+        raise SystemExit(-1)
+
+    pool.fill = fill  # type: ignore
+    pool.replenish()
+    with pytest.raises(SystemExit):
+        pool.wait()
+    pool.wait()
+
+    # Only logged when the deployment already failed.
+    pool.replenish()
+    pool.wait(raise_errors=False)
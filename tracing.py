@@ -0,0 +1,150 @@
+import contextlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+
+"""
+Spans around the phases of a deployment (graph tasks, hosts, nodes, host
+commands, file transfers, Assisted Installer API calls and waits), with
+the thread, host and outcome of each.
+
+Tracing is off unless enable() is called (see --trace). The spans can then
+be exported as a Chrome trace (JSON, opens in chrome://tracing and
+https://ui.perfetto.dev) and summarized as the slowest spans and the
+critical path of the deployment.
+"""
+
+# Categories of spans.
+TASK = "task"
+HOST = "host"
+NODE = "node"
+RUN = "run"
+TRANSFER = "transfer"
+AI = "ai"
+WAIT = "wait"
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    host: Optional[str]
+    thread: str
+    thread_id: int
+    start: float
+    end: Optional[float] = None
+    # "ok", "error" or a more specific outcome set while the span is open.
+    outcome: str = "ok"
+    args: dict[str, Any] = field(default_factory=dict)
+
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+
+class _NullSpan(Span):
+    # Returned while tracing is off, changes to it are dropped.
+    def __init__(self) -> None:
+        super().__init__("", "", None, "", 0, 0)
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spans: list[Span] = []
+        self._origin = time.monotonic()
+        self._wall_origin = time.time()
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, host: Optional[str] = None, **args: Any) -> Iterator[Span]:
+        t = threading.current_thread()
+        s = Span(name, category, host, t.name, t.ident or 0, time.monotonic(), args=args)
+        try:
+            yield s
+        except BaseException as e:
+            s.outcome = f"error: {type(e).__name__}"
+            raise
+        finally:
+            s.end = time.monotonic()
+            with self._lock:
+                self._spans.append(s)
+
+    def spans(self, category: Optional[str] = None) -> list[Span]:
+        with self._lock:
+            return [s for s in self._spans if category is None or s.category == category]
+
+    def chrome_trace(self) -> dict[str, Any]:
+        # Complete ("X") events in microseconds, one track per thread.
+        spans = self.spans()
+        events: list[dict[str, Any]] = []
+        for s in spans:
+            assert s.end is not None
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.category,
+                    "ph": "X",
+                    "ts": (s.start - self._origin) * 1e6,
+                    "dur": (s.end - s.start) * 1e6,
+                    "pid": 1,
+                    "tid": s.thread_id,
+                    "args": {"host": s.host, "outcome": s.outcome, **{k: str(v) for k, v in s.args.items()}},
+                }
+            )
+        for tid, name in sorted({(s.thread_id, s.thread) for s in spans}):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"start": self._wall_origin}}
+
+    def export(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def slowest(self, n: int = 20, category: Optional[str] = None) -> list[Span]:
+        return sorted(self.spans(category), key=lambda s: s.duration(), reverse=True)[:n]
+
+    def critical_path(self, category: str = TASK) -> list[Span]:
+        # Going back from the span that ended last, each time the span that
+        # ended last before the current one started: the chain of spans that
+        # determined the end time.
+        spans = sorted(self.spans(category), key=lambda s: s.end or 0)
+        path: list[Span] = []
+        while spans:
+            s = spans.pop()
+            path.append(s)
+            spans = [x for x in spans if (x.end or 0) <= s.start]
+        return path[::-1]
+
+    def summary(self, n: int = 20) -> str:
+        lines = [f"{'seconds':>9}  {'category':<8}  {'host':<20}  {'outcome':<16}  name"]
+        for s in self.slowest(n):
+            lines.append(f"{s.duration():>9.1f}  {s.category:<8}  {s.host or '-':<20}  {s.outcome:<16}  {s.name}")
+        path = self.critical_path()
+        if path:
+            lines.append("Critical path: " + " -> ".join(f"{s.name} ({s.duration():.1f}s)" for s in path))
+        return "\n".join(lines)
+
+
+_tracer: Optional[Tracer] = None
+_null_span = _NullSpan()
+
+
+def enable() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, host: Optional[str] = None, **args: Any) -> Iterator[Span]:
+    if _tracer is None:
+        yield _null_span
+        return
+    with _tracer.span(name, category, host, **args) as s:
+        yield s
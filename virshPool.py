@@ -32,16 +32,20 @@ class VirshPool:
             raise RuntimeError("The VirshPool is created without an image path and cannot be initialized")
 
         logger.info(f"virsh-pool[{self}]: Initializing pool {self.name} at {self.image_path}")
-        self.rsh_run(f"virsh pool-define-as {self.name} dir - - - - {self.image_path}")
-        self.rsh_run(f"mkdir -p {self.image_path}")
-        self.rsh_run(f"chmod a+rw {self.image_path}")
-        self.rsh_run(f"virsh pool-start {self.name}")
+        self.rsh.run_batch(
+            [
+                f"virsh pool-define-as {self.name} dir - - - - {self.image_path}",
+                f"mkdir -p {self.image_path}",
+                f"chmod a+rw {self.image_path}",
+                f"virsh pool-start {self.name}",
+            ]
+        )
         logger.info(f"virsh-pool[{self}]: Pool initialized")
 
     def ensure_removed(self) -> None:
-        if self.initialized():
-            self.remove()
+        # Removes in one round trip, whether the pool exists or not. An
+        # inactive pool can't be destroyed, undefine it anyway.
+        self.rsh.run_batch([f"virsh pool-destroy {self.name}", f"virsh pool-undefine {self.name}"])
 
     def remove(self) -> None:
-        self.rsh_run(f"virsh pool-destroy {self.name}")
-        self.rsh_run(f"virsh pool-undefine {self.name}")
+        self.rsh.run_batch([f"virsh pool-destroy {self.name}", f"virsh pool-undefine {self.name}"])
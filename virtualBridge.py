@@ -1,5 +1,6 @@
 import os
 import re
+import threading
 import time
 import json
 
@@ -14,6 +15,11 @@ from clustersConfig import BridgeConfig, NodeConfig
 from libvirt import Libvirt
 
 
+# Concurrent deployments share the "default" network (and its leases file),
+# which is reconfigured by destroying and recreating it.
+_dhcp_lock = threading.RLock()
+
+
 def bridge_dhcp_range_str(dhcp_range: Optional[tuple[str, str]]) -> str:
     if dhcp_range is not None:
         return f"<range start='{dhcp_range[0]}' end='{dhcp_range[1]}'/>"
@@ -41,6 +47,22 @@ class VirBridge:
         self.libvirt = Libvirt(h)
 
     def setup_dhcp_entries(self, vms: list[NodeConfig]) -> None:
+        with _dhcp_lock:
+            self._setup_dhcp_entries(vms)
+
+    def remove_dhcp_entries(self, vms: list[NodeConfig]) -> None:
+        with _dhcp_lock:
+            self._remove_dhcp_entries(vms)
+
+    def dhcp_lease(self, mac: str) -> Optional[str]:
+        # The IP leased to "mac" out of the dynamic range, if any.
+        for line in self.hostconn.run(f"virsh net-dhcp-leases default --mac {mac}").out.splitlines():
+            fields = line.split()
+            if mac in fields:
+                return next((f.split("/")[0] for f in fields if "." in f and "/" in f), None)
+        return None
+
+    def _setup_dhcp_entries(self, vms: list[NodeConfig]) -> None:
         # DHCP entries should have been removed during teardown.
         # However, leases sometimes came back.
         self.remove_dhcp_entries(vms)
@@ -56,7 +78,7 @@ class VirBridge:
             cmd = f"virsh net-update default add ip-dhcp-host \"{host_xml}\" --live --config"
             self.hostconn.run_or_die(cmd)
 
-    def remove_dhcp_entries(self, vms: list[NodeConfig]) -> None:
+    def _remove_dhcp_entries(self, vms: list[NodeConfig]) -> None:
         def filter_dhcp_leases(j: list[dict[str, str]], removed_macs: list[str], names: list[str]) -> list[dict[str, str]]:
             filtered = []
             for entry in j:
@@ -89,6 +111,12 @@ class VirBridge:
                 logger.info(f"Delete DHCP configuration for {name}: {result}")
                 removed_macs.append(mac)
 
+        if self.config.shared:
+            # Restarting the network to clean up the leases would cut off
+            # the other clusters' VMs. The static entries take precedence
+            # over the leases left.
+            return
+
         fn = "/var/lib/libvirt/dnsmasq/virbr0.status"
         p = Path(fn)
         with p.open() as f:
@@ -109,6 +137,11 @@ class VirBridge:
             logger.info(f"Start \"default\" Libvirt network: {result}")
             self.libvirt.restart("qemu")
 
+    def reload_hosts(self) -> None:
+        # The network's dnsmasq reads /etc/hosts again, without restarting
+        # anything.
+        self.hostconn.run_or_die("pkill -HUP -f /var/lib/libvirt/dnsmasq/default.conf")
+
     def _ensure_started(self, bridge_xml: str, api_port: Optional[str]) -> None:
         cmd = "virsh net-destroy default"
         self.hostconn.run(cmd)  # ignore return code - it might fail if net was not started
@@ -162,6 +195,10 @@ class VirBridge:
         self.libvirt.restart("qemu")
 
     def configure(self, api_port: Optional[str]) -> None:
+        with _dhcp_lock:
+            self._configure(api_port)
+
+    def _configure(self, api_port: Optional[str]) -> None:
         hostname = self.hostconn.hostname()
         self.libvirt.configure()
 
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future
+from concurrent.futures import wait as wait_any
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+from logger import logger
+import tracing
+
+
+INITIAL_INTERVAL = 1.0
+MAX_INTERVAL = 30.0
+
+
+@dataclass(frozen=True)
+class WaitRecord:
+    name: str
+    attempts: int
+    seconds: float
+    succeeded: bool
+
+
+_records: list[WaitRecord] = []
+_records_lock = threading.Lock()
+
+
+def records() -> list[WaitRecord]:
+    with _records_lock:
+        return list(_records)
+
+
+def _record(record: WaitRecord) -> None:
+    with _records_lock:
+        _records.append(record)
+    logger.debug(f"Wait for {record.name}: {record.attempts} attempts, {record.seconds:.1f}s, {'done' if record.succeeded else 'gave up'}")
+
+
+class Waiter:
+    """
+    Polls a condition, starting fast (every "initial" seconds) and backing
+    off exponentially up to every "max_interval" seconds, until "timeout"
+    (None: no limit). Setting "event" (e.g. from a watch on the resource)
+    re-checks the condition right away.
+
+    Every wait is recorded with its number of attempts and duration, see
+    records().
+    """
+
+    def __init__(self, name: str, *, initial: float = INITIAL_INTERVAL, factor: float = 2.0, max_interval: float = MAX_INTERVAL, timeout: Optional[float] = None, event: Optional[threading.Event] = None):
+        self.name = name
+        self._initial = initial
+        self._factor = factor
+        self._max_interval = max_interval
+        self._timeout = timeout
+        self._event = event
+        self._start = time.monotonic()
+        self._interval = initial
+        self.attempts = 0
+
+    def remaining(self) -> Optional[float]:
+        if self._timeout is None:
+            return None
+        return self._timeout - (time.monotonic() - self._start)
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def sleep(self) -> bool:
+        # Waits for the next attempt. Returns False if the deadline passed.
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            return False
+        interval = self._interval if remaining is None else min(self._interval, remaining)
+        self._interval = min(self._interval * self._factor, self._max_interval)
+        if self._event is not None:
+            if self._event.wait(interval):
+                self._event.clear()
+        else:
+            time.sleep(interval)
+        return True
+
+    def until(self, func: Callable[..., bool], **func_kwargs: Any) -> bool:
+        # Calls "func" until it returns True (returns True) or the deadline
+        # passed (returns False).
+        with tracing.span(self.name, tracing.WAIT) as span:
+            while True:
+                self.attempts += 1
+                if func(**func_kwargs):
+                    return self._done(True, span)
+                if self.expired() or not self.sleep():
+                    return self._done(False, span)
+
+    def futures(self, futures: Iterable["Future[Any]"], on_change: Callable[[], None] = lambda: None) -> bool:
+        # Waits until all futures are done, calling "on_change" whenever some
+        # completed (and at least every max_interval seconds). Returns False
+        # if the deadline passed first.
+        pending = set(futures)
+        with tracing.span(self.name, tracing.WAIT) as span:
+            while pending:
+                self.attempts += 1
+                remaining = self.remaining()
+                if remaining is not None and remaining <= 0:
+                    return self._done(False, span)
+                timeout = self._max_interval if remaining is None else min(self._max_interval, remaining)
+                _, pending = wait_any(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                on_change()
+            return self._done(True, span)
+
+    def _done(self, succeeded: bool, span: tracing.Span) -> bool:
+        _record(WaitRecord(self.name, self.attempts, time.monotonic() - self._start, succeeded))
+        span.args["attempts"] = self.attempts
+        if not succeeded:
+            span.outcome = "timeout"
+        return succeeded
@@ -0,0 +1,213 @@
+import hashlib
+import itertools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from assistedInstaller import AssistedClientAutomation
+from clusterHost import ClusterHost
+from clusterNode import VmClusterNode
+from clustersConfig import ClustersConfig, NodeConfig, WarmPoolConfig
+from common import wait_futures
+from logger import logger
+from virtualBridge import VirBridge
+from waiter import Waiter
+import tracing
+
+
+"""
+Warm pool of VMs booted into discovery ahead of time, to add VM workers
+without going through the create-boot-discover cycle.
+
+The pool members of a host ("warm_pool" in the cluster config) are VMs
+named "<cluster>-pool-<host>-<n>". They boot the ISO of an infraenv without
+cluster and get renamed to their VM's name in the Assisted Installer once
+discovered. They're kept across runs (only a full teardown removes them).
+
+A VM worker of the same size on the same host claims a member that's ready
+("known-unbound"), renames it to the worker's name in the Assisted Installer,
+binds it to the cluster and installs it. While the VM is powered off after
+the installation, it becomes the worker's VM (see VmClusterNode.adopt()).
+The pool is then filled up again in the background.
+"""
+
+# Seconds for a member to get an IP and to be discovered.
+DISCOVERY_TIMEOUT = 600
+
+
+def infra_env(cluster_name: str) -> str:
+    return f"{cluster_name}-x86_64-pool"
+
+
+def member_prefix(cluster_name: str, pc: WarmPoolConfig) -> str:
+    return f"{cluster_name}-pool-{pc.node.split('.')[0]}-"
+
+
+def member_mac(name: str) -> str:
+    # Derived from the name so that it's the same in every run, and out of
+    # the range of the generated MACs (see MacGenerator).
+    digest = hashlib.sha256(name.encode()).hexdigest()
+    return f"52:54:01:{digest[0:2]}:{digest[2:4]}:{digest[4:6]}"
+
+
+def member_config(cluster_name: str, pc: WarmPoolConfig, name: str) -> NodeConfig:
+    return NodeConfig(cluster_name, name, pc.node, "vm", mac=member_mac(name), preallocated=pc.preallocated, os_variant=pc.os_variant, disk_size=pc.disk_size, ram=pc.ram, cpu=pc.cpu)
+
+
+def new_names(prefix: str, taken: set[str], n: int) -> list[str]:
+    # The first "n" member names not in "taken".
+    names = (f"{prefix}{i}" for i in itertools.count())
+    return list(itertools.islice((name for name in names if name not in taken), n))
+
+
+class WarmPool:
+    def __init__(self, cc: ClustersConfig, ai: AssistedClientAutomation, hosts: dict[str, ClusterHost], bridge: VirBridge, secrets_path: str):
+        self._cc = cc
+        self._ai = ai
+        self._hosts = hosts
+        self._bridge = bridge
+        self._secrets_path = secrets_path
+        self._lock = threading.Lock()
+        # Only one fill() at a time, a replenish() waits for the previous one.
+        self._fill_lock = threading.Lock()
+        self._iso: Optional[str] = None
+        # Members claimed by workers during this run.
+        self._claimed: set[str] = set()
+        # Runs the background fill()s, their failures are raised by wait().
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-pool")
+        self._replenishing: list[Future[None]] = []
+
+    def _members(self, pc: WarmPoolConfig) -> list[VmClusterNode]:
+        # The members defined on the host.
+        h = self._hosts[pc.node].hostconn
+        prefix = member_prefix(self._cc.name, pc)
+        names = [n for n in h.run("virsh list --all --name").out.split() if n.startswith(prefix)]
+        return [VmClusterNode(h, member_config(self._cc.name, pc, n)) for n in sorted(names)]
+
+    def _is_ready(self, member: VmClusterNode) -> bool:
+        info = self._ai.get_ai_host(member.config.name)
+        return info is not None and info.status == "known-unbound"
+
+    def _prepare_iso(self) -> str:
+        if self._iso is not None:
+            return self._iso
+        name = infra_env(self._cc.name)
+        cfg = {}
+        cfg["pull_secret"] = self._secrets_path
+        cfg["cpu_architecture"] = "x86_64"
+        cfg["openshift_version"] = self._cc.version
+        if self._cc.proxy:
+            cfg["proxy"] = self._cc.proxy
+        if self._cc.noproxy:
+            cfg["noproxy"] = self._cc.noproxy
+        self._ai.ensure_infraenv_created(name, cfg)
+        self._ai.download_iso_with_retry(name, os.getcwd())
+        self._iso = os.path.join(os.getcwd(), f"{name}.iso")
+        return self._iso
+
+    def fill(self) -> None:
+        # Creates and boots the missing members of all hosts and waits until
+        # they're discovered. Members left half done (e.g. by a crash) are
+        # created again.
+        if not self._cc.warm_pool:
+            return
+        with self._fill_lock, tracing.span("fill warm pool", tracing.TASK):
+            iso = self._prepare_iso()
+            to_start: list[VmClusterNode] = []
+            for pc in self._cc.warm_pool:
+                h = self._hosts[pc.node]
+                with self._lock:
+                    members = [m for m in self._members(pc) if m.config.name not in self._claimed]
+                    stale = [m for m in members if not self._is_ready(m)]
+                    taken = {m.config.name for m in members} | self._claimed
+                VmClusterNode.teardown_all(h.hostconn, stale)
+                for m in stale:
+                    self._ai.delete(m.config.name)
+                missing = max(pc.size - len(members) + len(stale), 0)
+                new = [VmClusterNode(h.hostconn, member_config(self._cc.name, pc, n)) for n in new_names(member_prefix(self._cc.name, pc), taken - {m.config.name for m in stale}, missing)]
+                if not new:
+                    continue
+                h.ensure_linked_to_network(self._bridge)
+                h.ensure_images(iso, infra_env(self._cc.name), nodes=list(new))
+                to_start += new
+
+            if not to_start:
+                logger.info("Warm pool is full")
+                return
+            with ThreadPoolExecutor(max_workers=len(to_start)) as executor:
+                futures = [(m.config.name, executor.submit(self._start, m)) for m in to_start]
+                wait_futures("start warm pool member", futures)
+            started = [name for name, f in futures if f.result()]
+            logger.info(f"Warm pool members {started} are ready, {len(to_start) - len(started)} failed")
+
+    def _start(self, member: VmClusterNode) -> bool:
+        name = member.config.name
+        with tracing.span(f"{name}: start", tracing.NODE, member.config.node) as span:
+            image = os.path.join(os.path.dirname(member.config.image_path), f"{infra_env(self._cc.name)}.iso")
+            ip = self._boot(member, image)
+            info = self._ai.wait_host_by_ip(ip, timeout=DISCOVERY_TIMEOUT) if ip is not None else None
+            if info is not None:
+                self._ai.update_host(info.id, {"name": name})
+                if self._ai.wait_host(name, lambda info: info.status == "known-unbound", timeout=DISCOVERY_TIMEOUT) is not None:
+                    return True
+            span.outcome = "failed"
+            logger.error(f"Warm pool member {name} wasn't discovered, removing it")
+            member.teardown()
+            self._ai.delete(name)
+            return False
+
+    def _boot(self, member: VmClusterNode, image: str) -> Optional[str]:
+        # Returns the IP the member got from the DHCP range, None on failure.
+        if not member.start(image):
+            return None
+        leases: list[str] = []
+
+        def leased() -> bool:
+            ip = self._bridge.dhcp_lease(member.config.mac)
+            if ip is not None:
+                leases.append(ip)
+            return ip is not None
+
+        Waiter(f"DHCP lease of {member.config.name}", max_interval=5, timeout=DISCOVERY_TIMEOUT).until(leased)
+        return leases[0] if leases else None
+
+    def claim(self, worker: NodeConfig) -> Optional[VmClusterNode]:
+        # A ready member on the worker's host of the worker's size, if any.
+        with self._lock:
+            for pc in self._cc.warm_pool:
+                if not pc.matches(worker):
+                    continue
+                for m in self._members(pc):
+                    if m.config.name not in self._claimed and self._is_ready(m):
+                        self._claimed.add(m.config.name)
+                        logger.info(f"Worker {worker.name} takes warm pool member {m.config.name}")
+                        return m
+        return None
+
+    def replenish(self) -> None:
+        # Fills the pool up again in the background, see wait().
+        with self._lock:
+            self._replenishing.append(self._executor.submit(self.fill))
+
+    def wait(self, raise_errors: bool = True) -> None:
+        # Waits for the background fill()s and raises the first failure
+        # (including an exit), or only logs them.
+        with self._lock:
+            futures, self._replenishing = self._replenishing, []
+        if futures:
+            logger.info("Waiting for the warm pool to be filled up again")
+        for f in futures:
+            e = f.exception()
+            if e is None:
+                continue
+            if raise_errors:
+                raise e
+            logger.error(f"Filling up the warm pool failed: {e!r}")
+
+    def teardown(self) -> None:
+        for pc in self._cc.warm_pool:
+            members = self._members(pc)
+            VmClusterNode.teardown_all(self._hosts[pc.node].hostconn, members)
+            for m in members:
+                self._ai.delete(m.config.name)
+        self._ai.ensure_infraenv_deleted(infra_env(self._cc.name))